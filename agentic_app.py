@@ -1,37 +1,36 @@
 # agentic_app.py
+import functools
 import os
 import time
-import json
-import requests
 import streamlit as st
-from pathlib import Path
 from langchain.tools import Tool
 from langchain.agents import initialize_agent, AgentType
 from langchain.llms.base import LLM
-from google.api_core.exceptions import ResourceExhausted
-from typing import Optional, List, Any
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import GenerationChunk
+from typing import Optional, List, Any, Iterator
 
 # Load environment variables from .env file if it exists
-def load_env_file():
-    env_file = Path(".env")
-    if env_file.exists():
-        with open(env_file, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    key, value = line.split("=", 1)
-                    os.environ[key] = value
+from env_file import load_env_file
 
 load_env_file()
 
 # import your tools (safe version)
 import tools  # this is your tools.py
+import tracing
+import llm_cache
+from function_agent import FunctionCallingAgent
+from gemini_client import GeminiClient, GeminiRateLimitError, get_client, response_text
 
 # --- Settings ---
 MAX_ITERATIONS = 5       # fewer steps reduces Gemini calls
 AGENT_TIMEOUT = 120      # seconds
 MODEL_NAME = "models/gemini-2.0-flash"  # working model name
 TEMPERATURE = 0.3
+# Point at a local stand-in server (see replay.py) to run without the real API
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+# Stream tokens through streamGenerateContent so the UI can render them as they arrive
+STREAMING = os.environ.get("GEMINI_STREAMING", "1") != "0"
 
 # --- Custom Gemini LLM using REST API directly ---
 class GeminiLLM(LLM):
@@ -40,6 +39,8 @@ class GeminiLLM(LLM):
     model_name: str = "models/gemini-2.0-flash"
     temperature: float = 0.3
     api_key: str = ""
+    api_base: str = GEMINI_API_BASE
+    streaming: bool = False
     
     def __init__(self, model_name="models/gemini-2.0-flash", temperature=0.3, api_key=None, **kwargs):
         # Get API key
@@ -64,46 +65,113 @@ class GeminiLLM(LLM):
         run_manager: Optional[Any] = None,
         **kwargs: Any
     ) -> str:
-        """Generate a response using Google AI REST API"""
-        try:
-            url = f"https://generativelanguage.googleapis.com/v1beta/{self.model_name}:generateContent"
-            
-            headers = {"Content-Type": "application/json"}
-            
-            data = {
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {
-                    "temperature": self.temperature,
-                    "maxOutputTokens": 2048,
-                }
+        """Generate a response using Google AI REST API (raises GeminiError on failure)"""
+        if self.streaming:
+            return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs)) or "No response generated"
+        cached = self._cached(prompt, stop)
+        if cached is not None:
+            return cached
+        result = self._client().generate_content(self.model_name, self._request_body(prompt))
+        text = response_text(result)
+        llm_cache.store(self.model_name, self.temperature, prompt, stop, text)
+        return text or "No response generated"
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> str:
+        """Async variant of _call"""
+        cached = self._cached(prompt, stop)
+        if cached is not None:
+            return cached
+        result = await self._client().agenerate_content(self.model_name, self._request_body(prompt))
+        text = response_text(result)
+        llm_cache.store(self.model_name, self.temperature, prompt, stop, text)
+        return text or "No response generated"
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[Any] = None,
+        **kwargs: Any
+    ) -> Iterator[GenerationChunk]:
+        """Yield the response as it arrives from streamGenerateContent"""
+        cached = self._cached(prompt, stop)
+        if cached is not None:
+            pieces = [cached]
+        else:
+            pieces = (response_text(c) for c in self._client().stream_generate_content(self.model_name, self._request_body(prompt)))
+        text = []
+        for piece in pieces:
+            if not piece:
+                continue
+            text.append(piece)
+            chunk = GenerationChunk(text=piece)
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        if cached is None:
+            llm_cache.store(self.model_name, self.temperature, prompt, stop, "".join(text))
+
+    def _cached(self, prompt: str, stop: Optional[List[str]]) -> Optional[str]:
+        with tracing.span("gemini.cache") as span:
+            text = llm_cache.lookup(self.model_name, self.temperature, prompt, stop)
+            span.set(cache_hit=text is not None)
+            return text
+
+    def _client(self) -> GeminiClient:
+        return get_client(self.api_key, self.api_base)
+
+    def _request_body(self, prompt: str) -> dict:
+        return {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {
+                "temperature": self.temperature,
+                "maxOutputTokens": 2048,
             }
-            
-            response = requests.post(
-                url, 
-                headers=headers, 
-                params={"key": self.api_key},
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and result['candidates']:
-                    return result['candidates'][0]['content']['parts'][0]['text']
-                else:
-                    return "No response generated"
-            else:
-                return f"Error {response.status_code}: {response.text}"
-                
-        except Exception as e:
-            return f"Error: {e}"
+        }
 
-def create_safe_llm(model_name=MODEL_NAME, temperature=TEMPERATURE):
+def create_safe_llm(model_name=MODEL_NAME, temperature=TEMPERATURE, streaming=STREAMING):
     """Create a Gemini LLM with proper API key handling"""
-    return GeminiLLM(model_name=model_name, temperature=temperature)
+    return GeminiLLM(model_name=model_name, temperature=temperature, streaming=streaming)
+
+class StreamlitAgentHandler(BaseCallbackHandler):
+    """Renders the agent's thoughts, tool calls and final answer as they stream in"""
+
+    def __init__(self, container):
+        self.container = container
+        self.placeholder = None
+        self.text = ""
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        # Each ReAct step gets its own block under the previous ones
+        self.placeholder = self.container.empty()
+        self.text = ""
 
-# Create the LLM instance
-llm = create_safe_llm()
+    def on_llm_new_token(self, token: str, **kwargs):
+        self.text += token
+        if self.placeholder is not None:
+            self.placeholder.markdown(self.text + "▌")
+
+    def on_llm_end(self, response, **kwargs):
+        if self.placeholder is not None:
+            self.placeholder.markdown(self.text)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.container.caption(f"🔧 {serialized.get('name', 'tool')}: {input_str}")
+
+    def on_tool_end(self, output, **kwargs):
+        with self.container.expander("Observation", expanded=False):
+            st.text(str(output)[:4000])
+
+@functools.lru_cache(maxsize=None)
+def get_llm():
+    """The shared GeminiLLM, created on first use"""
+    return create_safe_llm()
 
 # --- Define Tools ---
 def safe_set_thresholds(input_str: str):
@@ -120,6 +188,26 @@ def safe_set_thresholds(input_str: str):
     except Exception as e:
         return f"Error setting thresholds: {e}. Use format 'ROE,PEG' or 'ROE PEG'"
 
+def run_screen(input_str: str):
+    """Run Screen tool; screener (pandas/numpy) is imported only when a screen runs"""
+    import screener
+    return screener.screen_report(input_str)
+
+def run_technicals(input_str: str):
+    """Get Technicals tool; price_history (pandas/numpy) is imported on first use"""
+    import price_history
+    return price_history.technicals_report(input_str)
+
+def run_risk(input_str: str):
+    """Get Risk tool; risk (pandas/numpy) is imported on first use"""
+    import risk
+    return risk.risk_report(input_str)
+
+def run_market_cap_ranking(input_str: str):
+    """Rank by Market Cap tool; fx and screener (pandas) are imported on first use"""
+    import fx
+    return fx.market_cap_report(input_str)
+
 tools_list = [
     Tool(
         name="Get Symbol",
@@ -176,36 +264,106 @@ tools_list = [
         func=tools.screen_and_add,
         description="Screen a company against thresholds with detailed analysis and add to watchlist if it passes criteria. Always provides comprehensive real stock information from Yahoo Finance. Use company name as input."
     ),
+    Tool(
+        name="Get Technicals",
+        func=run_technicals,
+        description="Get technical indicators from daily price history: SMA 20/50/200, RSI(14), annualized volatility, drawdown and 1y return. Input: comma-separated ticker symbols (e.g. 'AAPL, TCS.NS'); empty input uses the watchlist."
+    ),
+    Tool(
+        name="Get Risk",
+        func=run_risk,
+        description="Correlation matrix, annualized volatility and beta (vs the benchmark index) from daily returns, plus equal-weight portfolio volatility and beta. Input: comma-separated ticker symbols; empty input uses the watchlist."
+    ),
+    Tool(
+        name="Rank by Market Cap",
+        func=run_market_cap_ranking,
+        description="Rank stocks from different markets (US, NSE, LSE, ...) by market cap converted to one currency with live FX rates. Input: 'SYM1, SYM2 | CURRENCY' (e.g. 'MSFT, TCS.NS, SHEL.L | USD'); symbols default to the watchlist and currency to the reporting currency."
+    ),
+    Tool(
+        name="Run Screen",
+        func=run_screen,
+        description="Run a saved screen or a rule expression over several ticker symbols at once. Input format: '<screen name or expression> | SYM1, SYM2' (e.g. 'roe > 15 and peg < 1.5 and market in (NSE, US) | AAPL, TCS.NS'). Without symbols it screens the watchlist."
+    ),
 ]
 
+def _traced_tool(name, func):
+    """Run a tool inside a span (a trace of its own when called outside the agent)"""
+    def run(tool_input):
+        with tracing.trace(f"tool:{name}", input=str(tool_input)[:200]) as span:
+            result = func(tool_input)
+            span.set(output_chars=len(str(result)))
+            return result
+    return run
+
+for _tool in tools_list:
+    _tool.func = _traced_tool(_tool.name, _tool.func)
+
+def run_agent(query: str, callbacks=None):
+    """agent.run wrapped in a trace so every LLM call and tool shows up in the breakdown"""
+    with tracing.trace("agent.run", query=query[:200]) as span:
+        result = get_agent().run(query, callbacks=callbacks)
+        span.set(output_chars=len(str(result)))
+        return result
+
+@functools.lru_cache(maxsize=None)
+def get_function_agent():
+    llm = get_llm()
+    return FunctionCallingAgent(
+        get_client(llm.api_key, llm.api_base), llm.model_name, tools_list, temperature=llm.temperature
+    )
+
+def run_function_agent(query: str, on_event=None):
+    """Answer with the native function-calling agent (parallel tool calls per turn)"""
+    return get_function_agent().run(query, on_event=on_event)
+
 # --- Create Agent ---
-agent = initialize_agent(
-    tools_list,
-    llm,  # use the ChatGoogleGenerativeAI instance directly
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,
-    max_iterations=MAX_ITERATIONS,
-    handle_parsing_errors=True,
-    early_stopping_method="generate",  # Stop early if tool calls fail
-)
+@functools.lru_cache(maxsize=None)
+def get_agent():
+    """The ReAct agent, built once per process on first use"""
+    return initialize_agent(
+        tools_list,
+        get_llm(),
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True,
+        max_iterations=MAX_ITERATIONS,
+        handle_parsing_errors=True,
+        early_stopping_method="generate",  # Stop early if tool calls fail
+    )
+
+def __getattr__(name):
+    # `from agentic_app import agent` / `llm` keep working, built on first access
+    if name == "agent":
+        return get_agent()
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Streamlit UI ---
-st.title("Agentic Stock AI")
+def main():
+    try:
+        from google.api_core.exceptions import ResourceExhausted
+    except ImportError:
+        ResourceExhausted = GeminiRateLimitError
 
-user_query = st.text_input("Ask the agent (e.g. 'screen Apple Inc.'):")
+    st.title("Agentic Stock AI")
 
-if user_query:
-    try:
-        # run the agent with timeout
-        start = time.time()
-        with st.spinner("Running agent..."):
-            result = agent.run(user_query)
-        elapsed = time.time() - start
-        st.success(f"✅ Agent finished in {elapsed:.1f}s")
-        st.write(result)
-    except ResourceExhausted as e:
-        st.error("❌ Gemini API quota exceeded. Please wait a few minutes and try again.")
-        st.info("💡 Tip: The free tier has rate limits. Consider using shorter queries or upgrading to a paid plan.")
-    except Exception as e:
-        st.error(f"❌ Agent error: {e}")
-        st.info("💡 Try rephrasing your query or check if the company name is correct.")
+    user_query = st.text_input("Ask the agent (e.g. 'screen Apple Inc.'):")
+
+    if user_query:
+        try:
+            # run the agent with timeout
+            start = time.time()
+            steps = st.container()
+            result = run_agent(user_query, callbacks=[StreamlitAgentHandler(steps)])
+            elapsed = time.time() - start
+            st.success(f"✅ Agent finished in {elapsed:.1f}s")
+            st.write(result)
+        except (ResourceExhausted, GeminiRateLimitError) as e:
+            st.error("❌ Gemini API quota exceeded. Please wait a few minutes and try again.")
+            st.info("💡 Tip: The free tier has rate limits. Consider using shorter queries or upgrading to a paid plan.")
+        except Exception as e:
+            st.error(f"❌ Agent error: {e}")
+            st.info("💡 Try rephrasing your query or check if the company name is correct.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Resumable batch screening of a large universe (e.g. 2,000 symbols).
+
+The universe file (one symbol or company name per line, or a CSV with a
+'symbol' column) is split into chunks. Each chunk is one batched fundamentals
+fetch plus a vectorized screen, and a bounded pool of workers runs the chunks.
+Each finished chunk is written atomically to the job directory:
+
+    screen_job/
+        job.json            universe fingerprint, screen, chunk size, done chunks
+        chunks/00017.json   screened rows of chunk 17
+        results.csv         every row, ranked (written when the job completes)
+
+After a crash or Ctrl-C, running the same command again skips the finished
+chunks. Progress lines report throughput and ETA.
+
+Company names are resolved before screening starts. Uppercase entries in
+ticker syntax (L, SUN, TCS.NS) are taken as tickers; exact company names in
+the built-in symbol index need no request, and the rest are looked up
+concurrently. With --entries symbols every line is taken as a ticker, with
+--entries names every line is looked up as a company name.
+
+    python batch_screen.py nifty500.txt
+    python batch_screen.py sp500.csv --screen "roe > 15 and peg < 1.5" --workers 4 --add-passers
+    python batch_screen.py companies.txt --entries names
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import rules
+import screener
+import symbol_index
+import tools
+
+CHUNK_SIZE = 50
+MAX_WORKERS = 4
+# Attempts per chunk before it is left for the next run
+CHUNK_ATTEMPTS = 3
+RETRY_DELAY = 5
+
+_TICKER = re.compile(r"^[A-Z0-9^][A-Z0-9.\-=&^]*$")
+
+# How universe lines are read: 'auto' takes uppercase ticker syntax as-is, then exact index names, then search
+ENTRY_MODES = ('auto', 'symbols', 'names')
+
+
+def _write_json(path, data):
+    """Write JSON atomically: readers and a resumed run never see a half-written file"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _fingerprint(entries, screen, chunk_size, mode) -> str:
+    payload = json.dumps([entries, screen.expr, screen.missing, chunk_size, mode], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _records(frame: pd.DataFrame) -> list:
+    """Screened frame -> JSON-ready rows (NaN becomes None)"""
+    frame = frame.reset_index().rename(columns={'index': 'symbol'})
+    return json.loads(frame.to_json(orient='records'))
+
+
+class ScreenJob:
+    """One screening run over a universe, checkpointed in a job directory"""
+
+    def __init__(self, entries, screen, path="screen_job", chunk_size=CHUNK_SIZE, workers=MAX_WORKERS, mode='auto'):
+        if mode not in ENTRY_MODES:
+            raise ValueError(f"Unknown entry mode '{mode}'. Use one of: {', '.join(ENTRY_MODES)}")
+        self.entries = list(entries)
+        self.screen = screen
+        self.path = path
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.mode = mode
+        self.chunks = [self.entries[i:i + chunk_size] for i in range(0, len(self.entries), chunk_size)]
+        self.fingerprint = _fingerprint(self.entries, screen, chunk_size, mode)
+        self._symbols = {}  # entry -> symbol or lookup error
+        os.makedirs(os.path.join(path, "chunks"), exist_ok=True)
+
+    def _job_file(self):
+        return os.path.join(self.path, "job.json")
+
+    def _chunk_file(self, index):
+        return os.path.join(self.path, "chunks", f"{index:05d}.json")
+
+    def load_checkpoint(self, restart=False) -> set:
+        """Indexes of finished chunks; a job directory of a different job is refused"""
+        job = _read_json(self._job_file())
+        if job and job.get('fingerprint') != self.fingerprint and not restart:
+            raise ValueError(
+                f"{self.path} holds a different job (other universe, screen, missing-data policies or chunk size). "
+                "Use --restart to discard it or --out for a new directory."
+            )
+        if not job or restart:
+            for name in os.listdir(os.path.join(self.path, "chunks")):
+                os.remove(os.path.join(self.path, "chunks", name))
+            job = {'fingerprint': self.fingerprint, 'done': []}
+        # Chunk files are written atomically, so any that exist are complete, even
+        # if the run died before recording them in job.json
+        return {i for i in range(len(self.chunks)) if os.path.exists(self._chunk_file(i))}
+
+    def _save_checkpoint(self, done):
+        _write_json(self._job_file(), {
+            'fingerprint': self.fingerprint,
+            'screen': self.screen.expr,
+            'symbols': len(self.entries),
+            'chunk_size': self.chunk_size,
+            'chunks': len(self.chunks),
+            'done': sorted(done),
+            'updated': time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    # ----- work -----
+    def _local_symbol(self, entry):
+        """Symbol for an entry without a network request, or None if it needs a search"""
+        if self.mode == 'symbols' or (self.mode == 'auto' and _TICKER.match(entry)):
+            return entry
+        # Only exact names: prefix and fuzzy matches are left to the search
+        return symbol_index.resolve(entry) if symbol_index.SYMBOL_INDEX.knows(entry) else None
+
+    def _resolve_all(self, indexes):
+        """Resolve the entries of the given chunks up front; searches run concurrently"""
+        searches = []
+        for i in indexes:
+            for entry in self.chunks[i]:
+                if entry not in self._symbols:
+                    symbol = self._local_symbol(entry)
+                    if symbol is None:
+                        searches.append(entry)
+                    self._symbols[entry] = symbol
+        if searches:
+            print(f"Looking up {len(searches)} company names...")
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for entry, symbol in zip(searches, pool.map(tools.get_symbol, searches)):
+                    self._symbols[entry] = symbol
+
+    def _resolve(self, entries):
+        """Symbols for the chunk's entries, from _resolve_all (or get_symbol if it missed one)"""
+        symbols, errors = [], []
+        for entry in entries:
+            symbol = self._symbols.get(entry) or tools.get_symbol(entry)
+            if symbol.startswith(("Could not", "Error")):
+                errors.append({'symbol': entry, 'error': symbol, 'passes': False})
+            else:
+                symbols.append(symbol)
+        return symbols, errors
+
+    def _run_chunk(self, index):
+        """Screen one chunk (with retries) and write its rows; returns (index, rows)"""
+        for attempt in range(1, CHUNK_ATTEMPTS + 1):
+            try:
+                symbols, rows = self._resolve(self.chunks[index])
+                if symbols:
+                    rows += _records(screener.run_screen(symbols, self.screen))
+                _write_json(self._chunk_file(index), rows)
+                return index, rows
+            except Exception as e:
+                if attempt == CHUNK_ATTEMPTS:
+                    raise
+                print(f"Chunk {index} failed ({e}); retrying in {RETRY_DELAY * attempt}s")
+                time.sleep(RETRY_DELAY * attempt)
+
+    def run(self, restart=False) -> bool:
+        """Process the remaining chunks; returns True when every chunk is done"""
+        done = self.load_checkpoint(restart)
+        pending = [i for i in range(len(self.chunks)) if i not in done]
+        total = len(self.entries)
+        completed = sum(len(self.chunks[i]) for i in done)
+        if done:
+            print(f"Resuming: {len(done)} of {len(self.chunks)} chunks already done ({completed}/{total} symbols)")
+        self._save_checkpoint(done)
+
+        processed = failed = 0
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        running = set()
+        try:
+            self._resolve_all(pending)
+            start = time.perf_counter()
+            while pending or running:
+                # Keep at most `workers` chunks in flight so Ctrl-C has little to discard
+                while pending and len(running) < self.workers:
+                    running.add(pool.submit(self._run_chunk, pending.pop(0)))
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        index, rows = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"Chunk failed after {CHUNK_ATTEMPTS} attempts: {e} (it will be retried on the next run)")
+                        continue
+                    done.add(index)
+                    self._save_checkpoint(done)
+                    processed += len(self.chunks[index])
+                    completed += len(self.chunks[index])
+                    self._progress(completed, total, processed, time.perf_counter() - start, rows)
+        except KeyboardInterrupt:
+            print("\nInterrupted; waiting for running chunks to finish writing (Ctrl-C again to stop now)...")
+            try:
+                pool.shutdown(wait=True, cancel_futures=True)
+            except KeyboardInterrupt:
+                pass  # chunks still running are redone on the next run
+            done = self.load_checkpoint()
+            self._save_checkpoint(done)
+            print(f"Saved {len(done)} of {len(self.chunks)} chunks. Run the same command again to resume.")
+            return False
+        finally:
+            pool.shutdown(wait=False)
+
+        if failed:
+            print(f"{failed} chunks failed; run the same command again to retry them.")
+            return False
+        return True
+
+    @staticmethod
+    def _progress(completed, total, processed, elapsed, rows):
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = (total - completed) / rate if rate > 0 else float('inf')
+        passes = sum(1 for row in rows if row.get('passes'))
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if np.isfinite(eta) else "--:--:--"
+        print(f"[{completed}/{total}] {100 * completed / max(total, 1):5.1f}%  "
+              f"{rate:6.1f} symbols/s  ETA {eta_text}  (+{passes} passing)")
+
+    # ----- results -----
+    def results(self) -> pd.DataFrame:
+        """All finished rows, ranked like screener.rank"""
+        rows = []
+        for index in range(len(self.chunks)):
+            rows += _read_json(self._chunk_file(index), [])
+        frame = pd.DataFrame.from_records(rows)
+        if frame.empty:
+            return frame
+        frame = frame.drop_duplicates('symbol', keep='first').set_index('symbol')
+        for column in ('roe_pct', 'peg'):
+            frame[column] = pd.to_numeric(frame.get(column), errors='coerce')
+        frame['passes'] = frame['passes'].fillna(False).astype(bool)
+        return screener.rank(frame)
+
+    def write_results(self) -> str:
+        frame = self.results()
+        out = os.path.join(self.path, "results.csv")
+        frame.to_csv(out + ".tmp")
+        os.replace(out + ".tmp", out)
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("universe", help="Text file (one symbol or company name per line) or CSV with a 'symbol' column")
+    parser.add_argument("--screen", default="thresholds", help="Saved screen name or rule expression")
+    parser.add_argument("--out", default="screen_job", help="Job directory for checkpoints and results")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--entries", choices=ENTRY_MODES, default="auto",
+                        help="Read lines as tickers ('symbols'), company names ('names'), or guess per line (default)")
+    parser.add_argument("--restart", action="store_true", help="Discard a previous run in --out")
+    parser.add_argument("--add-passers", action="store_true", help="Add passing symbols to the watchlist at the end")
+    args = parser.parse_args()
+
+    try:
+        screen = rules.get_screen(args.screen)
+        entries = screener.load_universe(args.universe)
+        job = ScreenJob(entries, screen, args.out, args.chunk_size, args.workers, args.entries)
+        print(f"Screening {len(entries)} entries in {len(job.chunks)} chunks with {args.workers} workers: {screen.expr}")
+        finished = job.run(restart=args.restart)
+    except (rules.RuleError, ValueError, OSError) as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+
+    if not finished:
+        sys.exit(1)
+    results = job.results()
+    out = job.write_results()
+    passers = results.index[results['passes']].tolist() if not results.empty else []
+    errors = int(results['error'].notna().sum()) if 'error' in results else 0
+    print(f"Done: {len(passers)} of {len(results)} pass, {errors} could not be loaded. Results: {out}")
+    if args.add_passers and passers:
+        print(tools.add_many_to_watchlist(passers))
+
+
+if __name__ == "__main__":
+    main()
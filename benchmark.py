@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the tools and direct-analysis hot paths.
+
+Everything runs offline against synthetic Yahoo data served by replay.YahooReplay
+(and the Gemini stand-in server for the LLM call), at watchlist sizes of 1, 50
+and 500 symbols. For each benchmark and size we record per-call latency
+(mean/p50/p95), peak traced allocation and the number of Yahoo requests.
+
+    python benchmark.py run --out benchmarks/baseline.json
+    python benchmark.py run --out benchmarks/current.json
+    python benchmark.py compare benchmarks/baseline.json benchmarks/current.json
+
+compare exits non-zero if any p50 latency grew by more than --threshold or any
+benchmark started making more Yahoo requests.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Isolate the run from the user's caches, history and watchlist before tools is imported
+_ORIGINAL_CWD = os.getcwd()
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+_WORKDIR = tempfile.mkdtemp(prefix="stock-ai-bench-")
+os.environ["YAHOO_CACHE_DB"] = ""
+os.environ["HISTORY_DIR"] = ""
+os.environ["LLM_CACHE"] = "0"  # gemini_call measures the round trip, not the response cache
+os.environ["WATCHLIST_BACKEND"] = "json"
+os.environ.pop("YAHOO_REPLAY", None)
+os.chdir(_WORKDIR)
+
+import replay  # noqa: E402
+import tools  # noqa: E402
+
+DEFAULT_SIZES = [1, 50, 500]
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+# ----- synthetic data -----
+def synthetic_fixture(size: int) -> replay.Fixture:
+    """Deterministic module data and search results for `size` symbols"""
+    modules = {}
+    search = {}
+    for i in range(size):
+        symbol = f"SYM{i:04d}" + (".NS" if i % 3 == 0 else "")
+        modules[symbol] = {
+            'price': {'shortName': f"Synthetic {i} Ltd", 'marketCap': 1e9 * (i + 1)},
+            'summaryDetail': {'previousClose': 100.0 + i, 'dividendYield': 0.01, 'fiftyTwoWeekHigh': 150.0 + i, 'fiftyTwoWeekLow': 50.0 + i},
+            'financialData': {'returnOnEquity': (i % 40) / 100, 'debtToEquity': 40.0 + i % 90, 'currentRatio': 1.5,
+                              'revenueGrowth': 0.08, 'totalCash': 1e8 * (i + 1), 'totalDebt': 5e7 * (i + 1)},
+            'defaultKeyStatistics': {'pegRatio': None if i % 5 == 0 else 0.5 + (i % 30) / 10, 'trailingPE': 20.0,
+                                     'priceToBook': 3.0, 'profitMargins': 0.15, 'beta': 1.1, 'enterpriseValue': 1.2e9 * (i + 1)},
+            'assetProfile': {'sector': 'Technology', 'industry': 'Software'},
+        }
+        search[f"synthetic company {i}"] = {'quotes': [{'symbol': symbol}]}
+    return replay.Fixture(data={'yahoo': {'modules': modules, 'search': search}})
+
+
+def _names(size):
+    return [f"Synthetic Company {i}" for i in range(size)]
+
+
+# ----- benchmarks: each takes (size, yahoo) and runs one measured call -----
+@benchmark("get_symbol")
+def bench_get_symbol(size, yahoo):
+    for name in _names(size):
+        tools.get_symbol(name)
+
+
+@benchmark("get_detailed_stock_info")
+def bench_detailed(size, yahoo):
+    tools.clear_cache()
+    for symbol in yahoo.fixture.data['yahoo']['modules']:
+        tools.get_detailed_stock_info(symbol)
+
+
+@benchmark("get_detailed_stock_info_many")
+def bench_detailed_many(size, yahoo):
+    tools.clear_cache()
+    tools.get_detailed_stock_info_many(list(yahoo.fixture.data['yahoo']['modules']))
+
+
+@benchmark("get_detailed_stock_info_many_warm")
+def bench_detailed_many_warm(size, yahoo):
+    tools.get_detailed_stock_info_many(list(yahoo.fixture.data['yahoo']['modules']))
+
+
+@benchmark("get_snapshots")
+def bench_snapshots(size, yahoo):
+    tools.clear_cache()
+    tools.get_snapshots(list(yahoo.fixture.data['yahoo']['modules']))
+
+
+@benchmark("screen_and_add")
+def bench_screen_and_add(size, yahoo):
+    tools.clear_cache()
+    tools.clear_watchlist()
+    for name in _names(size):
+        tools.screen_and_add(name)
+
+
+@benchmark("format_helpers")
+def bench_format_helpers(size, yahoo):
+    for i in range(size * 100):
+        tools._format_number(i * 1.2345)
+        tools._format_percentage(i / 1000)
+        tools._format_large_number(i * 1e7)
+
+
+@benchmark("smart_stock_query_analyze")
+def bench_smart_analyze(size, yahoo):
+    import direct_stock_analyzer
+    tools.clear_cache()
+    for name in _names(min(size, 50)):
+        direct_stock_analyzer.smart_stock_query(f"Analyze {name}")
+
+
+@benchmark("smart_stock_query_watchlist")
+def bench_smart_watchlist(size, yahoo):
+    import direct_stock_analyzer
+    tools.clear_cache()
+    tools.clear_watchlist()
+    tools.add_many_to_watchlist(list(yahoo.fixture.data['yahoo']['modules']))
+    direct_stock_analyzer.smart_stock_query("show watchlist")
+
+
+def _cold_import(module):
+    """Import a module in a fresh interpreter, as a Streamlit cold start does"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_PACKAGE_DIR, os.environ.get("PYTHONPATH")])))
+    done = subprocess.run([sys.executable, "-c", f"import {module}"], env=env, capture_output=True, text=True)
+    if done.returncode != 0:
+        raise RuntimeError((done.stderr.strip().splitlines() or ["import failed"])[-1])
+
+
+@benchmark("cold_import_tools")
+def bench_cold_import_tools(size, yahoo):
+    _cold_import("tools")
+
+
+@benchmark("cold_import_agentic_app")
+def bench_cold_import_agentic_app(size, yahoo):
+    _cold_import("agentic_app")
+
+
+@benchmark("gemini_call")
+def bench_gemini_call(size, yahoo):
+    llm = _gemini_llm()
+    for i in range(min(size, 20)):
+        llm._call(f"Question {i}: analyze Synthetic Company {i}")
+
+
+_llm = None
+
+
+def _gemini_llm():
+    """GeminiLLM pointed at a local stand-in that answers every prompt"""
+    global _llm
+    if _llm is None:
+        fixture = replay.Fixture(data={'gemini': {'default': {
+            'candidates': [{'content': {'parts': [{'text': 'Final Answer: benchmark'}]}}]
+        }}})
+        server = replay.GeminiStandIn(("127.0.0.1", 0), fixture).start()
+        os.environ["GEMINI_API_BASE"] = server.base_url
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+        from agentic_app import create_safe_llm
+        _llm = create_safe_llm()
+        _llm.api_base = server.base_url
+    return _llm
+
+
+# ----- runner -----
+def measure(func, size, repeat) -> dict:
+    yahoo = replay.YahooReplay(synthetic_fixture(size)).install()
+    # The direct analyzer prints progress lines; keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            func(size, yahoo)  # warm-up (imports, first-touch costs)
+            latencies, requests = [], []
+            for _ in range(repeat):
+                before = yahoo.requests + yahoo.searches
+                start = time.perf_counter()
+                func(size, yahoo)
+                latencies.append(time.perf_counter() - start)
+                requests.append(yahoo.requests + yahoo.searches - before)
+
+            # Allocations are traced in a separate run so tracing does not skew latency
+            tracemalloc.start()
+            func(size, yahoo)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        finally:
+            yahoo.uninstall()
+
+    latencies.sort()
+    return {
+        'mean_s': statistics.fmean(latencies),
+        'p50_s': statistics.median(latencies),
+        'p95_s': latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))],
+        'peak_alloc_bytes': peak,
+        'requests': max(requests),
+        'repeat': repeat,
+    }
+
+
+def run(sizes, repeat, selected=None) -> dict:
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if selected and name not in selected:
+            continue
+        results[name] = {}
+        for size in sizes:
+            try:
+                results[name][str(size)] = measure(func, size, repeat)
+                r = results[name][str(size)]
+                print(f"{name:36s} n={size:<4d} p50={r['p50_s'] * 1000:9.2f}ms "
+                      f"peak={r['peak_alloc_bytes'] / 1024:9.1f}KiB requests={r['requests']}")
+            except Exception as e:
+                results[name][str(size)] = {'error': str(e)}
+                print(f"{name:36s} n={size:<4d} skipped: {e}")
+    return {
+        'meta': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'sizes': sizes,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Human-readable regressions of current against baseline"""
+    regressions = []
+    for name, sizes in current['results'].items():
+        for size, now in sizes.items():
+            before = baseline['results'].get(name, {}).get(size)
+            if not before or 'error' in before or 'error' in now:
+                continue
+            ratio = now['p50_s'] / before['p50_s'] if before['p50_s'] else 1.0
+            line = f"{name:36s} n={size:<4s} p50 {before['p50_s'] * 1000:9.2f}ms -> {now['p50_s'] * 1000:9.2f}ms ({ratio:5.2f}x)"
+            line += f"  requests {before['requests']} -> {now['requests']}"
+            print(line)
+            if ratio > 1 + threshold:
+                regressions.append(f"{name} n={size}: p50 latency {ratio:.2f}x baseline")
+            if now['requests'] > before['requests']:
+                regressions.append(f"{name} n={size}: {now['requests']} Yahoo requests (baseline {before['requests']})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_cmd = commands.add_parser("run", help="Run the benchmarks and save the results as JSON")
+    run_cmd.add_argument("--out", default="benchmarks/current.json")
+    run_cmd.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    run_cmd.add_argument("--repeat", type=int, default=5)
+    run_cmd.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+
+    cmp_cmd = commands.add_parser("compare", help="Compare two result files")
+    cmp_cmd.add_argument("baseline")
+    cmp_cmd.add_argument("current")
+    cmp_cmd.add_argument("--threshold", type=float, default=0.15, help="Allowed relative p50 slowdown")
+
+    args = parser.parse_args()
+    # Paths on the command line are relative to where the user ran us, not the scratch dir
+    cwd = _ORIGINAL_CWD
+
+    if args.command == "run":
+        results = run(args.sizes, args.repeat, args.only)
+        out = os.path.join(cwd, args.out)
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {out}")
+    else:
+        with open(os.path.join(cwd, args.baseline), encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(os.path.join(cwd, args.current), encoding="utf-8") as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"- {regression}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
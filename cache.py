@@ -0,0 +1,217 @@
+"""
+TTL + LRU cache with an optional persistent SQLite tier.
+
+Used by tools.py to keep Yahoo Finance module data between calls (and between
+Streamlit restarts when the disk tier is enabled).
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_MISSING = object()
+
+# Eviction trims the disk tier to this share of max_disk_entries, so it runs once per many writes
+EVICT_TO = 0.9
+# Disk-hit access times are flushed with the next write, or once this many are pending
+MAX_PENDING_ACCESSES = 1000
+
+
+class TTLCache:
+    """
+    Bounded in-memory LRU cache whose entries expire after a per-entry TTL.
+
+    If db_path is given, entries are also written through to a SQLite file and
+    memory misses fall back to it. Values must be JSON serializable.
+    """
+
+    def __init__(self, max_entries=2048, default_ttl=300, db_path=None, max_disk_entries=50000):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.RLock()
+        self._db = None
+        self._accessed = {}  # key -> last disk-hit time, flushed with the next write
+        self._batch_depth = 0
+        self._disk_rows = 0  # upper bound on rows in the disk tier since the last eviction
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            self._open_db()
+
+    # ----- disk tier -----
+    def _open_db(self):
+        try:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache(expires_at)")
+            self._db.commit()
+            self._disk_rows = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        except Exception as e:
+            print(f"Error opening cache database {self.db_path}: {e}")
+            self._db = None
+
+    def _disk_get(self, key, now):
+        """Read-only: expired rows are left for eviction, access times for the next write"""
+        if self._db is None:
+            return _MISSING, None
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                return _MISSING, None
+            self._accessed[key] = now
+            if len(self._accessed) >= MAX_PENDING_ACCESSES and not self._batch_depth:
+                self._commit()
+            return json.loads(row[0]), row[1]
+        except Exception:
+            return _MISSING, None
+
+    def _disk_set(self, key, value, expires_at, now):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, default=str), expires_at, now),
+            )
+            self._accessed.pop(key, None)
+            self._disk_rows += 1
+            if self.max_disk_entries and self._disk_rows > self.max_disk_entries:
+                self._evict(now)
+            if not self._batch_depth:
+                self._commit()
+        except Exception as e:
+            print(f"Error writing cache entry {key}: {e}")
+
+    def _flush_accessed(self):
+        if self._accessed:
+            self._db.executemany(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?",
+                [(at, key) for key, at in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def _commit(self):
+        self._flush_accessed()
+        self._db.commit()
+
+    def _evict(self, now):
+        """Drop expired rows, then the least recently used down to EVICT_TO (both indexed)"""
+        self._flush_accessed()
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        rows = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        target = int(self.max_disk_entries * EVICT_TO)
+        if rows > target:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                (rows - target,),
+            )
+            rows = target
+        self._disk_rows = rows
+
+    @contextmanager
+    def batch(self):
+        """Group the disk writes of several set() calls into one transaction"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._db is not None:
+                    try:
+                        self._commit()
+                    except Exception as e:
+                        print(f"Error committing cache writes: {e}")
+
+    # ----- public API -----
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            value, expires_at = self._disk_get(key, now)
+            if value is not _MISSING:
+                self._remember(key, value, expires_at)
+                self.disk_hits += 1
+                return value
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store value under key for ttl seconds (default_ttl if not given)"""
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._disk_set(key, value, expires_at, now)
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def expires_at(self, key):
+        """Expiry timestamp of a live in-memory entry, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+                except Exception:
+                    pass
+
+    def clear(self):
+        """Drop every entry from both tiers and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM cache")
+                    self._db.commit()
+                    self._accessed.clear()
+                    self._disk_rows = 0
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'size': len(self._entries),
+                'persistent': self._db is not None,
+            }
@@ -4,64 +4,114 @@ Simple wrapper to provide direct access to enhanced stock analysis tools
 without agent complexity. This ensures users always get real Yahoo Finance data.
 """
 
-import os
 import re
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from env_file import load_env_file
+
+# tools reads its settings at import time, so .env comes first
+load_env_file()
+
+import symbol_index
 import tools
+import tracing
 
-def load_env_file():
-    env_file = Path(".env")
-    if env_file.exists():
-        with open(env_file, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    key, value = line.split("=", 1)
-                    os.environ[key] = value
+# ----- query parsing -----
+# Bounded pool for analyzing several companies from one query
+MAX_WORKERS = 4
+
+_ACTION_PREFIX = re.compile(
+    r"^\s*(?:please\s+)?(?:analy[sz]e|analysis of|get (?:detailed |full )?(?:info|information|details) (?:for|on|about)"
+    r"|details (?:for|of)|screen|check|compare)\s+",
+    re.IGNORECASE,
+)
+_TRAILING_WORDS = re.compile(
+    r"\s+(?:with|in|and show)\s+(?:full |more |detailed |comprehensive |complete )*"
+    r"(?:information|info|details?|analysis|data)\b.*$"
+    r"|\s+(?:stocks?|shares?|compan(?:y|ies))\s*$"
+    r"|\s+(?:in detail|in full|for me)\s*$",
+    re.IGNORECASE,
+)
+# Separators between company names; the capture keeps them for re-joining names like "Johnson & Johnson"
+_SEPARATORS = re.compile(r"(\s*,\s*(?:and\s+)?|\s*;\s*|\s+and\s+|\s*&\s*|\s+(?:vs\.?|versus)\s+)", re.IGNORECASE)
+_LEGAL_SUFFIX = re.compile(r"\b(inc|corp|corporation|ltd|limited|company|co)\b\.?", re.IGNORECASE)
+_FALLBACK_PATTERNS = [
+    re.compile(r"(?:company|stock|share)\s+([^,\.]+?)(?:\s|$|,|\.|with|and)", re.IGNORECASE),
+    re.compile(r"([a-zA-Z][a-zA-Z\s&\.,-]+?)(?:\s+(?:stock|share|company)|$)", re.IGNORECASE),
+]
+_SCREEN_WORDS = ('screen', 'check threshold', 'add to watchlist', 'criteria')
+
+
+def _clean_name(name: str) -> str:
+    name = _LEGAL_SUFFIX.sub('', name)
+    return name.strip(" .,-")
+
+
+def _merge_known_names(pieces: list) -> list:
+    """Re-join split fragments that together form a known name ("Johnson", "&", "Johnson")"""
+    names = []
+    i = 0
+    while i < len(pieces):
+        # pieces alternates name, separator, name, ...; try the longest known span first
+        for j in range(len(pieces) - 1, i, -2):
+            joined = "".join(pieces[i:j + 1])
+            if symbol_index.SYMBOL_INDEX.knows(joined):
+                names.append(joined)
+                i = j + 2
+                break
+        else:
+            names.append(pieces[i])
+            i += 2
+    return names
+
+
+def parse_companies(query: str) -> list:
+    """Company names mentioned in a query, in order and without duplicates"""
+    match = _ACTION_PREFIX.search(query)
+    if match:
+        body = _TRAILING_WORDS.sub('', query[match.end():].strip().rstrip('.?!'))
+        names = _merge_known_names(_SEPARATORS.split(body))
+    else:
+        names = []
+        for pattern in _FALLBACK_PATTERNS:
+            found = pattern.search(query)
+            if found and len(_clean_name(found.group(1))) > 2:
+                names = [found.group(1)]
+                break
+
+    companies = {}
+    for name in names:
+        name = _clean_name(name)
+        if len(name) > 1 or symbol_index.SYMBOL_INDEX.knows(name):
+            companies.setdefault(name.lower(), name)
+    return list(companies.values())
 
-load_env_file()
 
 def process_query(query):
     """
-    Process user queries and route them to appropriate tools
+    Process user queries and route them to appropriate tools. Several companies
+    ("Analyze Apple, Microsoft and Infosys") are handled concurrently and
+    reported in the order they were named.
     """
     query_lower = query.lower().strip()
-    
-    # Extract company name from query
-    company_patterns = [
-        r"(?:analyze|analysis of|get info for|details for|screen|check)\s+([^,\.]+?)(?:\s|$|,|\.|with|and)",
-        r"(?:company|stock|share)\s+([^,\.]+?)(?:\s|$|,|\.|with|and)",
-        r"([a-zA-Z][a-zA-Z\s&\.,-]+?)(?:\s+(?:stock|share|company)|$)"
-    ]
-    
-    company_name = None
-    for pattern in company_patterns:
-        match = re.search(pattern, query, re.IGNORECASE)
-        if match:
-            company_name = match.group(1).strip()
-            # Clean up common words
-            company_name = re.sub(r'\b(inc|corp|corporation|ltd|limited|company|co)\b\.?', '', company_name, flags=re.IGNORECASE).strip()
-            if len(company_name) > 2:  # Valid company name
-                break
-    
-    if not company_name:
+    companies = parse_companies(query)
+    if not companies:
         return "❌ Could not identify company name in your query. Please try: 'Analyze Apple' or 'Screen Microsoft'"
-    
-        print(f"Processing query for: {company_name}")
-    
+
     # Determine action type
-    if any(word in query_lower for word in ['screen', 'check threshold', 'add to watchlist', 'criteria']):
+    if any(word in query_lower for word in _SCREEN_WORDS):
         print("Using screening analysis with thresholds...")
-        return tools.screen_and_add(company_name)
-    
-    elif any(word in query_lower for word in ['analyze', 'analysis', 'details', 'info', 'comprehensive']):
-        print("Using comprehensive analysis...")
-        return tools.analyze_stock(company_name)
-    
+        action = tools.screen_and_add
     else:
-        # Default to comprehensive analysis
-        print("📈 Using comprehensive analysis (default)...")
-        return tools.analyze_stock(company_name)
+        print("Using comprehensive analysis...")
+        action = tools.analyze_stock
+
+    print(f"Processing query for: {', '.join(companies)}")
+    if len(companies) == 1:
+        return action(companies[0])
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(companies))) as pool:
+        results = list(pool.map(tracing.bind(action), companies))
+    return ("\n\n" + "=" * 50 + "\n\n").join(results)
 
 def process_watchlist_query(query):
     """Process watchlist-related queries"""
@@ -73,14 +123,15 @@ def process_watchlist_query(query):
             return "📋 Your watchlist is empty."
         
         result = f"Your Watchlist ({len(watchlist)} stocks):\n\n"
+        snapshots = tools.get_snapshots(watchlist)
         for symbol in watchlist:
-            details = tools.get_detailed_stock_info(symbol)
-            if 'error' not in details:
+            snapshot = snapshots[symbol]
+            if snapshot.ok:
                 # Show first few lines of analysis
-                lines = details['formatted_info'].split('\n')[:8]
+                lines = snapshot.text().split('\n')[:8]
                 result += '\n'.join(lines) + '\n\n' + '='*50 + '\n\n'
             else:
-                result += f"ERROR loading {symbol}: {details.get('error', 'Unknown error')}\n\n"
+                result += f"ERROR loading {symbol}: {snapshot.error or 'Unknown error'}\n\n"
         return result
     
     elif 'clear' in query_lower:
@@ -89,6 +140,7 @@ def process_watchlist_query(query):
     else:
         return "❓ Watchlist commands: 'show watchlist', 'clear watchlist'"
 
+@tracing.traced("smart_stock_query", root=True)
 def smart_stock_query(user_input):
     """
     Smart query processor that routes to appropriate tools
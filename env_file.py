@@ -0,0 +1,20 @@
+"""
+.env loading shared by the entry points.
+
+tools.py and the modules it imports read their settings (WATCHLIST_BACKEND,
+YAHOO_CACHE_DB, YAHOO_REPLAY, ...) from the environment when they are first
+imported, so the .env file has to be loaded before any of them.
+"""
+import os
+from pathlib import Path
+
+
+def load_env_file(path=".env"):
+    env_file = Path(path)
+    if env_file.exists():
+        with open(env_file, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    key, value = line.split("=", 1)
+                    os.environ[key] = value
@@ -0,0 +1,74 @@
+"""
+Number formatting shared by the text reports (tools, screener, snapshot).
+
+Every helper returns "N/A" for missing values: None, the 'N/A' placeholder,
+NaN, infinities and anything that is not a number.
+"""
+import math
+
+CURRENCY_SYMBOLS = {
+    'USD': '$', 'INR': '₹', 'CAD': 'C$', 'GBP': '£', 'AUD': 'A$',
+    'EUR': '€', 'JPY': '¥', 'HKD': 'HK$', 'SGD': 'S$', 'CHF': 'CHF ',
+}
+# Minor quote units are written after the number (LSE prices: 2712.50p)
+MINOR_UNIT_SUFFIXES = {'GBp': 'p', 'GBX': 'p', 'ZAc': 'c'}
+
+
+def as_number(value):
+    """float(value), or None if the value is missing or not a finite number"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def format_number(value, decimal_places=2):
+    """Format a number with proper decimal places or return N/A"""
+    number = as_number(value)
+    if number is None:
+        return 'N/A'
+    return f"{number:.{decimal_places}f}"
+
+
+def format_percentage(value, decimal_places=2):
+    """Format a fraction (0.153) as a percentage (15.30%) or return N/A"""
+    number = as_number(value)
+    if number is None:
+        return 'N/A'
+    return f"{number * 100:.{decimal_places}f}%"
+
+
+def currency_symbol(currency):
+    """'INR' -> '₹'; unknown codes are written as the code itself ('SEK ')"""
+    return CURRENCY_SYMBOLS.get(currency, f"{currency} " if currency else '')
+
+
+def format_large_number(value, symbol='$'):
+    """Format large numbers (like market cap) in readable format, e.g. ₹13.45T"""
+    number = as_number(value)
+    if number is None:
+        return 'N/A'
+    sign, number = ('-' if number < 0 else ''), abs(number)
+    if number >= 1e12:
+        return f"{sign}{symbol}{number/1e12:.2f}T"
+    elif number >= 1e9:
+        return f"{sign}{symbol}{number/1e9:.2f}B"
+    elif number >= 1e6:
+        return f"{sign}{symbol}{number/1e6:.2f}M"
+    elif number >= 1e3:
+        return f"{sign}{symbol}{number/1e3:.2f}K"
+    else:
+        return f"{sign}{symbol}{number:.2f}"
+
+
+def format_price(value, currency=''):
+    """Per-share price in its quote currency: $412.30, ₹3850.00, 2712.50p"""
+    number = format_number(value)
+    if number == 'N/A':
+        return number
+    if currency in MINOR_UNIT_SUFFIXES:
+        return f"{number}{MINOR_UNIT_SUFFIXES[currency]}"
+    return f"{currency_symbol(currency)}{number}"
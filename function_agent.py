@@ -0,0 +1,155 @@
+"""
+Agent built on Gemini's native function calling.
+
+The LangChain tools are declared to Gemini as functions taking one string
+argument. Gemini can ask for several calls in one turn; they run concurrently
+in a thread pool, except that clearing or removing from the watchlist and
+setting thresholds act as barriers in the order Gemini gave them, and all
+results go back in the next request. A query like "Screen Tesla and Apple, then show watchlist"
+takes one or two LLM turns instead of one per tool.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from gemini_client import GeminiError, response_text
+
+MAX_TURNS = 4
+MAX_PARALLEL_TOOLS = 4
+
+# Tools whose effect depends on call order; each runs alone, after every earlier call
+# in the turn. Other calls (adds are idempotent) run concurrently between them.
+ORDERED_TOOLS = {"Clear Watchlist", "Remove from Watchlist", "Set Thresholds"}
+# Tools that read state other tools change; within a segment they run after the rest
+READ_AFTER_WRITES = {"Show Watchlist", "Get Thresholds"}
+
+SYSTEM_INSTRUCTION = (
+    "You are a stock analysis assistant. Use the provided functions for every fact about "
+    "stocks, watchlists or thresholds; never invent financial data. When a request involves "
+    "several independent companies, call the functions for all of them in the same turn. "
+    "When you have the results, answer concisely using the function output."
+)
+
+
+def function_name(tool_name: str) -> str:
+    """Gemini function names allow letters, digits and underscores only"""
+    return re.sub(r"\W+", "_", tool_name).strip("_").lower()
+
+
+class FunctionCallingAgent:
+    """Runs a query with Gemini function calling over LangChain Tool objects"""
+
+    def __init__(self, client, model, tools, temperature=0.3, max_turns=MAX_TURNS, max_workers=MAX_PARALLEL_TOOLS):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.max_turns = max_turns
+        self.max_workers = max_workers
+        self.tools = {function_name(tool.name): tool for tool in tools}
+        self.declarations = [
+            {
+                "name": name,
+                "description": tool.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "input": {"type": "string", "description": "Tool input (empty if none is required)"},
+                    },
+                },
+            }
+            for name, tool in self.tools.items()
+        ]
+
+    def _body(self, contents, allow_calls=True) -> dict:
+        return {
+            "systemInstruction": {"parts": [{"text": SYSTEM_INSTRUCTION}]},
+            "contents": contents,
+            "tools": [{"functionDeclarations": self.declarations}],
+            "toolConfig": {"functionCallingConfig": {"mode": "AUTO" if allow_calls else "NONE"}},
+            "generationConfig": {"temperature": self.temperature, "maxOutputTokens": 2048},
+        }
+
+    def _run_tool(self, call) -> str:
+        tool = self.tools.get(call.get("name"))
+        if tool is None:
+            return f"Unknown function {call.get('name')}"
+        tool_input = (call.get("args") or {}).get("input", "")
+        try:
+            return str(tool.func(tool_input))
+        except Exception as e:
+            return f"Error running {tool.name}: {e}"
+
+    def _run_calls(self, calls) -> list:
+        """
+        Run one turn's calls: ORDERED_TOOLS alone, in call order; the calls
+        between them concurrently (readers after writers). Results are in call order.
+        """
+        groups, segment = [], []
+        for i, call in enumerate(calls):
+            if self._tool_name(call) in ORDERED_TOOLS:
+                groups += self._segment_groups(calls, segment) + [[i]]
+                segment = []
+            else:
+                segment.append(i)
+        groups += self._segment_groups(calls, segment)
+
+        results = [None] * len(calls)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for group in groups:
+                futures = {i: pool.submit(tracing.bind(self._run_tool), calls[i]) for i in group}
+                for i, future in futures.items():
+                    results[i] = future.result()
+        return results
+
+    def _segment_groups(self, calls, segment):
+        writers = [i for i in segment if self._tool_name(calls[i]) not in READ_AFTER_WRITES]
+        readers = [i for i in segment if i not in writers]
+        return [group for group in (writers, readers) if group]
+
+    def _tool_name(self, call):
+        tool = self.tools.get(call.get("name"))
+        return tool.name if tool else None
+
+    def run(self, query: str, on_event=None) -> str:
+        """
+        Answer a query. on_event(kind, data), if given, is called with
+        "tool_call" / "tool_result" / "answer" events for live display.
+        """
+        contents = [{"role": "user", "parts": [{"text": query}]}]
+        with tracing.trace("function_agent.run", query=query[:200]) as trace_span:
+            for turn in range(self.max_turns + 1):
+                # The last turn must answer with what it has
+                allow_calls = turn < self.max_turns
+                with tracing.span("function_agent.turn", turn=turn + 1) as span:
+                    result = self.client.generate_content(self.model, self._body(contents, allow_calls))
+                    candidates = result.get("candidates") or []
+                    if not candidates:
+                        raise GeminiError("Gemini returned no candidates", status=200, body=result)
+                    content = candidates[0].get("content") or {"role": "model", "parts": []}
+                    calls = [p["functionCall"] for p in content.get("parts", []) if "functionCall" in p]
+                    span.set(tool_calls=len(calls))
+
+                    if not calls:
+                        answer = response_text(result) or "No response generated"
+                        trace_span.set(turns=turn + 1)
+                        if on_event:
+                            on_event("answer", {"text": answer})
+                        return answer
+
+                    if on_event:
+                        for call in calls:
+                            on_event("tool_call", {"name": self._tool_name(call) or call.get("name"), "args": call.get("args") or {}})
+                    outputs = self._run_calls(calls)
+                    if on_event:
+                        for call, output in zip(calls, outputs):
+                            on_event("tool_result", {"name": self._tool_name(call) or call.get("name"), "output": output})
+
+                contents.append({"role": content.get("role", "model"), "parts": content.get("parts", [])})
+                contents.append({
+                    "role": "user",
+                    "parts": [
+                        {"functionResponse": {"name": call["name"], "response": {"result": output}}}
+                        for call, output in zip(calls, outputs)
+                    ],
+                })
+        return "No response generated"
@@ -0,0 +1,154 @@
+"""
+Currency conversion for cross-market comparisons (e.g. TCS.NS in INR vs MSFT in USD).
+
+Rates come from Yahoo's currency pairs ("INRUSD=X" = USD per INR). All pairs a
+call needs are fetched in one batched quote request and cached for FX_TTL
+seconds. Minor units are handled: LSE prices are quoted in pence ("GBp"),
+while market cap and balance-sheet figures are in pounds.
+
+Tables are converted with one multiplier per row, looked up per distinct
+currency, so a screened universe is converted as whole columns.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import tools
+import tracing
+from cache import TTLCache
+
+REPORTING_CURRENCY = os.environ.get("REPORTING_CURRENCY", "USD")
+FX_TTL = int(os.environ.get("FX_TTL", 15 * 60))
+
+# Quote units that are a fraction of a major currency
+MINOR_UNITS = {
+    'GBp': ('GBP', 0.01),
+    'GBX': ('GBP', 0.01),
+    'ZAc': ('ZAR', 0.01),
+    'ILA': ('ILS', 0.01),
+}
+
+# raw_data fields in the listing's currency, and per-share prices in its quote unit
+MONETARY_FIELDS = ['market_cap', 'enterprise_value', 'total_cash', 'total_debt']
+PRICE_FIELDS = ['current_price', '52_week_high', '52_week_low']
+
+_rates = TTLCache(max_entries=256, default_ttl=FX_TTL)
+_fetch_lock = threading.Lock()
+
+
+def pair_symbol(base: str, quote: str) -> str:
+    return f"{base}{quote}=X"
+
+
+def major_currency(currency: str):
+    """(major currency, factor): 'GBp' -> ('GBP', 0.01), 'USD' -> ('USD', 1.0)"""
+    return MINOR_UNITS.get(currency, (currency, 1.0))
+
+
+def get_rates(currencies, target: str = REPORTING_CURRENCY) -> dict:
+    """
+    {currency: units of target per unit of currency} for every given currency
+    (minor units included). Unavailable rates are NaN. Missing pairs are
+    fetched together in one request.
+    """
+    currencies = [c for c in dict.fromkeys(currencies) if c]
+    majors = {c: major_currency(c) for c in currencies}
+    needed = {major for major, _ in majors.values() if major != target}
+
+    with _fetch_lock:
+        missing = [m for m in needed if _rates.get(pair_symbol(m, target)) is None]
+        if missing:
+            with tracing.span("yahoo.fx", pairs=len(missing)):
+                pairs = [pair_symbol(m, target) for m in missing]
+                fetched = tools._fetch_modules(pairs, ['price'])
+            for pair in pairs:
+                data = fetched.get(pair)
+                price = data.get('price', {}).get('regularMarketPrice') if isinstance(data, dict) else None
+                if isinstance(price, (int, float)) and price > 0:
+                    _rates.set(pair, float(price))
+                else:
+                    print(f"Error fetching FX rate {pair}: {data}")
+
+    rates = {}
+    for currency, (major, factor) in majors.items():
+        rate = 1.0 if major == target else _rates.get(pair_symbol(major, target))
+        rates[currency] = rate * factor if rate is not None else float('nan')
+    return rates
+
+
+def convert_frame(frame: pd.DataFrame, target: str = REPORTING_CURRENCY) -> pd.DataFrame:
+    """
+    Copy of a fundamentals frame (with 'currency' and optionally 'price_currency'
+    columns) with monetary and price columns in the target currency. The original
+    currency is kept in 'local_currency'; rows without a rate become NaN.
+    """
+    result = frame.copy()
+    if frame.empty:
+        return result
+    local = frame['currency'].fillna('').to_numpy(dtype=object)
+    quote = frame['price_currency'].fillna('').to_numpy(dtype=object) if 'price_currency' in frame else local
+    rates = get_rates([*local, *quote], target)
+
+    # One lookup per distinct currency, then whole-column multiplies
+    codes, inverse = np.unique(np.concatenate([local, quote]).astype(str), return_inverse=True)
+    table = np.array([rates.get(code, float('nan')) for code in codes])
+    multipliers = table[inverse]
+    local_rate, quote_rate = multipliers[:len(local)], multipliers[len(local):]
+
+    for field in MONETARY_FIELDS:
+        if field in result:
+            result[field] = pd.to_numeric(result[field], errors='coerce').to_numpy(dtype=np.float64) * local_rate
+    for field in PRICE_FIELDS:
+        if field in result:
+            result[field] = pd.to_numeric(result[field], errors='coerce').to_numpy(dtype=np.float64) * quote_rate
+    result['local_currency'] = frame['currency']
+    result['currency'] = target
+    if 'price_currency' in result:
+        result['price_currency'] = target
+    return result
+
+
+def convert_raw_data(raw_data: dict, target: str = REPORTING_CURRENCY) -> dict:
+    """raw_data of get_detailed_stock_info with monetary fields in the target currency"""
+    frame = convert_frame(pd.DataFrame([raw_data]), target)
+    converted = dict(raw_data)
+    for field in [*MONETARY_FIELDS, *PRICE_FIELDS, 'currency', 'price_currency', 'local_currency']:
+        if field in frame:
+            value = frame[field].iloc[0]
+            if isinstance(value, (float, np.floating)):
+                value = float(value) if np.isfinite(value) else None
+            converted[field] = value
+    return converted
+
+
+def rank_by_market_cap(symbols: list, target: str = REPORTING_CURRENCY) -> pd.DataFrame:
+    """Symbols with market cap converted to the target currency, largest first"""
+    import screener
+    frame = convert_frame(screener.load_fundamentals_frame(symbols), target)
+    return frame.sort_values('market_cap', ascending=False, na_position='last', kind='stable')
+
+
+def market_cap_report(input_str: str = "") -> str:
+    """Agent tool: 'SYM1, SYM2 | EUR' ranked by market cap in one currency (default: watchlist, REPORTING_CURRENCY)"""
+    symbols_part, _, currency = (input_str or "").partition('|')
+    target = currency.strip().upper() or REPORTING_CURRENCY
+    symbols = [s.strip().upper() for s in symbols_part.replace(';', ',').split(',') if s.strip()]
+    symbols = symbols or tools.show_watchlist()
+    if not symbols:
+        return "No symbols given and the watchlist is empty."
+    try:
+        ranked = rank_by_market_cap(symbols, target)
+    except Exception as e:
+        return f"Error ranking by market cap: {e}"
+
+    symbol_sign = tools.currency_symbol(target)
+    lines = [f"Market cap ranking in {target}:"]
+    for i, (symbol, row) in enumerate(ranked[ranked['error'].isna()].iterrows(), 1):
+        cap = tools.format_large_number(row['market_cap'], symbol_sign)
+        lines.append(f"{i}. {symbol} ({row['company_name']}): {cap} (listed in {row['local_currency']})")
+    failed = ranked.index[ranked['error'].notna()].tolist()
+    if failed:
+        lines.append(f"Could not load: {', '.join(failed)}")
+    return "\n".join(lines)
@@ -0,0 +1,259 @@
+"""
+Pooled HTTP client for the Gemini generateContent REST API (blocking and
+streamed).
+
+One keep-alive requests.Session is shared per (API key, base URL), so agent
+steps reuse TCP/TLS connections instead of paying a handshake every call.
+Failures are raised as GeminiError (GeminiRateLimitError for 429s) rather than
+returned as text; 429/5xx responses and connection errors are retried with
+jittered exponential backoff that honors Retry-After, and give up straight
+away when the server asks for a longer wait than MAX_BACKOFF.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com"
+
+# Connections kept alive per client (raise for many concurrent agent sessions)
+POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "3"))
+REQUEST_TIMEOUT = 30
+
+# Backoff between retries (seconds); longer server-requested waits fail fast
+BACKOFF_BASE = 1.0
+MAX_BACKOFF = 20.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    """A Gemini request that failed after any retries"""
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class GeminiRateLimitError(GeminiError):
+    """Quota or rate limit exhausted (HTTP 429)"""
+
+    def __init__(self, message, status=429, body=None, retry_after=None):
+        super().__init__(message, status, body)
+        self.retry_after = retry_after
+
+
+def _retry_after(response) -> float:
+    """Seconds the server asked us to wait, from Retry-After or the RetryInfo detail"""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        for detail in response.json().get("error", {}).get("details", []):
+            delay = detail.get("retryDelay")
+            if delay:
+                return float(str(delay).rstrip("s"))
+    except (ValueError, AttributeError):
+        pass
+    return None
+
+
+def _error_from_response(response) -> GeminiError:
+    try:
+        body = response.json()
+        message = body.get("error", {}).get("message") or response.text
+    except ValueError:
+        body, message = None, response.text
+    message = f"Gemini API error {response.status_code}: {message}"
+    if response.status_code == 429:
+        return GeminiRateLimitError(message, body=body, retry_after=_retry_after(response))
+    return GeminiError(message, status=response.status_code, body=body)
+
+
+def response_text(result: dict) -> str:
+    """Text of the first candidate, or None if the model returned nothing"""
+    candidates = result.get("candidates") or []
+    if not candidates:
+        return None
+    parts = candidates[0].get("content", {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts) or None
+
+
+class GeminiClient:
+    """Thread-safe generateContent client over one pooled keep-alive session"""
+
+    def __init__(self, api_key, api_base=DEFAULT_API_BASE, pool_size=POOL_SIZE,
+                 max_retries=MAX_RETRIES, timeout=REQUEST_TIMEOUT):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def url(self, model, method="generateContent"):
+        return f"{self.api_base}/v1beta/{model}:{method}"
+
+    # ----- retries -----
+    def _attempt(self, model, body):
+        """One request; returns (response JSON, response size) or raises GeminiError"""
+        try:
+            response = self.session.post(
+                self.url(model), params={"key": self.api_key}, json=body, timeout=self.timeout
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise GeminiError(f"Gemini request failed: {e}") from e
+        if response.status_code != 200:
+            raise _error_from_response(response)
+        try:
+            return response.json(), len(response.content)
+        except ValueError as e:
+            raise GeminiError(f"Invalid JSON from Gemini: {e}", status=200) from e
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before the next attempt, or None to give up now"""
+        if attempt >= self.max_retries:
+            return None
+        if error.status is not None and error.status not in RETRY_STATUSES:
+            return None
+        delay = BACKOFF_BASE * 2 ** attempt * random.uniform(0.5, 1.5)
+        if isinstance(error, GeminiRateLimitError) and error.retry_after is not None:
+            if error.retry_after > MAX_BACKOFF:
+                return None  # quota will not come back soon; fail fast
+            delay = max(delay, error.retry_after)
+        return min(delay, MAX_BACKOFF)
+
+    def generate_content(self, model, body) -> dict:
+        """POST :generateContent with retries; returns the response JSON"""
+        with tracing.span("gemini.generateContent", model=model) as span:
+            if tracing.active():
+                span.set(request_bytes=tracing.payload_size(body))
+            attempt = 0
+            while True:
+                try:
+                    result, size = self._attempt(model, body)
+                    span.set(attempts=attempt + 1, response_bytes=size)
+                    return result
+                except GeminiError as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        span.set(attempts=attempt + 1, status=e.status)
+                        raise
+                    attempt += 1
+                    time.sleep(delay)
+
+    async def agenerate_content(self, model, body) -> dict:
+        """Async generate_content: requests run in a worker thread, backoff uses asyncio.sleep"""
+        with tracing.span("gemini.generateContent", model=model, mode="async") as span:
+            if tracing.active():
+                span.set(request_bytes=tracing.payload_size(body))
+            attempt = 0
+            while True:
+                try:
+                    result, size = await asyncio.to_thread(self._attempt, model, body)
+                    span.set(attempts=attempt + 1, response_bytes=size)
+                    return result
+                except GeminiError as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        span.set(attempts=attempt + 1, status=e.status)
+                        raise
+                    attempt += 1
+                    await asyncio.sleep(delay)
+
+    def stream_generate_content(self, model, body):
+        """
+        POST :streamGenerateContent (server-sent events) and yield each response
+        chunk as it arrives. Failures before the first chunk are retried like
+        generate_content; once output has started, errors are raised as-is.
+        """
+        span = tracing.start_span("gemini.streamGenerateContent", model=model)
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = self._open_stream(model, body)
+                    break
+                except GeminiError as e:
+                    delay = self._retry_delay(e, attempt)
+                    if delay is None:
+                        span.set(attempts=attempt + 1, status=e.status)
+                        raise
+                    attempt += 1
+                    time.sleep(delay)
+
+            chunks = size = 0
+            with response:
+                # chunk_size=None hands over data as it arrives instead of buffering 512 bytes
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    size += len(data)
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError as e:
+                        raise GeminiError(f"Invalid stream chunk from Gemini: {e}", status=200) from e
+                    if "error" in chunk:
+                        raise GeminiError(f"Gemini stream error: {chunk['error'].get('message')}", body=chunk)
+                    if chunks == 0:
+                        span.set(first_chunk_ms=round((time.perf_counter() - start) * 1000, 3))
+                    chunks += 1
+                    yield chunk
+            span.set(attempts=attempt + 1, chunks=chunks, response_bytes=size)
+        finally:
+            span.finish()
+
+    def _open_stream(self, model, body):
+        try:
+            response = self.session.post(
+                self.url(model, "streamGenerateContent"),
+                params={"key": self.api_key, "alt": "sse"},
+                json=body,
+                timeout=self.timeout,
+                stream=True,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise GeminiError(f"Gemini request failed: {e}") from e
+        if response.status_code != 200:
+            error = _error_from_response(response)
+            response.close()
+            raise error
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, api_base=DEFAULT_API_BASE) -> GeminiClient:
+    """Shared client (and connection pool) for an API key and base URL"""
+    key = (api_key, api_base)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = GeminiClient(api_key, api_base)
+        return client
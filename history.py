@@ -0,0 +1,276 @@
+"""
+Append-only columnar history of fundamentals snapshots.
+
+Each numeric raw_data field from get_detailed_stock_info is stored in its own
+flat binary file of float64 values, next to an int64 timestamp column and an
+int32 symbol-id column, all appended in lockstep:
+
+    history/
+        symbols.json        symbol id -> symbol
+        ts.i8               snapshot time (epoch seconds)
+        sid.i4              symbol id
+        roe.f8, peg.f8 ...  one float64 per row
+
+Reads memory-map the columns, so a symbol's range or a whole universe at one
+date is a vectorized scan that never loads the other fields.
+"""
+import json
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+# Fields kept in the history (numeric fields of raw_data)
+HISTORY_FIELDS = [
+    'current_price', 'market_cap', 'roe', 'peg', 'pe_ratio', 'price_to_book',
+    'debt_to_equity', 'revenue_growth', 'profit_margin', 'beta', 'dividend_yield',
+    '52_week_high', '52_week_low', 'current_ratio', 'total_cash', 'total_debt',
+    'enterprise_value',
+]
+
+# Skip a snapshot if the symbol was recorded less than this many seconds ago
+MIN_SNAPSHOT_INTERVAL = 15 * 60
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class HistoryStore:
+    """Append-only per-field column files for fundamentals snapshots"""
+
+    def __init__(self, path="history", fields=HISTORY_FIELDS):
+        self.path = path
+        self.fields = list(fields)
+        self._lock = threading.Lock()
+        self._symbols = None
+        self._last_seen = None
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._file(".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # ----- symbols -----
+    def _load_symbols(self):
+        try:
+            with open(self._file("symbols.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _symbol_ids(self, symbols, create):
+        """Map symbols to ids, registering new ones when create is True"""
+        known = self._load_symbols()
+        ids = {symbol: i for i, symbol in enumerate(known)}
+        new = [s for s in dict.fromkeys(symbols) if s not in ids]
+        if new and create:
+            for symbol in new:
+                ids[symbol] = len(known)
+                known.append(symbol)
+            tmp = self._file("symbols.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(known, f)
+            os.replace(tmp, self._file("symbols.json"))
+        self._symbols = known
+        return ids
+
+    # ----- columns -----
+    def _rows(self):
+        try:
+            return os.path.getsize(self._file("ts.i8")) // 8
+        except OSError:
+            return 0
+
+    def _column(self, name, dtype, rows):
+        """Read-only memmap of a column, NaN-padded if the field was added later"""
+        file = self._file(name)
+        itemsize = np.dtype(dtype).itemsize
+        available = min(os.path.getsize(file) // itemsize, rows) if os.path.exists(file) else 0
+        data = np.memmap(file, dtype=dtype, mode='r', shape=(available,)) if available else np.empty(0, dtype)
+        if available == rows:
+            return data
+        return np.concatenate([data, np.full(rows - available, np.nan, dtype=dtype)])
+
+    def append(self, snapshots: list, timestamp=None) -> int:
+        """
+        Append raw_data dicts (each with a 'symbol'); returns the number of rows
+        written. timestamp is one time for all rows, or a list with one per snapshot.
+        """
+        if timestamp is None or isinstance(timestamp, (int, float)):
+            timestamp = [timestamp if timestamp is not None else time.time()] * len(snapshots)
+        rows_ts = [(s, int(t)) for s, t in zip(snapshots, timestamp) if s.get('symbol')]
+        if not rows_ts:
+            return 0
+        snapshots = [s for s, _ in rows_ts]
+        with self._locked():
+            ids = self._symbol_ids([s['symbol'] for s in snapshots], create=True)
+            rows = self._rows()
+            for field in self.fields:
+                column = array('d', (_as_float(s.get(field)) for s in snapshots))
+                self._append_column(f"{field}.f8", column, rows)
+            self._append_column("sid.i4", array('i', [ids[s['symbol']] for s in snapshots]), rows)
+            # ts is written last: a row only becomes visible once its timestamp exists
+            with open(self._file("ts.i8"), "ab") as f:
+                array('q', [t for _, t in rows_ts]).tofile(f)
+            if self._last_seen is not None:
+                for s, t in rows_ts:
+                    self._last_seen[s['symbol']] = max(t, self._last_seen.get(s['symbol'], t))
+        return len(snapshots)
+
+    def _append_column(self, name, values: array, rows: int):
+        """Append values after exactly `rows` existing entries"""
+        file = self._file(name)
+        existing = os.path.getsize(file) // values.itemsize if os.path.exists(file) else 0
+        if existing > rows:
+            # Left over from an append that died before its timestamps were written
+            os.truncate(file, rows * values.itemsize)
+        elif existing < rows:
+            # A field added after the store was created starts with NaN rows
+            values = array(values.typecode, [float('nan')] * (rows - existing)) + values
+        with open(file, "ab") as f:
+            values.tofile(f)
+
+    def last_recorded(self) -> dict:
+        """Latest snapshot time per symbol"""
+        with self._lock:
+            return self._load_last_seen()
+
+    def _load_last_seen(self) -> dict:
+        if self._last_seen is None:
+            rows = self._rows()
+            symbols = self._load_symbols()
+            last = {}
+            if rows:
+                sid = self._column("sid.i4", np.int32, rows)
+                ts = self._column("ts.i8", np.int64, rows)
+                latest = np.full(len(symbols), -1, dtype=np.int64)
+                np.maximum.at(latest, sid, ts)
+                last = {symbols[i]: int(t) for i, t in enumerate(latest) if t >= 0}
+            self._last_seen = last
+        return self._last_seen
+
+    # ----- reads -----
+    def symbol_history(self, symbol: str, start=None, end=None, fields=None) -> pd.DataFrame:
+        """Snapshots of one symbol between start and end (datetimes or epoch seconds)"""
+        fields = fields or self.fields
+        rows = self._rows()
+        ids = self._symbol_ids([symbol], create=False)
+        if not rows or symbol not in ids:
+            return pd.DataFrame(columns=fields, index=pd.DatetimeIndex([], name='timestamp'))
+
+        sid = self._column("sid.i4", np.int32, rows)
+        ts = self._column("ts.i8", np.int64, rows)
+        mask = sid == ids[symbol]
+        if start is not None:
+            mask &= ts >= _epoch(start)
+        if end is not None:
+            mask &= ts <= _epoch(end)
+        index = np.nonzero(mask)[0]
+        return self._frame(index, fields, rows, pd.to_datetime(ts[index], unit='s', utc=True), 'timestamp')
+
+    def universe_at(self, when=None, fields=None, symbols=None) -> pd.DataFrame:
+        """Latest snapshot at or before `when` for every symbol (or the given ones)"""
+        fields = fields or self.fields
+        rows = self._rows()
+        if not rows:
+            return pd.DataFrame(columns=['timestamp', *fields], index=pd.Index([], name='symbol'))
+
+        known = self._load_symbols()
+        sid = self._column("sid.i4", np.int32, rows)
+        ts = self._column("ts.i8", np.int64, rows)
+        mask = ts <= _epoch(when) if when is not None else np.ones(rows, dtype=bool)
+        if symbols is not None:
+            symbols = set(symbols)
+            wanted = [i for i, s in enumerate(known) if s in symbols]
+            mask &= np.isin(sid, wanted)
+
+        index = np.nonzero(mask)[0]
+        # Sort by symbol then time (row number breaks ties) and keep each symbol's last row
+        order = np.lexsort((index, ts[index], sid[index]))
+        index = index[order]
+        group = sid[index]
+        last = np.append(group[1:] != group[:-1], True) if len(group) else np.zeros(0, dtype=bool)
+        index = index[last]
+
+        frame = self._frame(index, fields, rows, [known[i] for i in sid[index]], 'symbol')
+        frame.insert(0, 'timestamp', pd.to_datetime(ts[index], unit='s', utc=True))
+        return frame
+
+    def _frame(self, index, fields, rows, labels, index_name):
+        data = {field: self._column(f"{field}.f8", np.float64, rows)[index] for field in fields}
+        return pd.DataFrame(data, index=pd.Index(labels, name=index_name))
+
+
+def _epoch(value) -> int:
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    return int(pd.Timestamp(value).timestamp())
+
+
+# Set HISTORY_DIR to an empty string to stop recording snapshots
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "history")
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide HistoryStore, or None when history is disabled"""
+    global _store
+    if not HISTORY_DIR:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(HISTORY_DIR)
+        return _store
+
+
+def record(snapshots: list, min_interval: float = MIN_SNAPSHOT_INTERVAL, fetched_at: dict = None) -> int:
+    """
+    Append raw_data snapshots stamped with when their data was fetched
+    (fetched_at {symbol: epoch seconds}, default now). Snapshots less than
+    min_interval seconds newer than the symbol's last recorded one are skipped,
+    so data served again from the cache is not recorded twice.
+    """
+    store = get_store()
+    if store is None:
+        return 0
+    try:
+        now = time.time()
+        fetched_at = fetched_at or {}
+        last = store.last_recorded()
+        due, stamps = [], []
+        for s in snapshots:
+            ts = fetched_at.get(s.get('symbol'), now)
+            if ts - last.get(s.get('symbol'), 0) >= min_interval:
+                due.append(s)
+                stamps.append(ts)
+        return store.append(due, stamps)
+    except Exception as e:
+        print(f"Error recording history: {e}")
+        return 0
@@ -0,0 +1,96 @@
+"""
+Persistent cache of Gemini responses keyed on normalized prompts.
+
+Keys hash the model name, temperature, whitespace-normalized prompt and stop
+sequences, so repeated questions ("screen Apple", "show watchlist") and
+replayed sessions skip the Gemini round trip. Entries live in a TTLCache with
+a SQLite tier. Prompts that already carry tool observations (an agent step
+after a tool ran) depend on live market data and are never cached.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+
+from cache import TTLCache
+
+# Set LLM_CACHE=0 to always call Gemini
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") != "0"
+# Set LLM_CACHE_DB to an empty string to keep responses in memory only
+LLM_CACHE_DB = os.environ.get("LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(24 * 3600)))
+MAX_MEMORY_ENTRIES = 512
+MAX_DISK_ENTRIES = 10000
+
+# Text that marks tool output inside the agent scratchpad
+OBSERVATION_MARKER = "Observation:"
+
+_WHITESPACE = re.compile(r"\s+")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def normalize_prompt(prompt: str) -> str:
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def has_observations(prompt: str) -> bool:
+    """
+    True if the prompt contains tool results. The ReAct format instructions
+    mention "Observation:" themselves, so only the text after the last
+    "Question:" (the agent scratchpad) is checked.
+    """
+    return OBSERVATION_MARKER in prompt.rsplit("Question:", 1)[-1]
+
+
+def cache_key(model: str, temperature: float, prompt: str, stop=None) -> str:
+    payload = json.dumps(
+        [model, float(temperature), normalize_prompt(prompt), list(stop or [])],
+        separators=(",", ":"),
+    )
+    return "llm|" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cache():
+    """Process-wide response cache, or None when disabled"""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTLCache(
+                max_entries=MAX_MEMORY_ENTRIES,
+                default_ttl=LLM_CACHE_TTL,
+                db_path=LLM_CACHE_DB or None,
+                max_disk_entries=MAX_DISK_ENTRIES,
+            )
+        return _cache
+
+
+def lookup(model, temperature, prompt, stop=None):
+    """Cached response text, or None on a miss or for uncacheable prompts"""
+    cache = get_cache()
+    if cache is None or has_observations(prompt):
+        return None
+    return cache.get(cache_key(model, temperature, prompt, stop))
+
+
+def store(model, temperature, prompt, stop, text):
+    """Remember a response; empty responses and prompts with observations are skipped"""
+    cache = get_cache()
+    if cache is None or not text or has_observations(prompt):
+        return
+    cache.set(cache_key(model, temperature, prompt, stop), text)
+
+
+def stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache is not None else {'enabled': False}
+
+
+def clear():
+    cache = get_cache()
+    if cache is not None:
+        cache.clear()
@@ -0,0 +1,247 @@
+"""
+Daily price history with incremental updates and vectorized technical indicators.
+
+Bars come from yahooquery's Ticker.history and are kept in a memory-mapped
+PriceStore under PRICE_HISTORY_DIR (see price_store.py). An update only asks
+Yahoo for bars from the last stored date onwards (that bar is re-fetched, since
+it may have been an open session). Indicators are computed on a dates x symbols
+close matrix, so the whole watchlist is one set of array operations.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import tools
+import tracing
+from price_store import BAR_FIELDS, PriceStore
+
+PRICE_HISTORY_DIR = os.environ.get("PRICE_HISTORY_DIR", "prices")
+
+# First download per symbol; later updates are incremental
+INITIAL_PERIOD = "2y"
+# Symbols updated less than this many seconds ago are not re-requested
+UPDATE_INTERVAL = 3600
+# Symbols per Ticker() when several share the same start date
+HISTORY_CHUNK_SIZE = 25
+
+TRADING_DAYS = 252
+SMA_WINDOWS = (20, 50, 200)
+RSI_PERIOD = 14
+VOLATILITY_WINDOW = 20
+
+
+class PriceHistory:
+    """Daily bars per symbol in a PriceStore, updated incrementally from Yahoo"""
+
+    def __init__(self, path=PRICE_HISTORY_DIR):
+        self.store = PriceStore(path)
+        self._updated = {}  # symbol -> time of the last successful update
+        self._write_lock = threading.Lock()
+
+    # ----- storage -----
+    def bars(self, symbol, start=None, end=None) -> pd.DataFrame:
+        """Stored bars of one symbol (empty frame if none)"""
+        return self.store.bars(symbol, start, end)
+
+    def last_date(self, symbol):
+        return self.store.last_date(symbol)
+
+    # ----- updates -----
+    def update(self, symbols: list, force: bool = False) -> dict:
+        """
+        Fetch bars newer than what is stored. Returns {symbol: new bar count}
+        or {symbol: error string} for failed symbols. All fetched bars are
+        appended to the store in one write.
+        """
+        with self._write_lock:
+            now = time.time()
+            by_start = {}
+            for symbol in dict.fromkeys(symbols):
+                if not force and now - self._updated.get(symbol, 0) < UPDATE_INTERVAL:
+                    continue
+                last = self.last_date(symbol)
+                by_start.setdefault(last.strftime("%Y-%m-%d") if last is not None else None, []).append(symbol)
+
+            results, frames = {}, {}
+            for start, group in by_start.items():
+                for i in range(0, len(group), HISTORY_CHUNK_SIZE):
+                    chunk = group[i:i + HISTORY_CHUNK_SIZE]
+                    results.update(self._update_chunk(chunk, start, frames))
+            if frames:
+                with tracing.span("price_store.append", symbols=len(frames)):
+                    self.store.append(frames)
+                updated = time.time()
+                self._updated.update((symbol, updated) for symbol in frames)
+            return results
+
+    def _update_chunk(self, symbols, start, frames):
+        """Fetch one Ticker.history call; the fetched bars are added to frames"""
+        with tracing.span("yahoo.history", symbols=len(symbols), start=start or INITIAL_PERIOD) as span:
+            try:
+                ticker = tools.Ticker(symbols, asynchronous=True)
+                if start:
+                    data = ticker.history(start=start, interval="1d")
+                else:
+                    data = ticker.history(period=INITIAL_PERIOD, interval="1d")
+            except Exception as e:
+                span.set(error=str(e))
+                return {symbol: str(e) for symbol in symbols}
+            if not isinstance(data, pd.DataFrame):
+                # yahooquery returns a dict of per-symbol errors when nothing could be loaded
+                errors = data if isinstance(data, dict) else {}
+                return {symbol: str(errors.get(symbol, data)) for symbol in symbols}
+            span.set(rows=len(data))
+
+        results = {}
+        fetched = _normalize(data)
+        for symbol in symbols:
+            if symbol not in fetched.index.get_level_values('symbol'):
+                results[symbol] = f"No price history returned for {symbol}"
+                continue
+            new = fetched.xs(symbol, level='symbol')
+            last = self.last_date(symbol)
+            # The store replaces bars from the first fetched date on (the last one may have been partial)
+            frames[symbol] = new
+            results[symbol] = int((new.index > last).sum()) if last is not None else len(new)
+        return results
+
+    # ----- reads -----
+    def closes(self, symbols: list, start=None) -> pd.DataFrame:
+        """Close prices as a dates x symbols frame (NaN where a symbol has no bar)"""
+        return self.store.matrix('close', symbols, start)
+
+
+def _normalize(data: pd.DataFrame) -> pd.DataFrame:
+    """yahooquery history -> float bars indexed by (symbol, date) with naive daily dates"""
+    frame = data.reset_index()
+    # Closed sessions are datetime.date, an open session's bar is a datetime
+    dates = pd.to_datetime(frame['date'].astype(str).str[:10])
+    frame = frame.assign(date=dates)
+    for field in BAR_FIELDS:
+        if field not in frame:
+            frame[field] = np.nan
+    frame = frame.drop_duplicates(['symbol', 'date'], keep='last')
+    return frame.set_index(['symbol', 'date'])[BAR_FIELDS].astype('float64').sort_index()
+
+
+# ----- indicators -----
+def _align_right(closes: pd.DataFrame):
+    """
+    (frame, bar counts): each symbol's non-null closes moved to the bottom of
+    its column, so row -1 is every symbol's latest bar, row -2 the one before,
+    and so on. Rows are bar positions, not dates.
+    """
+    values = closes.to_numpy(dtype='float64')
+    valid = np.isfinite(values)
+    counts = valid.sum(axis=0)
+    length = int(counts.max()) if counts.size else 0
+    rows, cols = np.nonzero(valid)
+    position = valid.cumsum(axis=0)[rows, cols] - 1  # index among the symbol's own bars
+    aligned = np.full((length, values.shape[1]), np.nan)
+    aligned[length - counts[cols] + position, cols] = values[rows, cols]
+    return pd.DataFrame(aligned, columns=closes.columns), counts
+
+
+def compute_indicators(closes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Latest technical indicators per symbol from a dates x symbols close matrix.
+    Windows count each symbol's own bars: the matrix is first right-aligned
+    (see _align_right), so NSE and US symbols with different trading calendars
+    do not see each other's holidays. Every step operates on the whole matrix;
+    no per-symbol Python loops.
+    """
+    if closes.empty:
+        return pd.DataFrame(index=pd.Index([], name='symbol'))
+    closes, bars = _align_right(closes)
+
+    out = pd.DataFrame(index=pd.Index(closes.columns, name='symbol'))
+    out['last_close'] = closes.iloc[-1].to_numpy() if len(closes) else np.nan
+    out['bars'] = bars
+
+    for window in SMA_WINDOWS:
+        sma = closes.rolling(window, min_periods=window).mean().iloc[-1]
+        out[f'sma_{window}'] = sma.to_numpy()
+        out[f'vs_sma_{window}'] = out['last_close'] / out[f'sma_{window}'] - 1
+
+    # RSI with Wilder smoothing (an EWM with alpha = 1/period)
+    delta = closes.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / RSI_PERIOD, adjust=False, min_periods=RSI_PERIOD).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + gain.iloc[-1].to_numpy() / loss.iloc[-1].to_numpy())
+    out['rsi_14'] = np.where(loss.iloc[-1].to_numpy() == 0, 100.0, rsi)
+
+    log_returns = np.log(closes).diff()
+    out['volatility_20d'] = (log_returns.rolling(VOLATILITY_WINDOW, min_periods=VOLATILITY_WINDOW).std().iloc[-1]
+                             * np.sqrt(TRADING_DAYS)).to_numpy()
+    last_year = log_returns.iloc[-TRADING_DAYS:]
+    out['volatility_1y'] = (last_year.std() * np.sqrt(TRADING_DAYS)).to_numpy()
+
+    year = closes.iloc[-TRADING_DAYS:]
+    drawdown = year / year.cummax() - 1
+    out['drawdown'] = drawdown.iloc[-1].to_numpy()
+    out['max_drawdown_1y'] = drawdown.min().to_numpy()
+    out['return_1y'] = (year.iloc[-1] / year.bfill().iloc[0] - 1).to_numpy()
+    return out
+
+
+# ----- module-level helpers used by tools and the agent -----
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> PriceHistory:
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = PriceHistory()
+        return _history
+
+
+def indicators(symbols: list, update: bool = True) -> pd.DataFrame:
+    """Update bars (incrementally) and return the indicator table for the symbols"""
+    history = get_history()
+    if update:
+        history.update(symbols)
+    return compute_indicators(history.closes(symbols))
+
+
+def technicals_text(row) -> str:
+    """Technical indicators section for one symbol's indicator row"""
+    fmt, pct = tools.format_number, tools.format_percentage
+    lines = ["Technical Indicators:"]
+    for window in SMA_WINDOWS:
+        lines.append(f"- SMA {window}: {fmt(row[f'sma_{window}'])} (price {pct(row[f'vs_sma_{window}'])} vs SMA)")
+    lines += [
+        f"- RSI (14): {fmt(row['rsi_14'], 1)}",
+        f"- Volatility (20d, annualized): {pct(row['volatility_20d'])}",
+        f"- Volatility (1y, annualized): {pct(row['volatility_1y'])}",
+        f"- Drawdown from 1y high: {pct(row['drawdown'])}",
+        f"- Max drawdown (1y): {pct(row['max_drawdown_1y'])}",
+        f"- 1y Return: {pct(row['return_1y'])}",
+    ]
+    return "\n".join(lines)
+
+
+def technicals_report(input_str: str = "") -> str:
+    """Agent tool: technical indicators for comma-separated symbols (default: the watchlist)"""
+    symbols = [s.strip().upper() for s in (input_str or "").replace(';', ',').split(',') if s.strip()]
+    symbols = symbols or tools.show_watchlist()
+    if not symbols:
+        return "No symbols given and the watchlist is empty."
+    try:
+        table = indicators(symbols)
+    except Exception as e:
+        return f"Error computing technical indicators: {e}"
+
+    sections = []
+    for symbol in symbols:
+        if symbol not in table.index or not table.loc[symbol, 'bars']:
+            sections.append(f"{symbol}: no price history available")
+            continue
+        row = table.loc[symbol]
+        sections.append(f"{symbol} (last close {tools.format_number(row['last_close'])}):\n{technicals_text(row)}")
+    return "\n\n".join(sections)
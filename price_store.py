@@ -0,0 +1,394 @@
+"""
+Memory-mapped columnar store for daily price bars.
+
+All symbols share one set of fixed-dtype column files. Each symbol's bars are
+a few contiguous extents (row ranges) in date order, and a small versioned
+index maps symbols to their extents:
+
+    prices/
+        CURRENT                 live generation and index version (e.g. g000007/12)
+        g000007/
+            index.000012.json   symbols, extents per symbol, rows in the files
+            date.i8             bar date (days since 1970-01-01)
+            open.f4, high.f4, low.f4, close.f4
+            volume.i8
+
+Readers memory-map the columns read-only, so Streamlit sessions and worker
+processes share the OS page cache instead of each holding frames. A date range
+of one symbol, or one date across symbols, only touches the pages it reads.
+
+An update (append) writes only the new bars of the symbols it touches at the
+end of the column files, then publishes a new index version by switching
+CURRENT atomically. Rows below the published row count are never rewritten,
+so readers on an older index keep a consistent view. Replaced bars become dead
+rows; once there are too many of them, or a symbol is split into too many
+extents, the store is compacted into a new generation directory.
+"""
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+# Column name -> on-disk dtype
+COLUMNS = {
+    'date': np.int64,
+    'open': np.float32,
+    'high': np.float32,
+    'low': np.float32,
+    'close': np.float32,
+    'volume': np.int64,
+}
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'volume']
+
+# Generations (and index versions) kept on disk: the live one plus one for readers still using it
+KEEP_GENERATIONS = 2
+# Compact when dead rows exceed this share of live rows, or a symbol has more extents than this
+COMPACT_DEAD_RATIO = 0.5
+MAX_EXTENTS = 16
+
+
+def _column_file(field):
+    return f"{field}.{np.dtype(COLUMNS[field]).str[1:]}"
+
+
+def _days(values) -> np.ndarray:
+    """Dates (DatetimeIndex, strings, datetime.date, ...) -> int64 days since the epoch"""
+    return np.asarray(pd.to_datetime(values).values.astype('M8[D]').astype(np.int64))
+
+
+def _day(value):
+    return int(_days([value])[0]) if value is not None else None
+
+
+def _index_file(version):
+    return f"index.{version:06d}.json"
+
+
+class _Generation:
+    """One index version of a generation: the symbol extents and the first `rows` rows of its columns"""
+
+    def __init__(self, path, pointer):
+        self.pointer = pointer
+        self.name, _, version = pointer.partition('/')
+        self.version = int(version)
+        self.path = os.path.join(path, self.name)
+        with open(os.path.join(self.path, _index_file(self.version)), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.symbols = index['symbols']
+        self.ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.extents = [[tuple(extent) for extent in extents] for extents in index['extents']]
+        self.rows = int(index['rows'])
+        self.live = sum(stop - first for extents in self.extents for first, stop in extents)
+        self._columns = {}
+
+    def column(self, field) -> np.ndarray:
+        """Read-only memmap of a whole column (mapped once per generation)"""
+        data = self._columns.get(field)
+        if data is None:
+            dtype = COLUMNS[field]
+            if self.rows:
+                data = np.memmap(os.path.join(self.path, _column_file(field)), dtype=dtype, mode='r', shape=(self.rows,))
+            else:
+                data = np.empty(0, dtype)
+            self._columns[field] = data
+        return data
+
+    def ranges(self, symbol, start_day=None, end_day=None):
+        """[(first, stop), ...] rows of a symbol's bars between two day numbers (inclusive), or None"""
+        i = self.ids.get(symbol)
+        if i is None:
+            return None
+        if start_day is None and end_day is None:
+            return list(self.extents[i])
+        # Binary search inside the symbol's own dates: only a few pages are touched
+        ranges = []
+        for first, stop in self.extents[i]:
+            dates = self.column('date')[first:stop]
+            lo = int(np.searchsorted(dates, start_day, 'left')) if start_day is not None else 0
+            hi = int(np.searchsorted(dates, end_day, 'right')) if end_day is not None else len(dates)
+            if hi > lo:
+                ranges.append((first + lo, first + hi))
+        return ranges
+
+
+class PriceStore:
+    """Shared read-only view of daily bars, with appending writes and periodic compaction"""
+
+    def __init__(self, path="prices"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._generation = None
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._file(".lock"), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _current(self):
+        """The live generation, reopened when another writer has switched CURRENT"""
+        try:
+            with open(self._file("CURRENT"), "r", encoding="utf-8") as f:
+                pointer = f.read().strip()
+        except OSError:
+            return None
+        generation = self._generation
+        if generation is None or generation.pointer != pointer:
+            generation = _Generation(self.path, pointer)
+            self._generation = generation
+        return generation
+
+    # ----- reads -----
+    def symbols(self) -> list:
+        generation = self._current()
+        return list(generation.symbols) if generation else []
+
+    def __contains__(self, symbol):
+        generation = self._current()
+        return generation is not None and symbol in generation.ids
+
+    def last_date(self, symbol):
+        """Date of a symbol's latest bar (Timestamp), or None"""
+        generation = self._current()
+        ranges = generation.ranges(symbol) if generation else None
+        if not ranges:
+            return None
+        return pd.Timestamp(int(generation.column('date')[ranges[-1][1] - 1]), unit='D')
+
+    def arrays(self, symbol, start=None, end=None, fields=BAR_FIELDS) -> dict:
+        """
+        Column slices of a symbol's bars between start and end (inclusive):
+        {'date': int64 days, 'close': float32 memmap slice, ...}. Zero-copy
+        unless the range spans several extents.
+        """
+        return _slices(self._current(), symbol, _day(start), _day(end), fields)
+
+    def bars(self, symbol, start=None, end=None, fields=BAR_FIELDS) -> pd.DataFrame:
+        """A symbol's bars between start and end as a float64 frame indexed by date"""
+        data = self.arrays(symbol, start, end, fields)
+        index = pd.DatetimeIndex(data.pop('date').astype('M8[D]'), name='date')
+        return pd.DataFrame({field: data[field].astype(np.float64) for field in fields}, index=index)
+
+    def matrix(self, field, symbols, start=None, end=None) -> pd.DataFrame:
+        """One field as a dates x symbols float64 frame (NaN where a symbol has no bar)"""
+        symbols = list(dict.fromkeys(symbols))
+        generation = self._current()
+        start_day, end_day = _day(start), _day(end)
+        slices = [_slices(generation, symbol, start_day, end_day, [field]) for symbol in symbols]
+        dates = np.unique(np.concatenate([s['date'] for s in slices])) if slices else np.empty(0, np.int64)
+        values = np.full((len(dates), len(symbols)), np.nan)
+        for j, s in enumerate(slices):
+            values[np.searchsorted(dates, s['date']), j] = s[field]
+        index = pd.DatetimeIndex(dates.astype('M8[D]'), name='date')
+        return pd.DataFrame(values, index=index, columns=pd.Index(symbols, name='symbol'))
+
+    def cross_section(self, when=None, symbols=None, fields=BAR_FIELDS) -> pd.DataFrame:
+        """Each symbol's last bar at or before `when` (default: its latest bar)"""
+        generation = self._current()
+        if generation is None:
+            return pd.DataFrame(columns=['date', *fields], index=pd.Index([], name='symbol'))
+        symbols = [s for s in (symbols if symbols is not None else generation.symbols) if s in generation.ids]
+        end_day = _day(when)
+        rows = []
+        for symbol in symbols:
+            ranges = generation.ranges(symbol, end_day=end_day)
+            rows.append(ranges[-1][1] - 1 if ranges else -1)
+        rows = np.asarray(rows, dtype=np.int64)
+        found = rows >= 0
+        rows, symbols = rows[found], [s for s, ok in zip(symbols, found) if ok]
+
+        frame = pd.DataFrame(
+            {field: generation.column(field)[rows].astype(np.float64) for field in fields},
+            index=pd.Index(symbols, name='symbol'),
+        )
+        frame.insert(0, 'date', pd.DatetimeIndex(generation.column('date')[rows].astype('M8[D]')))
+        return frame
+
+    # ----- writes -----
+    def append(self, frames: dict) -> str:
+        """
+        Add bars ({symbol: frame indexed by date with BAR_FIELDS columns}). Stored
+        bars of a symbol from its frame's first date onwards are replaced; earlier
+        ones are kept. Only the given bars are written, at the end of the live
+        generation's columns. Returns the published CURRENT pointer.
+        """
+        frames = {symbol: frame for symbol, frame in frames.items() if frame is not None and len(frame)}
+        with self._locked():
+            old = self._current()
+            if old is None:
+                return self._rewrite(None, frames)
+            if not frames:
+                return old.pointer
+            symbols, extents = list(old.symbols), [list(e) for e in old.extents]
+            ids = dict(old.ids)
+            rows, new_data = old.rows, []
+            for symbol, frame in frames.items():
+                columns = _to_columns(frame)
+                i = ids.get(symbol)
+                if i is None:
+                    i = ids[symbol] = len(symbols)
+                    symbols.append(symbol)
+                    extents.append([])
+                kept = _truncate(old, extents[i], columns['date'][0])
+                stop = rows + len(columns['date'])
+                if kept and kept[-1][1] == rows:
+                    kept[-1] = (kept[-1][0], stop)  # the symbol's bars already end the file
+                else:
+                    kept.append((rows, stop))
+                extents[i] = kept
+                rows = stop
+                new_data.append(columns)
+
+            for field in COLUMNS:
+                path = os.path.join(old.path, _column_file(field))
+                size = old.rows * np.dtype(COLUMNS[field]).itemsize
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    if os.path.getsize(path) > size:
+                        f.truncate(size)  # rows of a writer that died before publishing
+                    f.seek(size)
+                    for columns in new_data:
+                        columns[field].tofile(f)
+
+            version = old.version + 1
+            self._write_index(old.path, version, symbols, extents, rows)
+            pointer = self._publish(f"{old.name}/{version}")
+            for entry in os.listdir(old.path):
+                if entry.startswith("index.") and entry[6:12].isdigit() and int(entry[6:12]) <= version - KEEP_GENERATIONS:
+                    os.remove(os.path.join(old.path, entry))
+
+            current = self._current()
+            if current.rows - current.live > COMPACT_DEAD_RATIO * current.live or \
+                    max(map(len, current.extents), default=0) > MAX_EXTENTS:
+                pointer = self._rewrite(current, {})
+        return pointer
+
+    def write(self, frames: dict) -> str:
+        """
+        Replace the bars of the given symbols completely and compact the store
+        into a new generation. Other symbols are copied from the current
+        generation extent by extent, without loading them whole. Returns the
+        published CURRENT pointer.
+        """
+        frames = {symbol: frame for symbol, frame in frames.items() if frame is not None and len(frame)}
+        with self._locked():
+            return self._rewrite(self._current(), frames)
+
+    def compact(self) -> str:
+        """Rewrite the store without dead rows, one extent per symbol"""
+        return self.write({})
+
+    def _rewrite(self, old, frames):
+        symbols = list(old.symbols) if old else []
+        symbols += [s for s in frames if old is None or s not in old.ids]
+
+        new_data = {symbol: _to_columns(frame) for symbol, frame in frames.items()}
+        extents, plan, rows = [], [], 0
+        for symbol in symbols:
+            # Copy plan: new arrays, or row ranges of the old columns (adjacent ranges merged)
+            if symbol in new_data:
+                plan.append(symbol)
+                length = len(new_data[symbol]['date'])
+            else:
+                length = 0
+                for first, stop in old.ranges(symbol):
+                    if plan and isinstance(plan[-1], tuple) and plan[-1][1] == first:
+                        plan[-1] = (plan[-1][0], stop)
+                    else:
+                        plan.append((first, stop))
+                    length += stop - first
+            extents.append([(rows, rows + length)] if length else [])
+            rows += length
+
+        number = int(old.name[1:]) + 1 if old else 1
+        name = f"g{number:06d}"
+        directory = self._file(name)
+        shutil.rmtree(directory, ignore_errors=True)  # left over from a writer that died
+        os.makedirs(directory)
+        for field in COLUMNS:
+            with open(os.path.join(directory, _column_file(field)), "wb") as f:
+                for step in plan:
+                    if isinstance(step, tuple):
+                        np.asarray(old.column(field)[step[0]:step[1]]).tofile(f)
+                    else:
+                        new_data[step][field].tofile(f)
+        self._write_index(directory, 1, symbols, extents, rows)
+        pointer = self._publish(f"{name}/1")
+        self._prune(number)
+        return pointer
+
+    @staticmethod
+    def _write_index(directory, version, symbols, extents, rows):
+        tmp = os.path.join(directory, _index_file(version) + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({'symbols': symbols, 'extents': [[[int(a), int(b)] for a, b in e] for e in extents],
+                       'rows': int(rows)}, f)
+        os.replace(tmp, os.path.join(directory, _index_file(version)))
+
+    def _publish(self, pointer):
+        """Publishing is the atomic rename of CURRENT"""
+        tmp = self._file("CURRENT.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(pointer)
+        os.replace(tmp, self._file("CURRENT"))
+        return pointer
+
+    def _prune(self, current):
+        for entry in os.listdir(self.path):
+            if entry.startswith("g") and entry[1:].isdigit() and int(entry[1:]) <= current - KEEP_GENERATIONS:
+                # Open mappings keep their pages on POSIX; on Windows the delete waits for a later write
+                shutil.rmtree(self._file(entry), ignore_errors=True)
+
+
+def _truncate(generation, extents, first_day) -> list:
+    """The extents cut to the bars dated before first_day"""
+    kept = []
+    for first, stop in extents:
+        cut = first + int(np.searchsorted(generation.column('date')[first:stop], first_day, 'left'))
+        if cut > first:
+            kept.append((first, cut))
+        if cut < stop:
+            break
+    return kept
+
+
+def _slices(generation, symbol, start_day, end_day, fields) -> dict:
+    ranges = generation.ranges(symbol, start_day, end_day) if generation else None
+    if not ranges:
+        return {field: np.empty(0, COLUMNS[field]) for field in ['date', *fields]}
+    if len(ranges) == 1:
+        first, stop = ranges[0]
+        return {field: generation.column(field)[first:stop] for field in ['date', *fields]}
+    return {field: np.concatenate([generation.column(field)[first:stop] for first, stop in ranges])
+            for field in ['date', *fields]}
+
+
+def _to_columns(frame: pd.DataFrame) -> dict:
+    """Bars frame -> on-disk column arrays, sorted by date with one bar per date"""
+    frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+    columns = {'date': _days(frame.index)}
+    for field in BAR_FIELDS:
+        values = frame[field].to_numpy(dtype=np.float64) if field in frame else np.full(len(frame), np.nan)
+        if np.issubdtype(COLUMNS[field], np.integer):
+            values = np.nan_to_num(values, nan=0.0)
+        columns[field] = values.astype(COLUMNS[field])
+    return columns
@@ -0,0 +1,260 @@
+"""
+Background refresher that keeps watchlist data warm in the tools module cache.
+
+Each (symbol, module) pair is scheduled on a priority queue and re-fetched a
+little before its cache TTL runs out, so Streamlit page loads and
+"show watchlist" read straight from the cache. Requests go through a global
+token bucket to stay under Yahoo's throttling, failures are retried with
+jittered exponential backoff, and symbols the user just looked at jump the
+queue.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+
+import tools
+
+# Refresh this fraction of the way through a module's cache TTL
+REFRESH_FRACTION = 0.8
+
+# Yahoo request budget: sustained requests per second and burst size
+REQUESTS_PER_SECOND = 2.0
+BURST = 10
+
+# Retry backoff after a failed fetch (seconds)
+RETRY_BASE = 5.0
+RETRY_MAX = 600.0
+
+# How often the watchlist itself is re-read for added/removed symbols
+WATCHLIST_POLL_INTERVAL = 30.0
+
+# Viewing a symbol moves its modules that are overdue or due within this many
+# seconds to the front of the queue, this many seconds ahead of other overdue work
+VIEW_PRIORITY_BOOST = 300.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` banked"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1, timeout: float = None, stop: threading.Event = None) -> bool:
+        """Block until tokens are available; False on timeout or when stop is set"""
+        if tokens > self.capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens from a bucket of {self.capacity}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return False
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class WatchlistRefresher:
+    """Daemon thread that re-fetches watchlist module data before it expires"""
+
+    def __init__(self, modules=None, intervals=None, bucket=None, batch_size=BURST):
+        self.modules = list(modules or tools.plan_modules(tools.FIELD_SOURCES))
+        self.intervals = intervals or {
+            m: tools.MODULE_TTLS.get(m, tools.DEFAULT_MODULE_TTL) * REFRESH_FRACTION for m in self.modules
+        }
+        self.bucket = bucket or TokenBucket(REQUESTS_PER_SECOND, BURST)
+        self.batch_size = min(batch_size, int(self.bucket.capacity))
+
+        self._heap = []  # (due_at, seq, symbol, module); most overdue first
+        self._due = {}  # (symbol, module) -> due_at of the live heap entry
+        self._attempts = {}  # (symbol, module) -> consecutive failures
+        self._symbols = set()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_poll = 0.0
+        self.refreshed = 0
+        self.errors = 0
+
+    # ----- scheduling -----
+    def _schedule(self, symbol, module, due_at):
+        self._due[(symbol, module)] = due_at
+        heapq.heappush(self._heap, (due_at, next(self._seq), symbol, module))
+
+    def _sync_watchlist(self):
+        symbols = set(tools.show_watchlist())
+        now = time.time()
+        with self._lock:
+            for symbol in symbols - self._symbols:
+                for module in self.modules:
+                    # Data already warm in the cache is refreshed shortly before it expires
+                    expires = tools._module_cache.expires_at(f"{symbol}|{module}")
+                    ttl = tools.MODULE_TTLS.get(module, tools.DEFAULT_MODULE_TTL)
+                    self._schedule(symbol, module, now if expires is None else expires - ttl * (1 - REFRESH_FRACTION))
+            for symbol in self._symbols - symbols:
+                for module in self.modules:
+                    self._due.pop((symbol, module), None)
+                    self._attempts.pop((symbol, module), None)
+            self._symbols = symbols
+        self._last_poll = now
+
+    def touch(self, symbol: str):
+        """
+        Mark a symbol as just viewed: its modules that are overdue or expire within
+        VIEW_PRIORITY_BOOST seconds are refreshed first. Modules backing off after
+        a failure keep their retry time.
+        """
+        now = time.time()
+        with self._lock:
+            for module in self.modules:
+                due = self._due.get((symbol, module))
+                if due is None or due > now + VIEW_PRIORITY_BOOST:
+                    continue
+                if due > now and self._attempts.get((symbol, module)):
+                    continue
+                self._schedule(symbol, module, min(due, now) - VIEW_PRIORITY_BOOST)
+        self._wake.set()
+
+    def _pop_due(self):
+        """Due (symbol, module) pairs, most overdue first, for at most batch_size symbols"""
+        now = time.time()
+        batch = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_at, _, symbol, module = heapq.heappop(self._heap)
+                if self._due.get((symbol, module)) != due_at:
+                    continue  # superseded or removed from the watchlist
+                if symbol not in batch and len(batch) >= self.batch_size:
+                    heapq.heappush(self._heap, (due_at, next(self._seq), symbol, module))
+                    break
+                del self._due[(symbol, module)]
+                batch.setdefault(symbol, []).append(module)
+            next_due = self._heap[0][0] if self._heap else None
+        return batch, next_due
+
+    def _retry_delay(self, key):
+        attempts = self._attempts.get(key, 0) + 1
+        self._attempts[key] = attempts
+        delay = min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.5)
+
+    # ----- worker -----
+    def run_once(self):
+        """Refresh whatever is due now; returns seconds until the next item is due"""
+        if time.time() - self._last_poll >= WATCHLIST_POLL_INTERVAL:
+            self._sync_watchlist()
+
+        batch, next_due = self._pop_due()
+        if batch:
+            # Symbols that need the same modules share one batched request
+            groups = {}
+            for symbol, modules in batch.items():
+                groups.setdefault(tuple(sorted(modules)), []).append(symbol)
+            for modules, symbols in groups.items():
+                if not self.bucket.acquire(len(symbols), stop=self._stop):
+                    return 0
+                try:
+                    fetched = tools._get_modules(symbols, list(modules), refresh=True)
+                except Exception as e:
+                    fetched = {symbol: str(e) for symbol in symbols}
+                now = time.time()
+                with self._lock:
+                    for symbol in symbols:
+                        if symbol not in self._symbols:
+                            continue
+                        ok = isinstance(fetched.get(symbol), dict)
+                        for module in modules:
+                            key = (symbol, module)
+                            if ok:
+                                self._attempts.pop(key, None)
+                                self._schedule(symbol, module, now + self.intervals[module])
+                                self.refreshed += 1
+                            else:
+                                self._schedule(symbol, module, now + self._retry_delay(key))
+                                self.errors += 1
+            return 0
+
+        wait = WATCHLIST_POLL_INTERVAL - (time.time() - self._last_poll)
+        if next_due is not None:
+            wait = min(wait, next_due - time.time())
+        return max(wait, 0.1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                wait = self.run_once()
+            except Exception as e:
+                print(f"Watchlist refresher error: {e}")
+                wait = RETRY_BASE
+            if wait:
+                self._wake.wait(wait)
+                self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="watchlist-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self) -> dict:
+        with self._lock:
+            now = time.time()
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'symbols': len(self._symbols),
+                'scheduled': len(self._due),
+                'overdue': sum(1 for due in self._due.values() if due <= now),
+                'refreshed': self.refreshed,
+                'errors': self.errors,
+            }
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher(start: bool = True) -> WatchlistRefresher:
+    """Process-wide refresher, started on first use"""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = WatchlistRefresher()
+        if start:
+            _refresher.start()
+        return _refresher
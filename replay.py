@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Record/replay of Yahoo Finance and Gemini traffic for offline, deterministic runs.
+
+Fixture files are JSON:
+
+    {
+      "yahoo": {"modules": {"AAPL": {"price": {...}, ...}},
+                "history": {"AAPL|1d": {"2024-01-02": {"open": ..., "close": ...}, ...}},
+                "search": {"apple": {"quotes": [...]}}},
+      "gemini": {"responses": {"<request hash>": {...generateContent response...}},
+                 "default": null}
+    }
+
+Yahoo traffic is recorded and replayed in-process by swapping tools.Ticker and
+tools.search (yahooquery's endpoints are not configurable). Price history is
+kept per symbol and interval; replayed history() calls filter the recorded bars
+by start/end or period. Gemini traffic goes
+through a local stand-in HTTP server (generateContent and, replayed as
+server-sent events, streamGenerateContent); point GEMINI_API_BASE at it. Both sides
+support configurable latency and error injection.
+
+    python replay.py record-yahoo fixtures/demo.json AAPL MSFT TCS.NS --search apple --history 2y
+    python replay.py serve fixtures/demo.json --record      # proxy + capture Gemini
+    python replay.py serve fixtures/demo.json --latency 0.4 --error-rate 0.05
+
+Setting YAHOO_REPLAY=<fixture> makes tools replay Yahoo data on import.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import tools
+
+GEMINI_UPSTREAM = "https://generativelanguage.googleapis.com"
+
+# Words per server-sent event when replaying streamGenerateContent
+STREAM_WORDS_PER_CHUNK = 3
+
+# history(period=...) units, as pandas DateOffset arguments
+_PERIOD_UNITS = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+
+
+class ReplayConfig:
+    """Latency and error injection shared by the Yahoo and Gemini stand-ins"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=429, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            wait = self.latency + self._random.uniform(0, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+
+# ----- fixtures -----
+class Fixture:
+    """Thread-safe in-memory view of a fixture file"""
+
+    def __init__(self, path=None, data=None):
+        self.path = path
+        self.data = data if data is not None else _read_fixture(path)
+        self.data.setdefault("yahoo", {}).setdefault("modules", {})
+        self.data["yahoo"].setdefault("history", {})
+        self.data["yahoo"].setdefault("search", {})
+        self.data.setdefault("gemini", {}).setdefault("responses", {})
+        self.data["gemini"].setdefault("default", None)
+        self.lock = threading.Lock()
+
+    def save(self, path=None):
+        path = path or self.path
+        with self.lock:
+            tmp = f"{path}.tmp"
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2, default=str)
+            os.replace(tmp, path)
+
+
+def _read_fixture(path):
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def gemini_request_key(model: str, body: dict) -> str:
+    """Stable hash of a generateContent request (model + contents + config)"""
+    payload = json.dumps({"model": model, "body": body}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ----- Yahoo (in-process) -----
+class YahooReplay:
+    """Replaces tools.Ticker/tools.search with fixture-backed stand-ins"""
+
+    def __init__(self, fixture: Fixture, config: ReplayConfig = None):
+        self.fixture = fixture
+        self.config = config or ReplayConfig()
+        self.requests = 0  # one per symbol per get_modules call, like quoteSummary
+        self.searches = 0
+        self._originals = None
+        self._lock = threading.Lock()
+
+    def count(self, requests=0, searches=0):
+        with self._lock:
+            self.requests += requests
+            self.searches += searches
+
+    def ticker(self, symbols, **kwargs):
+        return _ReplayTicker(self, symbols)
+
+    def search(self, query, **kwargs):
+        self.count(searches=1)
+        self.config.delay()
+        if self.config.should_fail():
+            raise RuntimeError("Injected search failure")
+        return self.fixture.data["yahoo"]["search"].get(query.lower().strip(), {"quotes": []})
+
+    def install(self):
+        self._originals = (tools.Ticker, tools.search)
+        tools.Ticker, tools.search = self.ticker, self.search
+        return self
+
+    def uninstall(self):
+        if self._originals:
+            tools.Ticker, tools.search = self._originals
+            self._originals = None
+
+
+class _ReplayTicker:
+    def __init__(self, replay: YahooReplay, symbols):
+        self.replay = replay
+        self.symbols = symbols if isinstance(symbols, list) else str(symbols).replace(',', ' ').split()
+
+    def get_modules(self, modules):
+        replay = self.replay
+        replay.count(requests=len(self.symbols))
+        replay.config.delay()
+        recorded = replay.fixture.data["yahoo"]["modules"]
+        result = {}
+        for symbol in self.symbols:
+            data = recorded.get(symbol)
+            if replay.config.should_fail():
+                result[symbol] = f"Injected failure for {symbol}"
+            elif data is None:
+                result[symbol] = f"Quote not found for ticker symbol: {symbol}"
+            else:
+                result[symbol] = {m: data[m] for m in modules if m in data}
+        if len(modules) == 1:
+            # Mirror yahooquery, which unwraps single-module responses
+            result = {s: v if isinstance(v, str) else v.get(modules[0], {}) for s, v in result.items()}
+        return result
+
+    def history(self, period="1mo", interval="1d", start=None, end=None, **kwargs):
+        """Recorded bars as yahooquery's (symbol, date) frame, or {symbol: error} if none match"""
+        import pandas as pd
+        replay = self.replay
+        replay.count(requests=len(self.symbols))
+        replay.config.delay()
+        recorded = replay.fixture.data["yahoo"]["history"]
+        frames, errors = {}, {}
+        for symbol in self.symbols:
+            bars = recorded.get(_history_key(symbol, interval))
+            if replay.config.should_fail():
+                errors[symbol] = f"Injected failure for {symbol}"
+                continue
+            if not bars:
+                errors[symbol] = (f"No recorded {interval} history for {symbol} in {replay.fixture.path}; "
+                                  f"record it with: python replay.py record-yahoo <fixture> {symbol} --history 2y")
+                continue
+            frame = pd.DataFrame.from_dict(bars, orient='index')
+            frame.index = pd.to_datetime(frame.index)
+            frame = frame.sort_index()
+            first = pd.Timestamp(start) if start else _period_start(period, frame.index[-1])
+            if first is not None:
+                frame = frame[frame.index >= first]
+            if end:
+                frame = frame[frame.index < pd.Timestamp(end)]
+            if len(frame):
+                frames[symbol] = frame.rename_axis('date')
+            else:
+                errors[symbol] = f"No recorded {interval} history for {symbol} in the requested range"
+        if not frames:
+            return errors  # like yahooquery when nothing could be loaded
+        for error in errors.values():
+            print(f"Yahoo replay: {error}")  # a frame has no room for per-symbol errors
+        return pd.concat(frames, names=['symbol', 'date'])
+
+
+def _history_key(symbol, interval) -> str:
+    return f"{symbol}|{interval}"
+
+
+def _period_start(period, last):
+    """First date of a history(period=...) request ending at the last recorded bar; None for 'max'"""
+    import pandas as pd
+    if period in (None, "max"):
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=last.year, month=1, day=1)
+    for unit, name in _PERIOD_UNITS.items():
+        if period.endswith(unit) and period[:-len(unit)].isdigit():
+            return last - pd.DateOffset(**{name: int(period[:-len(unit)])})
+    raise ValueError(f"Unsupported history period '{period}'")
+
+
+class _RecordingTicker:
+    def __init__(self, fixture: Fixture, real_ticker, symbols, **kwargs):
+        self.fixture = fixture
+        self.ticker = real_ticker(symbols, **kwargs)
+        self.symbols = symbols if isinstance(symbols, list) else [symbols]
+
+    def get_modules(self, modules):
+        data = self.ticker.get_modules(modules)
+        with self.fixture.lock:
+            recorded = self.fixture.data["yahoo"]["modules"]
+            for symbol in self.symbols:
+                value = data.get(symbol) if isinstance(data, dict) else None
+                if isinstance(value, dict):
+                    if len(modules) == 1:
+                        value = {modules[0]: value}
+                    recorded.setdefault(symbol, {}).update(value)
+        return data
+
+    def history(self, period="1mo", interval="1d", **kwargs):
+        data = self.ticker.history(period=period, interval=interval, **kwargs)
+        if not hasattr(data, "reset_index"):
+            return data  # per-symbol errors are not recorded
+        rows = data.reset_index()
+        fields = [c for c in rows.columns if c not in ('symbol', 'date')]
+        with self.fixture.lock:
+            recorded = self.fixture.data["yahoo"]["history"]
+            for row in rows.to_dict(orient='records'):
+                bars = recorded.setdefault(_history_key(row['symbol'], interval), {})
+                bars[str(row['date'])[:10]] = {
+                    f: (None if row[f] != row[f] else row[f]) for f in fields  # NaN -> null
+                }
+        return data
+
+
+@contextmanager
+def yahoo_replay(fixture_path, **config):
+    """Serve tools' Yahoo calls from a fixture for the duration of the block"""
+    replay = YahooReplay(Fixture(fixture_path), ReplayConfig(**config)).install()
+    try:
+        yield replay
+    finally:
+        replay.uninstall()
+
+
+@contextmanager
+def record_yahoo(fixture_path):
+    """Let tools' Yahoo calls hit the network and save every response to the fixture"""
+    fixture = Fixture(fixture_path)
+    real_ticker, real_search = tools.Ticker, tools.search
+
+    def search(query, **kwargs):
+        result = real_search(query, **kwargs)
+        with fixture.lock:
+            fixture.data["yahoo"]["search"][query.lower().strip()] = result
+        return result
+
+    tools.Ticker = lambda symbols, **kwargs: _RecordingTicker(fixture, real_ticker, symbols, **kwargs)
+    tools.search = search
+    try:
+        yield fixture
+    finally:
+        tools.Ticker, tools.search = real_ticker, real_search
+        fixture.save()
+
+
+# ----- Gemini (local HTTP stand-in) -----
+class GeminiStandIn(ThreadingHTTPServer):
+    """Local generateContent server that replays (or records) fixture responses"""
+
+    daemon_threads = True
+
+    def __init__(self, address, fixture: Fixture, config: ReplayConfig = None, record=False, upstream=GEMINI_UPSTREAM):
+        super().__init__(address, _GeminiHandler)
+        self.fixture = fixture
+        self.config = config or ReplayConfig()
+        self.record = record
+        self.upstream = upstream
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="gemini-stand-in", daemon=True).start()
+        return self
+
+
+class _GeminiHandler(BaseHTTPRequestHandler):
+    server: GeminiStandIn
+    # Keep-alive like the real API, and chunked encoding for streamed responses
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/health":
+            self._send(200, {"status": "ok", "requests": self.server.requests})
+        else:
+            self._send(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        path = urlsplit(self.path).path
+        # Always drain the body so the kept-alive connection stays in sync
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        stream = path.endswith(":streamGenerateContent")
+        if not (stream or path.endswith(":generateContent")):
+            self._send(404, {"error": {"code": 404, "message": f"Unsupported endpoint {path}"}})
+            return
+
+        model = path.split("/v1beta/", 1)[-1].rsplit(":", 1)[0]
+        body = json.loads(raw or b"{}")
+        key = gemini_request_key(model, body)
+
+        server.config.delay()
+        if server.config.should_fail():
+            status = server.config.error_status
+            headers = {"Retry-After": "1"} if status == 429 else None
+            self._send(status, {"error": {"code": status, "message": "Injected failure", "status": "RESOURCE_EXHAUSTED" if status == 429 else "INTERNAL"}}, headers)
+            return
+
+        if server.record:
+            status, response = self._forward(key, raw)
+        else:
+            gemini = server.fixture.data["gemini"]
+            response = gemini["responses"].get(key) or gemini["default"]
+            status = 200
+            if response is None:
+                status, response = 404, {"error": {"code": 404, "message": f"No recorded response for request {key[:12]}"}}
+
+        if stream and status == 200:
+            self._send_stream(response)
+        else:
+            self._send(status, response)
+
+    def _send_stream(self, response):
+        """Replay a recorded response as server-sent events, a few words per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        candidates = response.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts") or [{"text": ""}]
+        words = "".join(part.get("text", "") for part in parts).split(" ")
+        for start in range(0, len(words), STREAM_WORDS_PER_CHUNK):
+            text = " ".join(words[start:start + STREAM_WORDS_PER_CHUNK])
+            if start + STREAM_WORDS_PER_CHUNK < len(words):
+                text += " "
+            chunk = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+            event = f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+            if self.server.config.latency:
+                time.sleep(self.server.config.latency / 10)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _forward(self, key, raw):
+        """Fetch the (non-streamed) response upstream and record it"""
+        import requests
+
+        server = self.server
+        upstream = requests.post(
+            server.upstream + self.path.replace(":streamGenerateContent", ":generateContent"),
+            data=raw,
+            headers={"Content-Type": "application/json"},
+            timeout=60,
+        )
+        body = upstream.json()
+        if upstream.status_code == 200:
+            with server.fixture.lock:
+                server.fixture.data["gemini"]["responses"][key] = body
+            server.fixture.save()
+        return upstream.status_code, body
+
+
+def serve_gemini(fixture_path, host="127.0.0.1", port=8765, record=False, **config) -> GeminiStandIn:
+    """Start the stand-in server in a background thread and return it"""
+    return GeminiStandIn((host, port), Fixture(fixture_path), ReplayConfig(**config), record=record).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record-yahoo", help="Fetch symbols (and searches) live and save them to a fixture")
+    rec.add_argument("fixture")
+    rec.add_argument("symbols", nargs="*")
+    rec.add_argument("--search", nargs="*", default=[], help="Company names to record searches for")
+    rec.add_argument("--history", metavar="PERIOD", help="Also record daily price history (e.g. 2y) for the symbols")
+
+    serve = commands.add_parser("serve", help="Run the Gemini stand-in server")
+    serve.add_argument("fixture")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--record", action="store_true", help="Proxy to the real API and save responses")
+    serve.add_argument("--latency", type=float, default=0.0)
+    serve.add_argument("--jitter", type=float, default=0.0)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    serve.add_argument("--error-status", type=int, default=429)
+
+    args = parser.parse_args()
+    if args.command == "record-yahoo":
+        with record_yahoo(args.fixture) as fixture:
+            if args.symbols:
+                tools._fetch_modules(args.symbols, tools.plan_modules(tools.FIELD_SOURCES))
+            if args.symbols and args.history:
+                tools.Ticker(args.symbols, asynchronous=True).history(period=args.history, interval="1d")
+            for name in args.search:
+                tools.search(name)
+        print(f"Recorded {len(fixture.data['yahoo']['modules'])} symbols to {args.fixture}")
+    else:
+        server = GeminiStandIn(
+            (args.host, args.port), Fixture(args.fixture),
+            ReplayConfig(args.latency, args.jitter, args.error_rate, args.error_status),
+            record=args.record,
+        )
+        print(f"Gemini stand-in on {server.base_url} ({'recording' if args.record else 'replaying'} {args.fixture})")
+        print(f"Set GEMINI_API_BASE={server.base_url} to use it")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Watchlist risk: correlation matrix, volatility and beta from daily returns.
+
+RiskModel caches pairwise sufficient statistics over a rolling window of daily
+log returns. For every pair (i, j) it keeps, over the dates where both have a
+return: the count N, the sums Sx, the sums of squares Sxx and the
+cross-products Sxy. Covariance and correlation are closed-form from these sums.
+When the inputs change, sync() applies only the difference:
+
+    bars entering / leaving the window, or revised   rank-k update / downdate
+    symbol added (e.g. via add_to_watchlist)          its row and column only
+    symbol removed                                    its row and column dropped
+
+so a refresh costs O(k * n^2) for k changed dates or O(T * n) per new symbol,
+instead of O(T * n^2) for the whole matrix.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import price_history
+import tools
+import tracing
+
+# Rolling window of returns (calendar days) and the minimum overlap for a pair
+WINDOW_DAYS = 365
+MIN_OBSERVATIONS = 20
+TRADING_DAYS = 252
+# Recompute from scratch after this many incremental syncs (bounds floating-point drift)
+REBUILD_EVERY = 100
+# Benchmark for beta (e.g. ^NSEI for an Indian watchlist)
+BENCHMARK = os.environ.get("RISK_BENCHMARK", "^GSPC")
+# Print the full correlation matrix up to this many symbols, otherwise the top pairs
+MAX_MATRIX_SYMBOLS = 12
+TOP_PAIRS = 10
+
+_STATS = ('n', 'sx', 'sxx', 'sxy')
+
+
+def returns_matrix(closes: pd.DataFrame, window_days: int = WINDOW_DAYS) -> pd.DataFrame:
+    """
+    Daily log returns (dates x symbols) over the last window_days. A symbol's
+    return on a date is measured from its previous close, so a market holiday
+    in one symbol does not blank out the next day's return.
+    """
+    if closes.empty:
+        return closes
+    log_close = np.log(closes.where(closes > 0))
+    returns = log_close - log_close.ffill().shift(1)
+    returns = returns.iloc[1:]
+    start = returns.index[-1] - pd.Timedelta(days=window_days)
+    return returns[returns.index > start].dropna(how='all')
+
+
+def _products(a: np.ndarray, b: np.ndarray) -> dict:
+    """Pairwise sums of the columns of a against the columns of b over the same (NaN-masked) rows"""
+    a_mask, b_mask = np.isfinite(a).astype(np.float64), np.isfinite(b).astype(np.float64)
+    a0, b0 = np.where(a_mask > 0, a, 0.0), np.where(b_mask > 0, b, 0.0)
+    return {
+        'n': a_mask.T @ b_mask,
+        'sx': a0.T @ b_mask,  # sum of a over the rows where both are present
+        'sxx': (a0 * a0).T @ b_mask,
+        'sxy': a0.T @ b0,
+    }
+
+
+class RiskModel:
+    """Incrementally maintained pairwise return statistics for a set of symbols"""
+
+    def __init__(self):
+        self.symbols = []
+        self.dates = np.empty(0, dtype='M8[D]')
+        self.returns = np.empty((0, 0))  # rows behind the current statistics, for downdates
+        self.stats = None
+        self.syncs = 0
+        self._lock = threading.Lock()
+
+    def sync(self, returns: pd.DataFrame) -> dict:
+        """Bring the statistics in line with a returns matrix; returns what changed"""
+        with self._lock:
+            if self.stats is None or self.syncs >= REBUILD_EVERY:
+                return self._rebuild(returns)
+            change = {'rebuild': False, 'removed_symbols': [], 'added_symbols': [], 'rows_out': 0, 'rows_in': 0}
+
+            # Symbols that are no longer wanted: drop their rows and columns
+            wanted = set(returns.columns)
+            keep = [i for i, symbol in enumerate(self.symbols) if symbol in wanted]
+            if len(keep) < len(self.symbols):
+                change['removed_symbols'] = [s for s in self.symbols if s not in wanted]
+                self.symbols = [self.symbols[i] for i in keep]
+                self.returns = self.returns[:, keep]
+                self.stats = {k: v[np.ix_(keep, keep)] for k, v in self.stats.items()}
+
+            # Dates that left the window, arrived, or whose returns were revised
+            dates = returns.index.values.astype('M8[D]')
+            current = returns[self.symbols].to_numpy(dtype=np.float64)
+            _, old_i, new_i = np.intersect1d(self.dates, dates, return_indices=True)
+            old_rows, new_rows = self.returns[old_i], current[new_i]
+            same = ((old_rows == new_rows) | (np.isnan(old_rows) & np.isnan(new_rows))).all(axis=1)
+            rows_out = np.setdiff1d(np.arange(len(self.dates)), old_i[same])
+            rows_in = np.setdiff1d(np.arange(len(dates)), new_i[same])
+            if len(rows_out) + len(rows_in) > len(dates) // 2:
+                return self._rebuild(returns)
+            for rows, sign in ((self.returns[rows_out], -1.0), (current[rows_in], 1.0)):
+                if len(rows):
+                    for k, v in _products(rows, rows).items():
+                        self.stats[k] += sign * v
+            change['rows_out'], change['rows_in'] = len(rows_out), len(rows_in)
+
+            # New symbols: compute only their rows and columns against everything
+            known = set(self.symbols)
+            added = [s for s in returns.columns if s not in known]
+            if added:
+                self._add_symbols(current, returns[added].to_numpy(dtype=np.float64))
+                change['added_symbols'] = added
+                self.symbols += added
+                current = returns[self.symbols].to_numpy(dtype=np.float64)
+
+            self.dates, self.returns = dates, current
+            self.syncs += 1
+            return change
+
+    def _rebuild(self, returns):
+        self.symbols = list(returns.columns)
+        self.dates = returns.index.values.astype('M8[D]')
+        self.returns = returns.to_numpy(dtype=np.float64)
+        self.stats = _products(self.returns, self.returns)
+        self.syncs = 0
+        return {'rebuild': True, 'removed_symbols': [], 'added_symbols': list(self.symbols),
+                'rows_out': 0, 'rows_in': len(self.dates)}
+
+    def _add_symbols(self, existing, new):
+        n_old, n = existing.shape[1], existing.shape[1] + new.shape[1]
+        combined = np.hstack([existing, new])
+        columns = _products(combined, new)  # all x new
+        rows = _products(new, combined)  # new x all
+        for k in _STATS:
+            grown = np.zeros((n, n))
+            grown[:n_old, :n_old] = self.stats[k]
+            grown[:, n_old:] = columns[k]
+            grown[n_old:, :] = rows[k]
+            self.stats[k] = grown
+
+    # ----- results -----
+    def _pairwise(self):
+        """(covariance, variance of i over each pair's overlap) as daily n x n arrays"""
+        n, sx, sxx, sxy = (self.stats[k] for k in _STATS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (sxy - sx * sx.T / n) / (n - 1)
+            var = (sxx - sx * sx / n) / (n - 1)
+        enough = n >= MIN_OBSERVATIONS
+        return np.where(enough, cov, np.nan), np.where(enough, np.maximum(var, 0.0), np.nan)
+
+    def summary(self, symbols: list, benchmark: str = None, weights=None) -> dict:
+        """Correlation, volatility, beta and portfolio figures for symbols (a subset of the model)"""
+        with self._lock:
+            index = {s: i for i, s in enumerate(self.symbols)}
+            symbols = [s for s in dict.fromkeys(symbols) if s in index]
+            ids = [index[s] for s in symbols]
+            cov, var = self._pairwise()
+            observations = int(self.stats['n'].diagonal().max()) if len(self.symbols) else 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.sqrt(var * var.T)
+        corr = pd.DataFrame(corr[np.ix_(ids, ids)], index=symbols, columns=symbols)
+        daily_var = np.diagonal(var)[ids]
+        volatility = pd.Series(np.sqrt(daily_var * TRADING_DAYS), index=symbols)
+
+        if benchmark in index:
+            b = index[benchmark]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                beta = pd.Series(cov[ids, b] / var[b, ids], index=symbols)
+        else:
+            beta = pd.Series(np.nan, index=symbols)
+
+        # Portfolio over the symbols that have enough data (equal weight unless given)
+        w = np.array([float((weights or {}).get(s, 1.0)) for s in symbols])
+        usable = np.isfinite(daily_var)
+        w = np.where(usable, w, 0.0)
+        portfolio_volatility = portfolio_beta = float('nan')
+        if w.sum() > 0:
+            w = w / w.sum()
+            sub = np.nan_to_num(cov[np.ix_(ids, ids)])
+            portfolio_volatility = float(np.sqrt(max(w @ sub @ w, 0.0) * TRADING_DAYS))
+            has_beta = np.isfinite(beta.to_numpy()) & (w > 0)
+            if has_beta.any():
+                portfolio_beta = float(np.sum(w[has_beta] * beta.to_numpy()[has_beta]) / w[has_beta].sum())
+
+        return {
+            'symbols': symbols,
+            'benchmark': benchmark,
+            'observations': observations,
+            'correlation': corr,
+            'volatility': volatility,
+            'beta': beta,
+            'portfolio_volatility': portfolio_volatility,
+            'portfolio_beta': portfolio_beta,
+        }
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model() -> RiskModel:
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = RiskModel()
+        return _model
+
+
+def refresh(symbols: list, benchmark: str = BENCHMARK, update: bool = True) -> dict:
+    """Fetch new bars (incrementally) and sync the shared model to symbols + benchmark"""
+    universe = list(dict.fromkeys([*symbols, *([benchmark] if benchmark else [])]))
+    history = price_history.get_history()
+    with tracing.span("risk.refresh", symbols=len(universe)) as span:
+        if update:
+            history.update(universe)
+        start = pd.Timestamp.today().normalize() - pd.Timedelta(days=WINDOW_DAYS + 10)
+        change = get_model().sync(returns_matrix(history.closes(universe, start)))
+        span.set(rebuild=change['rebuild'], rows_in=change['rows_in'], rows_out=change['rows_out'],
+                 added=len(change['added_symbols']), removed=len(change['removed_symbols']))
+    return change
+
+
+def watchlist_risk(symbols: list = None, benchmark: str = BENCHMARK, weights: dict = None) -> dict:
+    """Risk summary for symbols (default: the watchlist), refreshing the model first"""
+    symbols = symbols if symbols is not None else tools.show_watchlist()
+    refresh(symbols, benchmark)
+    return get_model().summary(symbols, benchmark, weights)
+
+
+def _top_pairs(corr: pd.DataFrame, count=TOP_PAIRS):
+    values = corr.to_numpy()
+    i, j = np.triu_indices(len(values), k=1)
+    pairs = values[i, j]
+    order = [k for k in np.argsort(-np.abs(np.nan_to_num(pairs))) if np.isfinite(pairs[k])][:count]
+    return [(corr.index[i[k]], corr.columns[j[k]], pairs[k]) for k in order]
+
+
+def risk_report(input_str: str = "") -> str:
+    """Agent tool: correlation and risk for comma-separated symbols (default: the watchlist)"""
+    symbols = [s.strip().upper() for s in (input_str or "").replace(';', ',').split(',') if s.strip()]
+    symbols = symbols or tools.show_watchlist()
+    if len(symbols) < 2:
+        return "Need at least two symbols (or a watchlist with two or more stocks) for a risk analysis."
+    try:
+        result = watchlist_risk(symbols)
+    except Exception as e:
+        return f"Error computing risk: {e}"
+
+    fmt, pct = tools.format_number, tools.format_percentage
+    missing = [s for s in symbols if s not in result['symbols']]
+    lines = [
+        f"Risk analysis for {len(result['symbols'])} symbols "
+        f"({result['observations']} daily returns, benchmark {result['benchmark']}):",
+        f"- Portfolio volatility (equal weight, annualized): {pct(result['portfolio_volatility'])}",
+        f"- Portfolio beta: {fmt(result['portfolio_beta'])}",
+        "",
+        "Per symbol:",
+    ]
+    for symbol in result['symbols']:
+        lines.append(f"- {symbol}: volatility {pct(result['volatility'][symbol])}, beta {fmt(result['beta'][symbol])}")
+    if missing:
+        lines.append(f"- No price history for: {', '.join(missing)}")
+
+    corr = result['correlation']
+    lines.append("")
+    if len(corr) <= MAX_MATRIX_SYMBOLS:
+        lines.append("Correlation matrix:")
+        lines.append(corr.round(2).to_string())
+    else:
+        lines.append("Most correlated pairs:")
+        lines.extend(f"- {a} / {b}: {fmt(c)}" for a, b, c in _top_pairs(corr))
+    return "\n".join(lines)
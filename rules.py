@@ -0,0 +1,288 @@
+"""
+Compiled multi-metric screening rules.
+
+A screen is a boolean expression over the fields of get_detailed_stock_info's
+raw_data, for example:
+
+    roe > 15 and peg < 1.5 and debt_to_equity < 80 and market in (NSE, US)
+
+Expressions are parsed once into a vectorized predicate that evaluates a whole
+fundamentals DataFrame (see screener.load_fundamentals_frame) at a time.
+Percentage fields (roe, profit_margin, ...) are compared in percent, the same
+units as thresholds.json. Bare words on the right of '==' or 'in' are strings;
+string fields match case-insensitively on the whole value or its first word, so
+"US" matches "US (NASDAQ/NYSE)".
+
+Every field has a missing-data policy: 'fail' (default) makes a comparison on a
+missing value false, 'pass' makes it true (like PEG in screen_and_add).
+Named screens are kept in the watchlist storage backend (see storage.py).
+"""
+import ast
+import operator
+
+import numpy as np
+import pandas as pd
+
+import tools
+
+# Fields stored as fractions in raw_data but written as percentages in rules
+PERCENT_FIELDS = {'roe', 'profit_margin', 'revenue_growth', 'dividend_yield'}
+TEXT_FIELDS = {'symbol', 'company_name', 'sector', 'industry', 'market', 'currency'}
+RULE_FIELDS = set(tools.FIELD_SOURCES) | TEXT_FIELDS
+
+MISSING_POLICIES = ('fail', 'pass')
+
+_COMPARISONS = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+
+class RuleError(ValueError):
+    """Raised when a screen expression cannot be compiled"""
+
+
+# ----- operands -----
+class _Field:
+    def __init__(self, name):
+        self.name = name
+
+    def values(self, frame):
+        column = frame[self.name]
+        if self.name in TEXT_FIELDS:
+            return column.astype(object)
+        values = pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64')
+        return values * 100 if self.name in PERCENT_FIELDS else values
+
+    def missing(self, frame):
+        column = frame[self.name]
+        if self.name in TEXT_FIELDS:
+            return (column.isna() | (column.astype(str) == 'N/A')).to_numpy()
+        return ~np.isfinite(pd.to_numeric(column, errors='coerce').to_numpy(dtype='float64'))
+
+
+class _Literal:
+    def __init__(self, value):
+        self.value = value
+
+
+def _text_key(values):
+    """Upper-cased whole value and first word, for lenient string matching"""
+    upper = pd.Series(values, dtype=object).astype(str).str.upper()
+    return upper, upper.str.split(' ', n=1).str[0]
+
+
+# ----- compiler -----
+# Compiled nodes return (value, unknown, fail) row masks: unknown rows involve a
+# missing field, fail marks those where a missing field has the 'fail' policy.
+# and/or/not use three-valued logic; the policy is applied once, at the top.
+def _combine(parts, is_and):
+    values, unknowns, fails = (np.array(masks) for masks in zip(*parts))
+    # A known false decides 'and', a known true decides 'or'; otherwise any unknown part makes it unknown
+    decided = ((~values if is_and else values) & ~unknowns).any(axis=0)
+    unknown = unknowns.any(axis=0) & ~decided
+    value = ~decided if is_and else decided
+    fail = unknown & (unknowns & fails).any(axis=0)
+    return value, unknown, fail
+
+
+class _Compiler:
+    def __init__(self, missing: dict):
+        self.missing = missing
+        self.fields = set()
+
+    def compile(self, node):
+        """Predicate for a parsed expression: rows with missing data follow the fields' policies"""
+        evaluate = self._node(node)
+
+        def predicate(frame):
+            value, unknown, fail = evaluate(frame)
+            return np.where(unknown, ~fail, value)
+        return predicate
+
+    def _node(self, node):
+        if isinstance(node, ast.Expression):
+            return self._node(node.body)
+        if isinstance(node, ast.BoolOp):
+            parts = [self._node(v) for v in node.values]
+            is_and = isinstance(node.op, ast.And)
+            return lambda frame: _combine([p(frame) for p in parts], is_and)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            inner = self._node(node.operand)
+
+            def negate(frame):
+                value, unknown, fail = inner(frame)
+                return ~value, unknown, fail
+            return negate
+        if isinstance(node, ast.Compare):
+            # a < b < c is (a < b) and (b < c)
+            left = node.left
+            parts = []
+            for op, right in zip(node.ops, node.comparators):
+                parts.append(self._comparison(left, op, right))
+                left = right
+            if len(parts) == 1:
+                return parts[0]
+            return lambda frame: _combine([p(frame) for p in parts], True)
+        raise RuleError(f"Unsupported expression: {ast.dump(node)}")
+
+    def _operand(self, node, as_text=False):
+        if isinstance(node, ast.Name):
+            if node.id in RULE_FIELDS and not as_text:
+                self.fields.add(node.id)
+                return _Field(node.id)
+            if as_text:
+                return _Literal(node.id)
+            raise RuleError(f"Unknown field '{node.id}'")
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+            return _Literal(node.value)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+            return _Literal(-node.operand.value)
+        raise RuleError(f"Unsupported operand: {ast.dump(node)}")
+
+    def _comparison(self, left_node, op, right_node):
+        left = self._operand(left_node)
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(left, _Field):
+                raise RuleError("'in' needs a field on the left and a list of values on the right")
+            text = left.name in TEXT_FIELDS
+            # "market in (NSE)" is a bare name in parentheses, not a tuple: one choice
+            elements = right_node.elts if isinstance(right_node, (ast.Tuple, ast.List, ast.Set)) else [right_node]
+            choices = [self._operand(e, as_text=text).value for e in elements]
+            return self._with_policy(self._membership(left, choices, negate=isinstance(op, ast.NotIn)), [left])
+
+        if type(op) not in _COMPARISONS:
+            raise RuleError(f"Unsupported comparison: {type(op).__name__}")
+        compare = _COMPARISONS[type(op)]
+        text = isinstance(left, _Field) and left.name in TEXT_FIELDS
+        right = self._operand(right_node, as_text=text and isinstance(op, (ast.Eq, ast.NotEq)))
+        fields = [o for o in (left, right) if isinstance(o, _Field)]
+        if not fields:
+            raise RuleError("A comparison needs at least one field")
+
+        if text:
+            if not isinstance(op, (ast.Eq, ast.NotEq)):
+                raise RuleError(f"Text field '{left.name}' only supports ==, != and in")
+            return self._with_policy(
+                self._membership(left, [right.value], negate=isinstance(op, ast.NotEq)), fields
+            )
+
+        def predicate(frame):
+            a = left.values(frame) if isinstance(left, _Field) else left.value
+            b = right.values(frame) if isinstance(right, _Field) else right.value
+            with np.errstate(invalid='ignore'):
+                return np.asarray(compare(a, b), dtype=bool)
+        return self._with_policy(predicate, fields)
+
+    def _membership(self, field, choices, negate):
+        if field.name in TEXT_FIELDS:
+            wanted = {str(c).upper() for c in choices}
+
+            def predicate(frame):
+                whole, first = _text_key(field.values(frame))
+                hit = (whole.isin(wanted) | first.isin(wanted)).to_numpy()
+                return ~hit if negate else hit
+        else:
+            wanted = np.array([float(c) for c in choices])
+
+            def predicate(frame):
+                hit = np.isin(field.values(frame), wanted)
+                return ~hit if negate else hit
+        return predicate
+
+    def _with_policy(self, predicate, fields):
+        """(value, unknown, fail) for a comparison: rows missing a field are unknown"""
+        def apply(frame):
+            value = np.broadcast_to(np.asarray(predicate(frame), dtype=bool), (len(frame),))
+            unknown = np.zeros(len(frame), dtype=bool)
+            fail = np.zeros(len(frame), dtype=bool)
+            for field in fields:
+                missing = field.missing(frame)
+                unknown |= missing
+                if self.missing.get(field.name, 'fail') != 'pass':
+                    fail |= missing
+            return value, unknown, fail
+        return apply
+
+
+# ----- screens -----
+class Screen:
+    """A named, compiled screen: expression plus per-field missing-data policies"""
+
+    def __init__(self, name: str, expr: str, missing: dict = None, description: str = ""):
+        self.name = name
+        self.expr = expr
+        self.missing = dict(missing or {})
+        self.description = description
+        for field, policy in self.missing.items():
+            if policy not in MISSING_POLICIES:
+                raise RuleError(f"Missing-data policy for '{field}' must be one of {MISSING_POLICIES}")
+        try:
+            tree = ast.parse(expr, mode='eval')
+        except SyntaxError as e:
+            raise RuleError(f"Invalid screen expression '{expr}': {e.msg}") from e
+        compiler = _Compiler(self.missing)
+        self._predicate = compiler.compile(tree)
+        self.fields = sorted(compiler.fields)
+
+    def evaluate(self, frame: pd.DataFrame) -> np.ndarray:
+        """Boolean mask with one entry per row of frame"""
+        if frame.empty:
+            return np.zeros(0, dtype=bool)
+        frame = frame.reset_index() if 'symbol' not in frame.columns else frame
+        return np.broadcast_to(self._predicate(frame), (len(frame),)).copy()
+
+    def to_dict(self) -> dict:
+        return {'expr': self.expr, 'missing': self.missing, 'description': self.description}
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> "Screen":
+        return cls(name, data['expr'], data.get('missing'), data.get('description', ""))
+
+
+def thresholds_screen(thresholds: dict = None) -> Screen:
+    """The classic ROE/PEG screen built from thresholds.json"""
+    thresholds = thresholds or tools.get_thresholds()
+    roe_thr, peg_thr = thresholds.get("roe", 15), thresholds.get("peg", 2)
+    return Screen(
+        "thresholds",
+        f"roe > {roe_thr} and peg < {peg_thr}",
+        missing={'peg': 'pass'},
+        description="ROE/PEG thresholds; missing PEG is not penalized",
+    )
+
+
+def load_screens() -> dict:
+    """All saved screens by name, plus the built-in 'thresholds' screen"""
+    screens = {"thresholds": thresholds_screen()}
+    for name, data in tools._get_store().get_screens().items():
+        try:
+            screens[name] = Screen.from_dict(name, data)
+        except (RuleError, KeyError) as e:
+            print(f"Skipping invalid screen '{name}': {e}")
+    return screens
+
+
+def get_screen(name_or_expr: str) -> Screen:
+    """Look up a saved screen by name, or compile an ad-hoc expression"""
+    screens = load_screens()
+    if name_or_expr in screens:
+        return screens[name_or_expr]
+    return Screen("ad-hoc", name_or_expr)
+
+
+def save_screen(screen: Screen):
+    if screen.name == "thresholds":
+        raise RuleError("'thresholds' is built in; use set_thresholds to change it")
+    tools._get_store().save_screen(screen.name, screen.to_dict())
+    return f"Screen '{screen.name}' saved."
+
+
+def delete_screen(name: str):
+    if not tools._get_store().delete_screen(name):
+        return f"Screen '{name}' not found."
+    return f"Screen '{name}' deleted."
@@ -0,0 +1,153 @@
+"""
+Bulk screening of a whole symbol universe (e.g. NIFTY 500 or S&P 500) against
+the ROE/PEG thresholds in thresholds.json.
+
+Fundamentals for every symbol are loaded into one pandas DataFrame and the
+threshold rules run as vectorized masks, so no per-symbol report text is built.
+"""
+import csv
+
+import numpy as np
+import pandas as pd
+
+import rules
+import tools
+
+# Fields loaded for every symbol in the universe
+SCREEN_FIELDS = [
+    'company_name', 'market_cap', 'roe', 'peg', 'pe_ratio',
+    'debt_to_equity', 'profit_margin', 'revenue_growth', 'dividend_yield', 'beta',
+]
+
+# Text-valued fields; everything else is loaded as float64
+TEXT_FIELDS = {'company_name', 'sector', 'industry'}
+
+
+def load_universe(path: str) -> list:
+    """Read symbols from a text file (one per line) or a CSV with a 'symbol' column"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            column = next((c for c in reader.fieldnames or [] if c.strip().lower() in ('symbol', 'ticker')), None)
+            if column is None:
+                raise ValueError(f"{path} has no 'symbol' or 'ticker' column")
+            symbols = [row[column].strip() for row in reader]
+        else:
+            symbols = [line.strip() for line in f]
+    return [s for s in dict.fromkeys(symbols) if s and not s.startswith('#')]
+
+
+def load_fundamentals_frame(symbols: list, fields=SCREEN_FIELDS) -> pd.DataFrame:
+    """One row per symbol, one float64 column per numeric field; failed symbols keep their error"""
+    fetched = tools.get_fields(symbols, fields)
+    frame = pd.DataFrame.from_records(list(fetched.values()))
+    if frame.empty:
+        frame = pd.DataFrame(columns=['symbol', *fields])
+    for column in ['error', *fields]:
+        if column not in frame:
+            frame[column] = None
+    frame = frame.set_index('symbol')
+
+    for field in fields:
+        if field not in TEXT_FIELDS:
+            frame[field] = pd.to_numeric(frame[field], errors='coerce').astype('float64')
+
+    markets = [tools._get_market_info(symbol) for symbol in frame.index]
+    frame['market'] = [m['market'] for m in markets]
+    frame['currency'] = [m['currency'] for m in markets]
+    frame['price_currency'] = [m['price_currency'] for m in markets]
+    return frame
+
+
+def apply_thresholds(frame: pd.DataFrame, thresholds: dict = None) -> pd.DataFrame:
+    """
+    Add screening columns to a fundamentals frame using the same rules as
+    tools.screen_and_add: ROE must beat the threshold, and PEG only counts when
+    it is available (missing PEG is not penalized).
+    """
+    thresholds = thresholds or tools.get_thresholds()
+    roe_thr, peg_thr = thresholds.get("roe", 15), thresholds.get("peg", 2)
+
+    roe_pct = frame['roe'].to_numpy() * 100
+    peg = frame['peg'].to_numpy()
+
+    # NaN compares False, so a missing ROE fails
+    meets_roe = roe_pct > roe_thr
+    peg_available = np.isfinite(peg)
+    meets_peg = ~peg_available | (peg < peg_thr)
+
+    result = frame.copy()
+    result['roe_pct'] = roe_pct
+    result['meets_roe'] = meets_roe
+    result['peg_available'] = peg_available
+    result['meets_peg'] = meets_peg
+    result['passes'] = meets_roe & meets_peg & result['error'].isna().to_numpy()
+    return result
+
+
+def rank(screened: pd.DataFrame) -> pd.DataFrame:
+    """Passers first, then by ROE (high to low) and PEG (low to high)"""
+    return screened.sort_values(
+        ['passes', 'roe_pct', 'peg'], ascending=[False, False, True], na_position='last', kind='stable'
+    )
+
+
+def bulk_screen(symbols: list, thresholds: dict = None, add_passers: bool = False) -> pd.DataFrame:
+    """
+    Screen many symbols at once and return a ranked DataFrame.
+    With add_passers=True every passing symbol is added to the watchlist in one write
+    and the watchlist message is stored in result.attrs['watchlist'].
+    """
+    screened = rank(apply_thresholds(load_fundamentals_frame(symbols), thresholds))
+    if add_passers:
+        passers = screened.index[screened['passes']].tolist()
+        if passers:
+            screened.attrs['watchlist'] = tools.add_many_to_watchlist(passers)
+    return screened
+
+
+def run_screen(symbols: list, screen, add_passers: bool = False) -> pd.DataFrame:
+    """
+    Evaluate a rules.Screen (or a saved screen name / expression) over many symbols.
+    Only the fields the screen uses, plus SCREEN_FIELDS for display, are fetched.
+    """
+    if isinstance(screen, str):
+        screen = rules.get_screen(screen)
+    fields = list(dict.fromkeys([*SCREEN_FIELDS, *(f for f in screen.fields if f in tools.FIELD_SOURCES)]))
+    frame = load_fundamentals_frame(symbols, fields)
+    frame['roe_pct'] = frame['roe'] * 100
+    frame['passes'] = screen.evaluate(frame) & frame['error'].isna().to_numpy()
+    screened = rank(frame)
+    if add_passers:
+        passers = screened.index[screened['passes']].tolist()
+        if passers:
+            screened.attrs['watchlist'] = tools.add_many_to_watchlist(passers)
+    return screened
+
+
+def screen_report(input_str: str) -> str:
+    """
+    Agent-facing screen runner. Input: '<screen name or expression> | SYM1, SYM2, ...';
+    without a symbol list the current watchlist is screened.
+    """
+    try:
+        screen_part, _, symbols_part = input_str.partition('|')
+        screen = rules.get_screen(screen_part.strip() or "thresholds")
+        symbols = [s.strip().upper() for s in symbols_part.split(',') if s.strip()] or tools.show_watchlist()
+        if not symbols:
+            return "No symbols to screen. Pass 'screen | SYM1, SYM2' or add stocks to the watchlist."
+
+        screened = run_screen(symbols, screen)
+        passers = screened[screened['passes']]
+        result = f"Screen '{screen.name}': {screen.expr}"
+        result += f"\n{len(passers)} of {len(screened)} symbols pass."
+        for symbol, row in passers.iterrows():
+            result += f"\n- {symbol} ({row['company_name']}): ROE {tools._format_percentage(row['roe'])}, PEG {tools._format_number(row['peg'])}"
+        failed = screened.index[screened['error'].notna()].tolist()
+        if failed:
+            result += f"\nCould not load: {', '.join(failed)}"
+        return result
+    except rules.RuleError as e:
+        return f"Invalid screen: {e}"
+    except Exception as e:
+        return f"Error running screen: {e}"
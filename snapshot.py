@@ -0,0 +1,149 @@
+"""
+StockSnapshot: the fundamentals of one symbol as typed fields, rendered on demand.
+
+Numbers are stored as floats (None when Yahoo has no value) and nothing is
+formatted until text(), markdown() or to_json() is called, so bulk paths
+that only read numbers never build report strings.
+"""
+import json
+
+from formatting import as_number, format_large_number, format_number, format_percentage, format_price
+
+TEXT_FIELDS = ('company_name', 'sector', 'industry')
+NUMERIC_FIELDS = (
+    'current_price', 'market_cap', 'roe', 'peg', 'pe_ratio', 'price_to_book',
+    'debt_to_equity', 'revenue_growth', 'profit_margin', 'beta', 'dividend_yield',
+    '52_week_high', '52_week_low', 'current_ratio', 'total_cash', 'total_debt',
+    'enterprise_value',
+)
+
+# Field name -> attribute name ("52_week_high" is not an identifier)
+_ATTRS = {
+    field: 'fifty_two_week_' + field[len('52_week_'):] if field.startswith('52_week_') else field
+    for field in TEXT_FIELDS + NUMERIC_FIELDS
+}
+
+
+class StockSnapshot:
+    """Fundamentals of one symbol; a failed load keeps only symbol and error"""
+
+    __slots__ = ('symbol', 'market', 'currency', 'price_currency', 'currency_symbol', 'error', *_ATTRS.values())
+
+    def __init__(self, symbol, market='', currency='', currency_symbol='', error=None, price_currency=None, **fields):
+        self.symbol = symbol
+        self.market = market
+        self.currency = currency
+        self.price_currency = price_currency or currency
+        self.currency_symbol = currency_symbol
+        self.error = error
+        for field in TEXT_FIELDS:
+            value = fields.get(field)
+            setattr(self, _ATTRS[field], str(value) if value is not None else 'N/A')
+        for field in NUMERIC_FIELDS:
+            setattr(self, _ATTRS[field], as_number(fields.get(field)))
+
+    @classmethod
+    def failed(cls, symbol, error):
+        return cls(symbol, error=str(error))
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def get(self, field, default=None):
+        """Value by raw_data field name (e.g. '52_week_high')"""
+        attr = _ATTRS.get(field, field)
+        if attr in self.__slots__:
+            value = getattr(self, attr)
+            return default if value is None else value
+        return default
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"StockSnapshot({self.symbol!r}, error={self.error!r})"
+        return f"StockSnapshot({self.symbol!r}, price={self.current_price}, roe={self.roe}, peg={self.peg})"
+
+    # ----- rendering -----
+    def to_dict(self) -> dict:
+        """Flat dict in the raw_data layout of get_detailed_stock_info"""
+        data = {'symbol': self.symbol, 'market': self.market, 'currency': self.currency,
+                'price_currency': self.price_currency}
+        if self.error is not None:
+            data['error'] = self.error
+            return data
+        for field, attr in _ATTRS.items():
+            data[field] = getattr(self, attr)
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def _price(self, value):
+        if self.price_currency != self.currency:
+            return format_price(value, self.price_currency)  # e.g. LSE pence
+        number = format_number(value)
+        return f"{self.currency_symbol}{number}" if number != 'N/A' else number
+
+    def _money(self, value):
+        return format_large_number(value, self.currency_symbol)
+
+    def _sections(self):
+        """(title, [(label, value)]) pairs shared by the text and markdown renderings"""
+        return [
+            ("Market Information", [
+                ("Exchange", self.market),
+                ("Currency", self.currency),
+            ]),
+            ("Company Details", [
+                ("Sector", self.sector),
+                ("Industry", self.industry),
+                ("Current Price", self._price(self.current_price)),
+                ("Market Cap", self._money(self.market_cap)),
+                ("Enterprise Value", self._money(self.enterprise_value)),
+                ("52-Week Range", f"{self._price(self.fifty_two_week_low)} - {self._price(self.fifty_two_week_high)}"),
+            ]),
+            ("Key Financial Metrics", [
+                ("ROE (Return on Equity)", format_percentage(self.roe)),
+                ("PEG Ratio", format_number(self.peg)),
+                ("P/E Ratio", format_number(self.pe_ratio)),
+                ("Price-to-Book", format_number(self.price_to_book)),
+                ("Debt-to-Equity", format_number(self.debt_to_equity)),
+                ("Current Ratio", format_number(self.current_ratio)),
+                ("Profit Margin", format_percentage(self.profit_margin)),
+                ("Revenue Growth", format_percentage(self.revenue_growth)),
+                ("Beta", format_number(self.beta)),
+                ("Dividend Yield", format_percentage(self.dividend_yield)),
+            ]),
+            ("Financial Position", [
+                ("Total Cash", self._money(self.total_cash)),
+                ("Total Debt", self._money(self.total_debt)),
+            ]),
+        ]
+
+    def text(self) -> str:
+        """Plain-text report (the agent tools' formatted_info)"""
+        if self.error is not None:
+            return f"Error fetching detailed information for {self.symbol}: {self.error}"
+        lines = [f"Stock Analysis for {self.company_name} ({self.symbol}):"]
+        for title, rows in self._sections():
+            lines.append("")
+            lines.append(f"{title}:")
+            lines.extend(f"- {label}: {value}" for label, value in rows)
+        return "\n".join(lines)
+
+    def markdown(self) -> str:
+        """Markdown report for the Streamlit views"""
+        if self.error is not None:
+            return f"**Error fetching detailed information for {self.symbol}:** {self.error}"
+        lines = [f"#### {self.company_name} ({self.symbol})"]
+        for title, rows in self._sections():
+            lines.append("")
+            lines.append(f"**{title}**")
+            lines.extend(f"- {label}: {value}" for label, value in rows)
+        return "\n".join(lines)
+
+    def as_result(self) -> dict:
+        """The dict returned by get_detailed_stock_info (renders the text)"""
+        if self.error is not None:
+            return {'symbol': self.symbol, 'formatted_info': self.text(), 'error': self.error}
+        return {'symbol': self.symbol, 'formatted_info': self.text(), 'raw_data': self.to_dict()}
@@ -0,0 +1,226 @@
+"""
+Storage backends for the watchlist, screening thresholds and saved screens.
+
+JSONStore keeps the original watchlist.json / thresholds.json / screens.json files.
+SQLiteStore keeps all of them in one SQLite database in WAL mode. Every update runs in
+its own transaction, so several Streamlit sessions (or an agent run next to the
+UI) can write concurrently without losing each other's changes. On first use it
+imports the existing JSON files once.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+class JSONStore:
+    """Whole-file JSON storage; writes are atomic but not safe across processes"""
+
+    def __init__(self, watchlist_file="watchlist.json", thresholds_file="thresholds.json", screens_file="screens.json"):
+        self.watchlist_file = watchlist_file
+        self.thresholds_file = thresholds_file
+        self.screens_file = screens_file
+        self._lock = threading.Lock()
+
+    def _read(self, file, default):
+        try:
+            if not os.path.exists(file):
+                return default
+            with open(file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return default
+
+    def _write(self, file, data):
+        tmp = f"{file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, file)
+
+    def list_symbols(self) -> list:
+        return self._read(self.watchlist_file, [])
+
+    def contains(self, symbol) -> bool:
+        return symbol in self.list_symbols()
+
+    def add_symbols(self, symbols) -> list:
+        with self._lock:
+            watchlist = self.list_symbols()
+            present = set(watchlist)
+            added = [s for s in dict.fromkeys(symbols) if s not in present]
+            if added:
+                self._write(self.watchlist_file, watchlist + added)
+            return added
+
+    def remove_symbols(self, symbols) -> list:
+        with self._lock:
+            watchlist = self.list_symbols()
+            targets = set(symbols)
+            removed = [s for s in watchlist if s in targets]
+            if removed:
+                self._write(self.watchlist_file, [s for s in watchlist if s not in targets])
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._write(self.watchlist_file, [])
+
+    def get_thresholds(self, default) -> dict:
+        return self._read(self.thresholds_file, default)
+
+    def set_thresholds(self, values: dict):
+        with self._lock:
+            self._write(self.thresholds_file, values)
+
+    def get_screens(self) -> dict:
+        return self._read(self.screens_file, {})
+
+    def save_screen(self, name, definition: dict):
+        with self._lock:
+            screens = self.get_screens()
+            screens[name] = definition
+            self._write(self.screens_file, screens)
+
+    def delete_screen(self, name) -> bool:
+        with self._lock:
+            screens = self.get_screens()
+            if screens.pop(name, None) is None:
+                return False
+            self._write(self.screens_file, screens)
+            return True
+
+
+class SQLiteStore:
+    """SQLite (WAL) storage with indexed membership and batched, atomic updates"""
+
+    def __init__(self, db_path="stock_ai.db", watchlist_file="watchlist.json", thresholds_file="thresholds.json"):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS watchlist ("
+                "position INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT NOT NULL UNIQUE)"
+            )
+            # JSON-encoded values keep ints as ints (ROE > 15%, not 15.0%)
+            db.execute("CREATE TABLE IF NOT EXISTS thresholds (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS screens (name TEXT PRIMARY KEY, definition TEXT NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._migrate_json(db, watchlist_file, thresholds_file)
+
+    def _connection(self):
+        # One connection per thread; SQLite handles locking between them
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            # Also after a failed COMMIT (e.g. SQLITE_BUSY), which leaves the transaction open
+            try:
+                db.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            raise
+
+    def _migrate_json(self, db, watchlist_file, thresholds_file):
+        """Import the JSON files once, the first time this database is opened"""
+        if db.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        legacy = JSONStore(watchlist_file, thresholds_file)
+        if not db.execute("SELECT 1 FROM watchlist LIMIT 1").fetchone():
+            symbols = [s for s in legacy.list_symbols() if isinstance(s, str)]
+            db.executemany("INSERT OR IGNORE INTO watchlist (symbol) VALUES (?)", [(s,) for s in symbols])
+        if not db.execute("SELECT 1 FROM thresholds LIMIT 1").fetchone():
+            thresholds = legacy.get_thresholds({})
+            db.executemany(
+                "INSERT INTO thresholds (name, value) VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in thresholds.items() if isinstance(v, (int, float))],
+            )
+        db.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+    def list_symbols(self) -> list:
+        rows = self._connection().execute("SELECT symbol FROM watchlist ORDER BY position")
+        return [row[0] for row in rows]
+
+    def contains(self, symbol) -> bool:
+        row = self._connection().execute("SELECT 1 FROM watchlist WHERE symbol = ?", (symbol,)).fetchone()
+        return row is not None
+
+    def add_symbols(self, symbols) -> list:
+        symbols = list(dict.fromkeys(symbols))
+        with self._transaction() as db:
+            present = self._existing(db, symbols)
+            added = [s for s in symbols if s not in present]
+            db.executemany("INSERT INTO watchlist (symbol) VALUES (?)", [(s,) for s in added])
+        return added
+
+    def remove_symbols(self, symbols) -> list:
+        symbols = list(dict.fromkeys(symbols))
+        with self._transaction() as db:
+            present = self._existing(db, symbols)
+            removed = [s for s in symbols if s in present]
+            db.executemany("DELETE FROM watchlist WHERE symbol = ?", [(s,) for s in removed])
+        return removed
+
+    def _existing(self, db, symbols) -> set:
+        present = set()
+        for start in range(0, len(symbols), _SQL_BATCH):
+            batch = symbols[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = db.execute(f"SELECT symbol FROM watchlist WHERE symbol IN ({placeholders})", batch)
+            present.update(row[0] for row in rows)
+        return present
+
+    def clear(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM watchlist")
+
+    def get_thresholds(self, default) -> dict:
+        rows = self._connection().execute("SELECT name, value FROM thresholds").fetchall()
+        return {name: json.loads(value) for name, value in rows} if rows else default
+
+    def set_thresholds(self, values: dict):
+        with self._transaction() as db:
+            db.execute("DELETE FROM thresholds")
+            db.executemany(
+                "INSERT INTO thresholds (name, value) VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in values.items()],
+            )
+
+    def get_screens(self) -> dict:
+        rows = self._connection().execute("SELECT name, definition FROM screens ORDER BY name").fetchall()
+        return {name: json.loads(definition) for name, definition in rows}
+
+    def save_screen(self, name, definition: dict):
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO screens (name, definition) VALUES (?, ?)",
+                (name, json.dumps(definition)),
+            )
+
+    def delete_screen(self, name) -> bool:
+        with self._transaction() as db:
+            return db.execute("DELETE FROM screens WHERE name = ?", (name,)).rowcount > 0
+
+
+def open_store(backend="sqlite", db_path="stock_ai.db", watchlist_file="watchlist.json", thresholds_file="thresholds.json"):
+    """Create the storage backend named by backend ('sqlite' or 'json')"""
+    if backend == "json":
+        return JSONStore(watchlist_file, thresholds_file)
+    if backend == "sqlite":
+        return SQLiteStore(db_path, watchlist_file, thresholds_file)
+    raise ValueError(f"Unknown storage backend '{backend}'. Use 'sqlite' or 'json'.")
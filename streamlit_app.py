@@ -1,24 +1,61 @@
 # streamlit_app.py
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 import os
+import json
+from env_file import load_env_file
+
+# tools reads its settings at import time, so .env comes first
+load_env_file()
+
 from tools import show_watchlist, get_thresholds, set_thresholds
+from formatting import format_number, format_percentage
+import tracing
+from gemini_client import GeminiRateLimitError
 
-# Check for API key before importing agent
-if not os.environ.get("GEMINI_API_KEY") and not st.secrets.get("GEMINI_API_KEY", None):
-    st.error("⚠️ GEMINI_API_KEY not found!")
-    st.info("Please set your Gemini API key in one of these ways:")
-    st.code("1. Environment variable: set GEMINI_API_KEY=your_key")
-    st.code("2. Streamlit secrets: Add GEMINI_API_KEY to .streamlit/secrets.toml")
-    st.stop()
+def gemini_key_configured() -> bool:
+    try:
+        return bool(os.environ.get("GEMINI_API_KEY") or st.secrets.get("GEMINI_API_KEY", None))
+    except Exception:  # no secrets.toml
+        return False
 
-try:
-    from agentic_app import agent
-except Exception as e:
-    st.error(f"Error loading agent: {e}")
-    st.stop()
+@st.cache_resource(show_spinner="Loading agent (first use only)...")
+def load_agent():
+    """
+    Import agentic_app (langchain, Gemini) and build the LLM once per process.
+    Returns the module and how long that took; reruns reuse the cached result.
+    """
+    start = time.perf_counter()
+    import agentic_app
+    agentic_app.get_llm()
+    return agentic_app, time.perf_counter() - start
 
 st.title("Agentic Stock Watchlist App (Gemini)")
 
+def show_trace_breakdown(record):
+    """Per-query timing panel: totals per span type plus the full span tree"""
+    if not record:
+        return
+    with st.expander(f"⏱️ Timing breakdown ({record['duration_ms'] / 1000:.2f}s total)", expanded=False):
+        totals = tracing.breakdown(record)
+        if totals:
+            # Concurrent spans can add up to more than the wall time; shares are of the larger
+            traced = max(record['duration_ms'], sum(t['ms'] for t in totals.values()), 1e-9)
+            st.table([
+                {'span': name, 'calls': t['calls'], 'self ms': round(t['ms'], 1),
+                 'share': f"{100 * t['ms'] / traced:.0f}%"}
+                for name, t in sorted(totals.items(), key=lambda item: -item[1]['ms'])
+            ])
+        st.dataframe(tracing.flatten(record), use_container_width=True)
+        st.download_button(
+            "Download traces (JSON lines)",
+            "".join(json.dumps(t, default=str) + "\n" for t in tracing.recent_traces()),
+            file_name="traces.jsonl",
+            key=f"traces_{record['trace_id']}",
+        )
+
 st.subheader("Screening Thresholds")
 thr = get_thresholds()
 roe_input = st.number_input("ROE Threshold (%)", value=thr["roe"])
@@ -54,6 +91,7 @@ with tab1:
                 result = smart_stock_query(user_query_direct)
                 st.success("✅ Analysis completed!")
                 st.markdown(f"```\n{result}\n```")
+                show_trace_breakdown(tracing.last_trace("smart_stock_query"))
             except Exception as e:
                 st.error(f"❌ Error: {e}")
 
@@ -71,40 +109,112 @@ with tab2:
         """,
         key="agent_query"
     )
+    agent_mode = st.radio(
+        "Agent mode:",
+        ["Function calling (parallel tools)", "ReAct (one tool per step)"],
+        horizontal=True,
+        key="agent_mode",
+    )
+    function_mode = agent_mode.startswith("Function")
+    trace_name = "function_agent.run" if function_mode else "agent.run"
 
-    if st.button("🤖 Run Agent", key="run_agent"):
+    if not gemini_key_configured():
+        # Check for API key before loading the agent; the Direct Analysis tab works without it
+        st.error("⚠️ GEMINI_API_KEY not found!")
+        st.info("Please set your Gemini API key in one of these ways:")
+        st.code("1. Environment variable: set GEMINI_API_KEY=your_key")
+        st.code("2. Streamlit secrets: Add GEMINI_API_KEY to .streamlit/secrets.toml")
+    elif st.button("🤖 Run Agent", key="run_agent"):
+        steps = st.container()
         with st.spinner("Running agent..."):
             try:
-                result = agent.run(user_query_agent)
+                agentic_app, load_seconds = load_agent()
+                st.session_state["agent_load_seconds"] = load_seconds
+            except Exception as e:
+                st.error(f"Error loading agent: {e}")
+                st.stop()
+            try:
+                if function_mode:
+                    def show_event(kind, data):
+                        if kind == "tool_call":
+                            steps.caption(f"🔧 {data['name']}: {data['args'].get('input', '')}")
+                        elif kind == "tool_result":
+                            with steps.expander(f"Observation from {data['name']}", expanded=False):
+                                st.text(data['output'][:4000])
+                    result = agentic_app.run_function_agent(user_query_agent, on_event=show_event)
+                else:
+                    result = agentic_app.run_agent(user_query_agent, callbacks=[agentic_app.StreamlitAgentHandler(steps)])
                 st.success("✅ Agent completed successfully!")
                 st.write(result)
+                show_trace_breakdown(tracing.last_trace(trace_name))
+            except GeminiRateLimitError as e:
+                wait = f" Try again in {e.retry_after:.0f}s." if e.retry_after else ""
+                st.error(f"❌ Gemini API quota exceeded.{wait}")
+                show_trace_breakdown(tracing.last_trace(trace_name))
             except Exception as e:
                 st.error(f"❌ Agent error: {e}")
+                show_trace_breakdown(tracing.last_trace(trace_name))
                 st.write("Please check your API key and try again.")
                 st.info("💡 Try using the 'Direct Analysis' tab for more reliable results.")
 
 st.subheader("📊 Current Persistent Watchlist")
 watchlist = show_watchlist()
 
+# Keep watchlist data warm in the background so page loads read from the cache
+refresher = None
+if os.environ.get("WATCHLIST_REFRESH", "1") != "0":
+    from refresher import get_refresher
+    refresher = get_refresher()
+    refresh_status = refresher.status()
+    st.caption(
+        f"🔄 Background refresh: {refresh_status['refreshed']} updates, "
+        f"{refresh_status['overdue']} pending, {refresh_status['errors']} errors"
+    )
+
+# Details are cached per process, keyed on the symbols and the refresh epoch, so
+# reruns (threshold updates, agent runs, ...) never refetch them
+DETAILS_TTL = 60  # pick up the background refresher's updates within a minute
+
+@st.cache_data(ttl=DETAILS_TTL, show_spinner=False)
+def load_symbol_details(symbol: str, epoch: int):
+    from tools import get_snapshot
+    return get_snapshot(symbol)
+
+@st.cache_data(ttl=DETAILS_TTL, show_spinner=False)
+def load_watchlist_details(symbols: tuple, epoch: int) -> dict:
+    from tools import get_snapshots
+    return get_snapshots(list(symbols))
+
+epoch = st.session_state.setdefault("details_epoch", 0)
+
 if not watchlist:
     st.info("📋 Watchlist is empty. Use the agent to screen and add stocks!")
 else:
     st.success(f"📈 {len(watchlist)} stocks in watchlist")
     
-    # Import get_detailed_stock_info here to avoid circular imports
-    from tools import get_detailed_stock_info
+    # Either fetch everything in one batched call, or each symbol when it is opened
+    load_all = st.toggle("Load all details at once", key="load_all_details")
+    all_details = None
+    if load_all:
+        with st.spinner(f"Loading details for {len(watchlist)} stocks..."):
+            all_details = load_watchlist_details(tuple(watchlist), epoch)
     
     # Display each stock with detailed information
     for i, symbol in enumerate(watchlist):
-        with st.expander(f"📊 {symbol} - Click to view details", expanded=False):
+        show = load_all or st.toggle(f"📊 {symbol} - show details", key=f"show_{symbol}")
+        if not show:
+            continue
+        with st.expander(f"📊 {symbol}", expanded=not load_all):
             with st.spinner(f"Loading details for {symbol}..."):
                 try:
-                    details = get_detailed_stock_info(symbol)
-                    if 'error' in details:
-                        st.error(f"❌ Error loading {symbol}: {details['error']}")
+                    details = all_details[symbol] if all_details is not None else load_symbol_details(symbol, epoch)
+                    if refresher is not None:
+                        refresher.touch(symbol)
+                    if not details.ok:
+                        st.error(f"❌ Error loading {symbol}: {details.error}")
                     else:
                         # Display the formatted information
-                        st.markdown(details['formatted_info'])
+                        st.markdown(details.markdown())
                         
                         # Add remove button for each stock
                         if st.button(f"🗑️ Remove {symbol} from watchlist", key=f"remove_{symbol}_{i}"):
@@ -117,11 +227,38 @@ else:
                 except Exception as e:
                     st.error(f"❌ Failed to load details for {symbol}: {e}")
     
+    # Correlation and risk; the model keeps its sums, so reruns only apply new bars and symbols
+    if st.toggle("📉 Show risk & correlation", key="show_risk"):
+        with st.spinner("Computing risk from daily returns..."):
+            try:
+                import risk
+                summary = risk.watchlist_risk(watchlist)
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Portfolio volatility", format_percentage(summary['portfolio_volatility']))
+                col2.metric(f"Portfolio beta vs {summary['benchmark']}", format_number(summary['portfolio_beta']))
+                col3.metric("Daily returns", summary['observations'])
+                st.dataframe(summary['correlation'].round(2), use_container_width=True)
+                st.dataframe(
+                    {'volatility': summary['volatility'].round(4), 'beta': summary['beta'].round(2)},
+                    use_container_width=True,
+                )
+                missing = [s for s in watchlist if s not in summary['symbols']]
+                if missing:
+                    st.caption(f"No price history for: {', '.join(missing)}")
+            except Exception as e:
+                st.error(f"❌ Failed to compute risk: {e}")
+
     # Add bulk actions
     st.markdown("---")
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🔄 Refresh All Details"):
+            # Drop cached Yahoo data for these symbols and start a new cache epoch
+            from tools import invalidate_symbols
+            invalidate_symbols(watchlist)
+            load_symbol_details.clear()
+            load_watchlist_details.clear()
+            st.session_state["details_epoch"] = epoch + 1
             st.rerun()
     with col2:
         if st.button("🗑️ Clear Entire Watchlist"):
@@ -129,3 +266,9 @@ else:
             result = clear_watchlist()
             st.success(result)
             st.rerun()
+
+# Startup cost of this rerun (the agent is loaded once per process, on first use)
+startup = f"⏱️ Page rendered in {(time.perf_counter() - _script_start) * 1000:.0f} ms"
+if "agent_load_seconds" in st.session_state:
+    startup += f" · agent loaded in {st.session_state['agent_load_seconds']:.2f}s (cached per process)"
+st.sidebar.caption(startup)
@@ -0,0 +1,297 @@
+"""
+Precomputed company-name -> ticker index used by tools.get_symbol.
+
+The index is built once at import: names are normalized (case, punctuation and
+legal suffixes such as "Ltd." or "Inc" removed), and a prefix map plus a trigram
+index back fuzzy matching of near-misses without going to the network.
+"""
+import re
+
+# Enhanced mapping of common companies to their symbols (including Indian companies)
+COMMON_STOCKS = {
+    # US Companies
+    'apple': 'AAPL',
+    'microsoft': 'MSFT',
+    'amazon': 'AMZN',
+    'netflix': 'NFLX',
+    'google': 'GOOGL',
+    'alphabet': 'GOOGL',
+    'tesla': 'TSLA',
+    'meta': 'META',
+    'facebook': 'META',
+    'nvidia': 'NVDA',
+    'berkshire hathaway': 'BRK-A',
+    'visa': 'V',
+    'johnson & johnson': 'JNJ',
+    'walmart': 'WMT',
+    'procter & gamble': 'PG',
+    'mastercard': 'MA',
+    'unitedhealth': 'UNH',
+    'home depot': 'HD',
+    'jpmorgan chase': 'JPM',
+    'coca-cola': 'KO',
+    'pepsico': 'PEP',
+    'disney': 'DIS',
+    'verizon': 'VZ',
+    'at&t': 'T',
+    'intel': 'INTC',
+    'cisco': 'CSCO',
+    'pfizer': 'PFE',
+    'merck': 'MRK',
+    'abbott': 'ABT',
+    'salesforce': 'CRM',
+    'oracle': 'ORCL',
+    'adobe': 'ADBE',
+    'broadcom': 'AVGO',
+    'comcast': 'CMCSA',
+    'thermo fisher': 'TMO',
+    'accenture': 'ACN',
+    'danaher': 'DHR',
+    'mcdonald\'s': 'MCD',
+    'costco': 'COST',
+    'nextera energy': 'NEE',
+    
+    # Indian Companies (NSE)
+    'tata consultancy services': 'TCS.NS',
+    'tcs': 'TCS.NS',
+    'reliance industries': 'RELIANCE.NS',
+    'reliance': 'RELIANCE.NS',
+    'hdfc bank': 'HDFCBANK.NS',
+    'icici bank': 'ICICIBANK.NS',
+    'infosys': 'INFY.NS',
+    'hindustan unilever': 'HINDUNILVR.NS',
+    'hul': 'HINDUNILVR.NS',
+    'itc': 'ITC.NS',
+    'state bank of india': 'SBIN.NS',
+    'sbi': 'SBIN.NS',
+    'bharti airtel': 'BHARTIARTL.NS',
+    'airtel': 'BHARTIARTL.NS',
+    'kotak mahindra bank': 'KOTAKBANK.NS',
+    'kotak bank': 'KOTAKBANK.NS',
+    'axis bank': 'AXISBANK.NS',
+    'larsen & toubro': 'LT.NS',
+    'l&t': 'LT.NS',
+    'wipro': 'WIPRO.NS',
+    'hcl technologies': 'HCLTECH.NS',
+    'hcl tech': 'HCLTECH.NS',
+    'bajaj finance': 'BAJFINANCE.NS',
+    'maruti suzuki': 'MARUTI.NS',
+    'maruti': 'MARUTI.NS',
+    'asian paints': 'ASIANPAINT.NS',
+    'tata steel': 'TATASTEEL.NS',
+    'tata motors': 'TATAMOTORS.NS',
+    'tata motor': 'TATAMOTORS.NS',
+    'tatamotors': 'TATAMOTORS.NS',
+    'tatamotor': 'TATAMOTORS.NS',
+    'sun pharma': 'SUNPHARMA.NS',
+    'sun pharmaceutical': 'SUNPHARMA.NS',
+    'ntpc': 'NTPC.NS',
+    'powergrid': 'POWERGRID.NS',
+    'power grid corporation': 'POWERGRID.NS',
+    'ultratech cement': 'ULTRACEMCO.NS',
+    'ultratech': 'ULTRACEMCO.NS',
+    'ongc': 'ONGC.NS',
+    'oil and natural gas corporation': 'ONGC.NS',
+    'bajaj finserv': 'BAJAJFINSV.NS',
+    'tech mahindra': 'TECHM.NS',
+    'dr reddy': 'DRREDDY.NS',
+    'dr reddys': 'DRREDDY.NS',
+    'titan company': 'TITAN.NS',
+    'titan': 'TITAN.NS',
+    'nestle india': 'NESTLEIND.NS',
+    'nestle': 'NESTLEIND.NS',
+    'hero motocorp': 'HEROMOTOCO.NS',
+    'hero': 'HEROMOTOCO.NS',
+    'adani enterprises': 'ADANIENT.NS',
+    'adani': 'ADANIENT.NS',
+    'indusind bank': 'INDUSINDBK.NS',
+    'mahindra & mahindra': 'M&M.NS',
+    'mahindra': 'M&M.NS',
+    'coal india': 'COALINDIA.NS',
+    'grasim industries': 'GRASIM.NS',
+    'grasim': 'GRASIM.NS',
+    'britannia industries': 'BRITANNIA.NS',
+    'britannia': 'BRITANNIA.NS',
+    'shree cement': 'SHREECEM.NS',
+    'divislab': 'DIVISLAB.NS',
+    'divis laboratories': 'DIVISLAB.NS',
+    'eicher motors': 'EICHERMOT.NS',
+    'eicher': 'EICHERMOT.NS',
+    'sbi life': 'SBILIFE.NS',
+    'sbi life insurance': 'SBILIFE.NS',
+    'hdfc life': 'HDFCLIFE.NS',
+    'hdfc life insurance': 'HDFCLIFE.NS',
+    'icici lombard': 'ICICIGI.NS',
+    'icici prudential': 'ICICIPRULI.NS',
+    'bajaj auto': 'BAJAJ-AUTO.NS',
+    'cipla': 'CIPLA.NS',
+    'tata consumer products': 'TATACONSUM.NS',
+    'tata consumer': 'TATACONSUM.NS',
+    
+    # Indian ADRs trading on US exchanges (for users who prefer USD trading)
+    'hdfc bank adr': 'HDB',
+    'infosys adr': 'INFY',
+    'tata motors adr': 'TTM',
+    'wipro adr': 'WIT',
+    'icici bank adr': 'IBN',
+    'dr reddys adr': 'RDY',
+}
+
+# Trailing words that never distinguish one company from another. Country-specific
+# legal forms (plc, ag, sa, nv, kgaa, ...) are kept: "Nestle SA" is not Nestle India
+LEGAL_SUFFIXES = {
+    'ltd', 'limited', 'inc', 'incorporated', 'corp', 'corporation',
+    'co', 'company', 'llc', 'holdings',
+}
+
+# Words a query may add to a known name and still mean the same company
+# ("infosys technologies", "tcs ltd"); anything else ("adani ports",
+# "reliance power") may be a different company and goes to search.
+# "adr" and "india" are not here on purpose: "Infosys ADR" and "Abbott India" are
+# different listings than the index entries.
+GENERIC_DESCRIPTORS = LEGAL_SUFFIXES | {
+    'technologies', 'technology', 'tech', 'industries', 'enterprises',
+    'group', 'stock', 'stocks', 'share', 'shares', 'equity',
+}
+
+# Prefix completion ("berkshire hath" -> BRK-B) needs at least this many
+# characters and this share of the completed name; shorter starts ("sun",
+# "state", "hindustan") name many companies and go to search
+MIN_PREFIX_LENGTH = 6
+MIN_PREFIX_SHARE = 0.6
+
+# Fuzzy matching: minimum trigram similarity for a candidate, the shortest
+# query that is allowed to match fuzzily at all, and the length from which
+# two edits (instead of one) are tolerated
+MIN_TRIGRAM_SIMILARITY = 0.3
+MIN_FUZZY_LENGTH = 6
+TWO_EDIT_LENGTH = 10
+
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, spell out '&', drop punctuation and trailing legal suffixes"""
+    name = name.lower().replace('&', ' and ').replace("'", '')
+    name = _NON_ALNUM.sub(' ', name)
+    words = _SPACES.sub(' ', name).strip().split(' ')
+    if words and words[0] == 'the' and len(words) > 1:
+        words = words[1:]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting adjacent transpositions as one edit, giving up once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before_previous is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymbolIndex:
+    """Normalized exact, prefix and fuzzy lookup over a name -> symbol mapping"""
+
+    def __init__(self, mapping: dict):
+        self.exact = {}
+        for name, symbol in mapping.items():
+            self.exact.setdefault(normalize_name(name), symbol)
+
+        # Every word-boundary prefix of every key -> symbols it could complete to
+        self.prefixes = {}
+        for key, symbol in self.exact.items():
+            for end in range(1, len(key) + 1):
+                if end == len(key) or key[end] == ' ':
+                    self.prefixes.setdefault(key[:end], set()).add(symbol)
+
+        self.trigram_index = {}
+        self._key_trigrams = {}
+        for key in self.exact:
+            grams = _trigrams(key)
+            self._key_trigrams[key] = grams
+            for gram in grams:
+                self.trigram_index.setdefault(gram, set()).add(key)
+
+    def resolve(self, name: str):
+        """Return the symbol for a company name, or None if nothing matches well enough"""
+        key = normalize_name(name)
+        if not key:
+            return None
+
+        # 1. Exact normalized match
+        if key in self.exact:
+            return self.exact[key]
+
+        # 2. The query extends a known name only with generic words ("infosys technologies")
+        words = key.split(' ')
+        for end in range(len(words) - 1, 0, -1):
+            head = ' '.join(words[:end])
+            if head in self.exact and all(word in GENERIC_DESCRIPTORS for word in words[end:]):
+                return self.exact[head]
+
+        # 3. The query is an unambiguous, substantial start of a known name ("berkshire hath")
+        completions = self.prefixes.get(key)
+        if completions and len(completions) == 1 and len(key) >= MIN_PREFIX_LENGTH:
+            symbol = next(iter(completions))
+            full = min((k for k, v in self.exact.items() if v == symbol and k.startswith(key)), key=len)
+            if len(key) >= MIN_PREFIX_SHARE * len(full):
+                return symbol
+
+        # 4. Fuzzy match on trigram overlap, confirmed by edit distance
+        return self._fuzzy(key)
+
+    def knows(self, name: str) -> bool:
+        """True if the name is exactly a known company name (after normalization)"""
+        return normalize_name(name) in self.exact
+
+    def _fuzzy(self, key: str):
+        if len(key) < MIN_FUZZY_LENGTH:
+            return None
+        grams = _trigrams(key)
+        overlap = {}
+        for gram in grams:
+            for candidate in self.trigram_index.get(gram, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+
+        limit = 1 if len(key) < TWO_EDIT_LENGTH else 2
+        matches = {}  # symbol -> best edit distance
+        for candidate, shared in overlap.items():
+            similarity = shared / len(grams | self._key_trigrams[candidate])
+            if similarity < MIN_TRIGRAM_SIMILARITY:
+                continue
+            distance = _edit_distance(key, candidate, limit)
+            if distance <= limit:
+                symbol = self.exact[candidate]
+                matches[symbol] = min(distance, matches.get(symbol, distance))
+        if not matches:
+            return None
+        # Two companies equally close is ambiguous: leave it to search
+        best = min(matches.values())
+        closest = [symbol for symbol, distance in matches.items() if distance == best]
+        return closest[0] if len(closest) == 1 else None
+
+
+SYMBOL_INDEX = SymbolIndex(COMMON_STOCKS)
+
+
+def resolve(name: str):
+    """Resolve a company name against the built-in index (no network)"""
+    return SYMBOL_INDEX.resolve(name)
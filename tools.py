@@ -1,132 +1,110 @@
-from yahooquery import search, Ticker
-import json, os
+import os, threading, time
+from cache import TTLCache
+import storage
+from formatting import currency_symbol, format_number, format_percentage, format_large_number
+from snapshot import StockSnapshot
+import symbol_index
+import tracing
 
 WATCHLIST_FILE = "watchlist.json"
 THRESHOLDS_FILE = "thresholds.json"
 
-# ----- helpers -----
-def _load_json(file, default):
-    try:
-        if not os.path.exists(file):
-            return default
-        with open(file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return default
-
-def _save_json(file, data):
-    try:
-        with open(file, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Error saving {file}: {e}")
-
-
 # Helper function to determine market information
 def _get_market_info(symbol: str) -> dict:
-    """Determine market, currency, and currency symbol based on stock symbol"""
+    """
+    Determine market, currency, and currency symbol based on stock symbol.
+    price_currency is the unit of per-share prices, which differs from the
+    currency of market cap and balance-sheet figures on the LSE (pence).
+    """
     if '.NS' in symbol or '.BO' in symbol:  # Indian markets (NSE or BSE)
         return {
             'market': 'NSE' if '.NS' in symbol else 'BSE',
             'currency': 'INR',
+            'price_currency': 'INR',
             'currency_symbol': '₹'
         }
     elif '.TO' in symbol:  # Toronto Stock Exchange
         return {
             'market': 'TSX',
             'currency': 'CAD',
+            'price_currency': 'CAD',
             'currency_symbol': 'C$'
         }
     elif '.L' in symbol:  # London Stock Exchange
         return {
             'market': 'LSE',
             'currency': 'GBP',
+            'price_currency': 'GBp',  # LSE prices are quoted in pence
             'currency_symbol': '£'
         }
     elif '.AX' in symbol:  # Australian Stock Exchange
         return {
             'market': 'ASX',
             'currency': 'AUD',
+            'price_currency': 'AUD',
             'currency_symbol': 'A$'
         }
     else:  # Default to US markets
         return {
             'market': 'US (NASDAQ/NYSE)',
             'currency': 'USD',
+            'price_currency': 'USD',
             'currency_symbol': '$'
         }
 
 
-# Helper functions for formatting
-def _format_number(value, decimal_places=2):
-    """Format a number with specified decimal places"""
-    if value is None or (isinstance(value, (int, float)) and (value != value or value == float('inf'))):  # Check for None or NaN
-        return "N/A"
-    try:
-        return f"{float(value):.{decimal_places}f}"
-    except (ValueError, TypeError):
-        return "N/A"
+# Formatting helpers live in formatting.py; the underscored names are kept for existing callers
+_format_number, _format_percentage, _format_large_number = format_number, format_percentage, format_large_number
 
+# ----- yahooquery (imported on first use; it pulls in pandas and curl_cffi) -----
+def Ticker(*args, **kwargs):
+    from yahooquery import Ticker as _Ticker
+    return _Ticker(*args, **kwargs)
 
-def _format_percentage(value):
-    """Format a value as a percentage"""
-    if value is None or (isinstance(value, (int, float)) and (value != value or value == float('inf'))):
-        return "N/A"
-    try:
-        # If the value is already in percentage form (> 1), use it directly
-        # If it's in decimal form (< 1), convert to percentage
-        if float(value) < 1:
-            return f"{float(value) * 100:.2f}%"
-        else:
-            return f"{float(value):.2f}%"
-    except (ValueError, TypeError):
-        return "N/A"
+def search(*args, **kwargs):
+    from yahooquery import search as _search
+    return _search(*args, **kwargs)
 
+# ----- storage -----
+# WATCHLIST_BACKEND selects 'sqlite' (default, safe for concurrent sessions) or 'json'
+STORAGE_BACKEND = os.environ.get("WATCHLIST_BACKEND", "sqlite")
+STORAGE_DB = os.environ.get("WATCHLIST_DB", "stock_ai.db")
 
-def _format_large_number(value):
-    """Format large numbers with B, M, K suffixes"""
-    if value is None or (isinstance(value, (int, float)) and (value != value or value == float('inf'))):
-        return "N/A"
-    try:
-        value = float(value)
-        if abs(value) >= 1e12:
-            return f"${value/1e12:.2f}T"
-        elif abs(value) >= 1e9:
-            return f"${value/1e9:.2f}B"
-        elif abs(value) >= 1e6:
-            return f"${value/1e6:.2f}M"
-        elif abs(value) >= 1e3:
-            return f"${value/1e3:.2f}K"
-        else:
-            return f"${value:.2f}"
-    except (ValueError, TypeError):
-        return "N/A"
+_store = None
+_store_lock = threading.Lock()
+
+def _get_store():
+    """Open the watchlist/threshold/screen store once per process"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = storage.open_store(STORAGE_BACKEND, STORAGE_DB, WATCHLIST_FILE, THRESHOLDS_FILE)
+        return _store
 
 # ----- watchlist -----
 def _load_watchlist():
-    return _load_json(WATCHLIST_FILE, [])
-
-def _save_watchlist(watchlist):
-    _save_json(WATCHLIST_FILE, watchlist)
+    return _get_store().list_symbols()
 
 def add_to_watchlist(symbol: str):
     try:
-        watchlist = _load_watchlist()
-        if symbol not in watchlist:
-            watchlist.append(symbol)
-            _save_watchlist(watchlist)
+        if _get_store().add_symbols([symbol]):
             return f"{symbol} added to watchlist."
         return f"{symbol} already in watchlist."
     except Exception as e:
         return f"Error adding {symbol} to watchlist: {e}"
 
+def add_many_to_watchlist(symbols: list):
+    """Add several symbols to the watchlist with a single write"""
+    try:
+        added = _get_store().add_symbols(symbols)
+        return f"Added {len(added)} of {len(symbols)} symbols to watchlist: {', '.join(added) or 'none'}."
+    except Exception as e:
+        return f"Error adding symbols to watchlist: {e}"
+
 def remove_from_watchlist(symbol: str):
     """Remove a stock symbol from the watchlist"""
     try:
-        watchlist = _load_watchlist()
-        if symbol in watchlist:
-            watchlist.remove(symbol)
-            _save_watchlist(watchlist)
+        if _get_store().remove_symbols([symbol]):
             return f"{symbol} removed from watchlist."
         return f"{symbol} not found in watchlist."
     except Exception as e:
@@ -135,7 +113,7 @@ def remove_from_watchlist(symbol: str):
 def clear_watchlist():
     """Clear all stocks from the watchlist"""
     try:
-        _save_watchlist([])
+        _get_store().clear()
         return "Watchlist cleared successfully."
     except Exception as e:
         return f"Error clearing watchlist: {e}"
@@ -149,321 +127,346 @@ def show_watchlist() -> list:
 # ----- thresholds -----
 def get_thresholds():
     try:
-        return _load_json(THRESHOLDS_FILE, {"roe": 15, "peg": 2})
+        return _get_store().get_thresholds({"roe": 15, "peg": 2})
     except Exception as e:
         return {"roe": 15, "peg": 2, "error": str(e)}
 
 def set_thresholds(roe: float, peg: float):
     try:
-        _save_json(THRESHOLDS_FILE, {"roe": roe, "peg": peg})
+        _get_store().set_thresholds({"roe": roe, "peg": peg})
         return f"Thresholds updated to ROE>{roe}% and PEG<{peg}"
     except Exception as e:
         return f"Error updating thresholds: {e}"
 
+# ----- Yahoo module data -----
+# yahooquery property name -> quoteSummary module name
+DETAIL_MODULES = {
+    'key_stats': 'defaultKeyStatistics',
+    'financial_data': 'financialData',
+    'summary_detail': 'summaryDetail',
+    'price': 'price',
+    'asset_profile': 'assetProfile',
+}
+
+# Output field -> (module, key) sources in fallback order. A fallback is only
+# consulted when its module is already part of the fetch plan.
+FIELD_SOURCES = {
+    'company_name': [('price', 'shortName')],
+    'sector': [('assetProfile', 'sector')],
+    'industry': [('assetProfile', 'industry')],
+    'current_price': [('summaryDetail', 'regularMarketPrice'), ('summaryDetail', 'previousClose')],
+    'market_cap': [('price', 'marketCap')],
+    'roe': [('financialData', 'returnOnEquity'), ('defaultKeyStatistics', 'returnOnEquity')],
+    'peg': [('defaultKeyStatistics', 'pegRatio')],
+    'pe_ratio': [('defaultKeyStatistics', 'trailingPE'), ('defaultKeyStatistics', 'forwardPE')],
+    'price_to_book': [('defaultKeyStatistics', 'priceToBook')],
+    'debt_to_equity': [('financialData', 'debtToEquity')],
+    'revenue_growth': [('financialData', 'revenueGrowth'), ('defaultKeyStatistics', 'revenueQuarterlyGrowth')],
+    'profit_margin': [('defaultKeyStatistics', 'profitMargins')],
+    'beta': [('defaultKeyStatistics', 'beta')],
+    'dividend_yield': [('summaryDetail', 'dividendYield')],
+    '52_week_high': [('summaryDetail', 'fiftyTwoWeekHigh')],
+    '52_week_low': [('summaryDetail', 'fiftyTwoWeekLow')],
+    'current_ratio': [('financialData', 'currentRatio')],
+    'total_cash': [('financialData', 'totalCash')],
+    'total_debt': [('financialData', 'totalDebt')],
+    'enterprise_value': [('defaultKeyStatistics', 'enterpriseValue')],
+}
+
+# Value used when none of a field's sources has data (None otherwise)
+FIELD_DEFAULTS = {
+    'company_name': 'N/A',
+    'sector': 'N/A',
+    'industry': 'N/A',
+    'current_price': 'N/A',
+    'market_cap': 'N/A',
+}
+
+# Symbols per Ticker() in the batched path; each chunk is fetched asynchronously
+DETAIL_CHUNK_SIZE = 25
+
+def _fetch_modules(symbols: list, modules: list, chunk_size: int = DETAIL_CHUNK_SIZE) -> dict:
+    """
+    Fetch quoteSummary modules for many symbols in chunked, asynchronous requests.
+    Returns {symbol: {module_name: data}} or {symbol: error_message} per symbol.
+    """
+    results = {}
+    for start in range(0, len(symbols), chunk_size):
+        chunk = symbols[start:start + chunk_size]
+        with tracing.span("yahoo.get_modules", symbols=len(chunk), modules=",".join(modules)) as span:
+            try:
+                t = Ticker(chunk, asynchronous=True)
+                data = t.get_modules(modules)
+            except Exception as e:
+                span.set(error=str(e))
+                for symbol in chunk:
+                    results[symbol] = str(e)
+                continue
+            if tracing.active():
+                span.set(response_bytes=tracing.payload_size(data))
+
+        # A request-level failure comes back as a single error instead of per-symbol data
+        if not isinstance(data, dict) or ('error' in data and 'error' not in chunk):
+            message = data.get('error') if isinstance(data, dict) else data
+            for symbol in chunk:
+                results[symbol] = str(message)
+            continue
+
+        for symbol in chunk:
+            symbol_data = data.get(symbol)
+            if symbol_data is None:
+                results[symbol] = f"No data returned for {symbol}"
+            elif isinstance(symbol_data, str):
+                results[symbol] = symbol_data
+            elif len(modules) == 1:
+                # yahooquery unwraps single-module responses
+                results[symbol] = {modules[0]: symbol_data}
+            else:
+                results[symbol] = symbol_data
+    return results
+
+# Per-module cache lifetimes in seconds: prices move every minute, profiles barely change
+MODULE_TTLS = {
+    'price': 60,
+    'summaryDetail': 300,
+    'financialData': 6 * 3600,
+    'defaultKeyStatistics': 6 * 3600,
+    'assetProfile': 7 * 24 * 3600,
+}
+DEFAULT_MODULE_TTL = 300
+
+# Symbols found through yahooquery search are remembered for a month
+SYMBOL_SEARCH_TTL = 30 * 24 * 3600
+
+# Set YAHOO_CACHE_DB to an empty string to keep the cache in memory only
+YAHOO_CACHE_DB = os.environ.get("YAHOO_CACHE_DB", "yahoo_cache.db")
+
+_module_cache = TTLCache(max_entries=4096, default_ttl=DEFAULT_MODULE_TTL, db_path=YAHOO_CACHE_DB or None)
+
+def _get_modules(symbols: list, modules: list, refresh: bool = False, fetched_at: dict = None) -> dict:
+    """
+    Cached _fetch_modules: only (symbol, module) pairs that are missing or expired
+    are requested from Yahoo. Same return shape as _fetch_modules. If fetched_at
+    is given, it is filled with {symbol: when its newest module was fetched}.
+    """
+    with tracing.span("tools.get_modules", symbols=len(symbols), modules=",".join(modules)) as span:
+        results = {}
+        missing_by_modules = {}
+        hits = 0
+        for symbol in symbols:
+            cached = {}
+            missing = []
+            for module in modules:
+                value = None if refresh else _module_cache.get(f"{symbol}|{module}")
+                if value is None:
+                    missing.append(module)
+                else:
+                    cached[module] = value
+                    hits += 1
+                    if fetched_at is not None:
+                        # Fetch time of the cache entry: its expiry minus the module's TTL
+                        expires_at = _module_cache.expires_at(f"{symbol}|{module}")
+                        if expires_at is not None:
+                            fetched = expires_at - MODULE_TTLS.get(module, DEFAULT_MODULE_TTL)
+                            fetched_at[symbol] = max(fetched, fetched_at.get(symbol, fetched))
+            results[symbol] = cached
+            if missing:
+                missing_by_modules.setdefault(tuple(missing), []).append(symbol)
+        span.set(cache_hits=hits, cache_misses=len(symbols) * len(modules) - hits, cache_hit=not missing_by_modules)
+
+        # Symbols missing the same modules are fetched together; each group's cache writes are one transaction
+        for missing, group in missing_by_modules.items():
+            fetched = _fetch_modules(group, list(missing))
+            now = time.time()
+            with _module_cache.batch():
+                for symbol in group:
+                    data = fetched.get(symbol)
+                    if not isinstance(data, dict):
+                        results[symbol] = data  # per-symbol error, never cached
+                        continue
+                    for module in missing:
+                        # Cache absent modules as empty so they are not re-requested until expiry
+                        value = data.get(module) or {}
+                        _module_cache.set(f"{symbol}|{module}", value, MODULE_TTLS.get(module, DEFAULT_MODULE_TTL))
+                        results[symbol][module] = value
+                    if fetched_at is not None:
+                        fetched_at[symbol] = now
+        return results
+
+def plan_modules(fields) -> list:
+    """Minimal list of quoteSummary modules needed to fill the given fields"""
+    needed = set()
+    for field in fields:
+        if field not in FIELD_SOURCES:
+            raise ValueError(f"Unknown field '{field}'. Valid fields: {', '.join(FIELD_SOURCES)}")
+        needed.add(FIELD_SOURCES[field][0][0])
+    return [module for module in DETAIL_MODULES.values() if module in needed]
+
+def _extract_fields(modules: dict, fields) -> dict:
+    """Pick each field from the first source that has a value"""
+    values = {}
+    for field in fields:
+        value = None
+        for module, key in FIELD_SOURCES[field]:
+            value = (modules.get(module) or {}).get(key)
+            if value is not None:
+                break
+        values[field] = value if value is not None else FIELD_DEFAULTS.get(field)
+    return values
+
+def get_fields(symbols: list, fields) -> dict:
+    """
+    Fetch only the requested fields for many symbols with one combined module request.
+    Returns {symbol: {'symbol': ..., field: value, ...}} with an 'error' key per failed symbol.
+    """
+    fields = list(fields)
+    symbols = list(dict.fromkeys(symbols))
+    fetched = _get_modules(symbols, plan_modules(fields))
+
+    results = {}
+    for symbol in symbols:
+        modules = fetched.get(symbol)
+        if not isinstance(modules, dict):
+            results[symbol] = {'symbol': symbol, 'error': str(modules)}
+            continue
+        results[symbol] = {'symbol': symbol, **_extract_fields(modules, fields)}
+    return results
+
+def cache_stats() -> dict:
+    """Hit/miss counters for the Yahoo module cache"""
+    return _module_cache.stats()
+
+def invalidate_symbols(symbols: list):
+    """Drop cached module data for the given symbols so the next read refetches it"""
+    for symbol in symbols:
+        for module in DETAIL_MODULES.values():
+            _module_cache.invalidate(f"{symbol}|{module}")
+
+def clear_cache():
+    """Drop all cached Yahoo module data"""
+    _module_cache.clear()
+    return "Cache cleared."
+
 # ----- data -----
 def get_symbol(company_name: str) -> str:
     """
     Search for a stock symbol based on company name.
     Enhanced with Indian market companies and both NSE/ADR options.
     """
+    # First, try the precomputed index (exact, prefix and fuzzy matches)
+    symbol = symbol_index.resolve(company_name)
+    if symbol:
+        return symbol
     
-    # Enhanced mapping of common companies to their symbols (including Indian companies)
-    COMMON_STOCKS = {
-        # US Companies
-        'apple': 'AAPL',
-        'microsoft': 'MSFT',
-        'amazon': 'AMZN',
-        'netflix': 'NFLX',
-        'google': 'GOOGL',
-        'alphabet': 'GOOGL',
-        'tesla': 'TSLA',
-        'meta': 'META',
-        'facebook': 'META',
-        'nvidia': 'NVDA',
-        'berkshire hathaway': 'BRK-A',
-        'visa': 'V',
-        'johnson & johnson': 'JNJ',
-        'walmart': 'WMT',
-        'procter & gamble': 'PG',
-        'mastercard': 'MA',
-        'unitedhealth': 'UNH',
-        'home depot': 'HD',
-        'jpmorgan chase': 'JPM',
-        'coca-cola': 'KO',
-        'pepsico': 'PEP',
-        'disney': 'DIS',
-        'verizon': 'VZ',
-        'at&t': 'T',
-        'intel': 'INTC',
-        'cisco': 'CSCO',
-        'pfizer': 'PFE',
-        'merck': 'MRK',
-        'abbott': 'ABT',
-        'salesforce': 'CRM',
-        'oracle': 'ORCL',
-        'adobe': 'ADBE',
-        'broadcom': 'AVGO',
-        'comcast': 'CMCSA',
-        'thermo fisher': 'TMO',
-        'accenture': 'ACN',
-        'danaher': 'DHR',
-        'mcdonald\'s': 'MCD',
-        'costco': 'COST',
-        'nextera energy': 'NEE',
-        
-        # Indian Companies (NSE)
-        'tata consultancy services': 'TCS.NS',
-        'tcs': 'TCS.NS',
-        'reliance industries': 'RELIANCE.NS',
-        'reliance': 'RELIANCE.NS',
-        'hdfc bank': 'HDFCBANK.NS',
-        'icici bank': 'ICICIBANK.NS',
-        'infosys': 'INFY.NS',
-        'hindustan unilever': 'HINDUNILVR.NS',
-        'hul': 'HINDUNILVR.NS',
-        'itc': 'ITC.NS',
-        'state bank of india': 'SBIN.NS',
-        'sbi': 'SBIN.NS',
-        'bharti airtel': 'BHARTIARTL.NS',
-        'airtel': 'BHARTIARTL.NS',
-        'kotak mahindra bank': 'KOTAKBANK.NS',
-        'kotak bank': 'KOTAKBANK.NS',
-        'axis bank': 'AXISBANK.NS',
-        'larsen & toubro': 'LT.NS',
-        'l&t': 'LT.NS',
-        'wipro': 'WIPRO.NS',
-        'hcl technologies': 'HCLTECH.NS',
-        'hcl tech': 'HCLTECH.NS',
-        'bajaj finance': 'BAJFINANCE.NS',
-        'maruti suzuki': 'MARUTI.NS',
-        'maruti': 'MARUTI.NS',
-        'asian paints': 'ASIANPAINT.NS',
-        'tata steel': 'TATASTEEL.NS',
-        'tata motors': 'TATAMOTORS.NS',
-        'tata motor': 'TATAMOTORS.NS',
-        'tatamotors': 'TATAMOTORS.NS',
-        'tatamotor': 'TATAMOTORS.NS',
-        'sun pharma': 'SUNPHARMA.NS',
-        'sun pharmaceutical': 'SUNPHARMA.NS',
-        'ntpc': 'NTPC.NS',
-        'powergrid': 'POWERGRID.NS',
-        'power grid corporation': 'POWERGRID.NS',
-        'ultratech cement': 'ULTRACEMCO.NS',
-        'ultratech': 'ULTRACEMCO.NS',
-        'ongc': 'ONGC.NS',
-        'oil and natural gas corporation': 'ONGC.NS',
-        'bajaj finserv': 'BAJAJFINSV.NS',
-        'tech mahindra': 'TECHM.NS',
-        'dr reddy': 'DRREDDY.NS',
-        'dr reddys': 'DRREDDY.NS',
-        'titan company': 'TITAN.NS',
-        'titan': 'TITAN.NS',
-        'nestle india': 'NESTLEIND.NS',
-        'nestle': 'NESTLEIND.NS',
-        'hero motocorp': 'HEROMOTOCO.NS',
-        'hero': 'HEROMOTOCO.NS',
-        'adani enterprises': 'ADANIENT.NS',
-        'adani': 'ADANIENT.NS',
-        'indusind bank': 'INDUSINDBK.NS',
-        'mahindra & mahindra': 'M&M.NS',
-        'mahindra': 'M&M.NS',
-        'coal india': 'COALINDIA.NS',
-        'grasim industries': 'GRASIM.NS',
-        'grasim': 'GRASIM.NS',
-        'britannia industries': 'BRITANNIA.NS',
-        'britannia': 'BRITANNIA.NS',
-        'shree cement': 'SHREECEM.NS',
-        'divislab': 'DIVISLAB.NS',
-        'divis laboratories': 'DIVISLAB.NS',
-        'eicher motors': 'EICHERMOT.NS',
-        'eicher': 'EICHERMOT.NS',
-        'sbi life': 'SBILIFE.NS',
-        'sbi life insurance': 'SBILIFE.NS',
-        'hdfc life': 'HDFCLIFE.NS',
-        'hdfc life insurance': 'HDFCLIFE.NS',
-        'icici lombard': 'ICICIGI.NS',
-        'icici prudential': 'ICICIPRULI.NS',
-        'bajaj auto': 'BAJAJ-AUTO.NS',
-        'cipla': 'CIPLA.NS',
-        'tata consumer products': 'TATACONSUM.NS',
-        'tata consumer': 'TATACONSUM.NS',
-        
-        # Indian ADRs trading on US exchanges (for users who prefer USD trading)
-        'hdfc bank adr': 'HDB',
-        'infosys adr': 'INFY',
-        'tata motors adr': 'TTM',
-        'wipro adr': 'WIT',
-        'icici bank adr': 'IBN',
-        'dr reddys adr': 'RDY',
-    }
-    
-    # First, try direct lookup (case-insensitive)
-    name_lower = company_name.lower().strip()
-    if name_lower in COMMON_STOCKS:
-        return COMMON_STOCKS[name_lower]
-    
-    # Try to handle some common variations and abbreviations
-    name_variations = [
-        name_lower.replace(' limited', '').replace(' ltd', '').strip(),
-        name_lower.replace(' inc', '').replace(' corp', '').replace(' corporation', '').strip(),
-        name_lower.replace(' company', '').replace(' co', '').strip(),
-        name_lower.replace('&', 'and').strip(),
-        name_lower.replace(' and ', ' & ').strip()
-    ]
-    
-    for variation in name_variations:
-        if variation in COMMON_STOCKS:
-            return COMMON_STOCKS[variation]
+    # Previously searched names are remembered across restarts
+    cache_key = f"search|{symbol_index.normalize_name(company_name)}"
+    symbol = _module_cache.get(cache_key)
+    if symbol:
+        return symbol
     
     # If not found in mapping, use yahooquery search
     try:
-        results = search(company_name)
+        with tracing.span("yahoo.search", query=company_name) as span:
+            results = search(company_name)
+            if tracing.active():
+                span.set(response_bytes=tracing.payload_size(results))
         quotes = results.get('quotes', [])
         if not quotes:
             return f"Could not find symbol for {company_name}"
-        return quotes[0]['symbol']
+        symbol = quotes[0]['symbol']
+        _module_cache.set(cache_key, symbol, SYMBOL_SEARCH_TTL)
+        return symbol
     except Exception as e:
         return f"Error fetching symbol for {company_name}: {e}"
 
 def get_fundamentals(symbol: str) -> dict:
     try:
-        t = Ticker(symbol)
-        # Try financial_data first, then key_stats as fallback
-        financial_data = t.financial_data.get(symbol, {})
-        key_stats = t.key_stats.get(symbol, {})
-        
-        # Get ROE from financial_data, PEG from key_stats
-        roe = financial_data.get('returnOnEquity') or key_stats.get('returnOnEquity')
-        peg = key_stats.get('pegRatio')
-        
-        return {'symbol': symbol, 'roe': roe, 'peg': peg}
+        # Only financial_data and key_stats are requested, in one combined call
+        result = get_fields([symbol], ['roe', 'peg'])[symbol]
+        if 'error' in result:
+            return {'symbol': symbol, 'roe': None, 'peg': None, 'error': result['error']}
+        return result
     except Exception as e:
         return {'symbol': symbol, 'roe': None, 'peg': None, 'error': str(e)}
 
-def get_detailed_stock_info(symbol: str) -> dict:
-    """Get comprehensive stock information including fundamentals, price, and company details"""
+def _build_snapshot(symbol, modules: dict) -> StockSnapshot:
+    """StockSnapshot from already fetched module data"""
+    return StockSnapshot(symbol, **_get_market_info(symbol), **_extract_fields(modules, FIELD_SOURCES))
+
+def get_snapshots(symbols: list) -> dict:
+    """
+    Batched fundamentals as {symbol: StockSnapshot}, in input order without
+    duplicates. Failed symbols get a snapshot whose .error is set. Nothing is
+    formatted here; call .text() / .markdown() when a report is needed.
+    """
+    # Preserve order, drop duplicates
+    symbols = list(dict.fromkeys(symbols))
+    fetched_at = {}
+    fetched = _get_modules(symbols, plan_modules(FIELD_SOURCES), fetched_at=fetched_at)
+
+    snapshots = {}
+    for symbol in symbols:
+        modules = fetched.get(symbol)
+        if not isinstance(modules, dict):
+            snapshots[symbol] = StockSnapshot.failed(symbol, modules)
+            continue
+        try:
+            snapshots[symbol] = _build_snapshot(symbol, modules)
+        except Exception as e:
+            snapshots[symbol] = StockSnapshot.failed(symbol, e)
+
+    # Keep a snapshot of every successful fetch for trend views, stamped with when Yahoo returned it
+    import history  # numpy/pandas are only needed once details are fetched
+    history.record([snap.to_dict() for snap in snapshots.values() if snap.ok], fetched_at=fetched_at)
+    return snapshots
+
+def get_snapshot(symbol: str) -> StockSnapshot:
     try:
-        t = Ticker(symbol)
-        
-        # Determine market and currency
-        market_info = _get_market_info(symbol)
-        
-        # Get different data modules
-        key_stats = t.key_stats.get(symbol, {})
-        financial_data = t.financial_data.get(symbol, {})
-        summary_detail = t.summary_detail.get(symbol, {})
-        price_info = t.price.get(symbol, {})
-        profile = t.asset_profile.get(symbol, {})
-        
-        # Extract key metrics from the most reliable sources
-        info = {
-            'symbol': symbol,
-            'company_name': price_info.get('shortName', 'N/A'),
-            'market': market_info['market'],
-            'currency': market_info['currency'],
-            'sector': profile.get('sector', 'N/A'),
-            'industry': profile.get('industry', 'N/A'),
-            'current_price': summary_detail.get('regularMarketPrice', summary_detail.get('previousClose', 'N/A')),
-            'market_cap': price_info.get('marketCap', 'N/A'),
-            'roe': financial_data.get('returnOnEquity') or key_stats.get('returnOnEquity'),
-            'peg': key_stats.get('pegRatio'),
-            'pe_ratio': key_stats.get('trailingPE') or key_stats.get('forwardPE'),
-            'price_to_book': key_stats.get('priceToBook'),
-            'debt_to_equity': financial_data.get('debtToEquity'),
-            'revenue_growth': financial_data.get('revenueGrowth') or key_stats.get('revenueQuarterlyGrowth'),
-            'profit_margin': key_stats.get('profitMargins'),
-            'beta': key_stats.get('beta'),
-            'dividend_yield': summary_detail.get('dividendYield'),
-            '52_week_high': summary_detail.get('fiftyTwoWeekHigh'),
-            '52_week_low': summary_detail.get('fiftyTwoWeekLow'),
-            'current_ratio': financial_data.get('currentRatio'),
-            'total_cash': financial_data.get('totalCash'),
-            'total_debt': financial_data.get('totalDebt'),
-            'enterprise_value': key_stats.get('enterpriseValue'),
-        }
-        
-        # Format the information nicely
-        formatted_info = f"""
-Stock Analysis for {info['company_name']} ({symbol}):
-
-Market Information:
-- Exchange: {market_info['market']}
-- Currency: {market_info['currency']}
-
-Company Details:
-- Sector: {info['sector']}
-- Industry: {info['industry']}
-- Current Price: {market_info['currency_symbol']}{info['current_price']} 
-- Market Cap: {_format_large_number(info['market_cap'])}
-- Enterprise Value: {_format_large_number(info['enterprise_value'])}
-- 52-Week Range: {market_info['currency_symbol']}{info['52_week_low']} - {market_info['currency_symbol']}{info['52_week_high']}
-
-Key Financial Metrics:
-- ROE (Return on Equity): {_format_percentage(info['roe'])}
-- PEG Ratio: {_format_number(info['peg'])}
-- P/E Ratio: {_format_number(info['pe_ratio'])}
-- Price-to-Book: {_format_number(info['price_to_book'])}
-- Debt-to-Equity: {_format_number(info['debt_to_equity'])}
-- Current Ratio: {_format_number(info['current_ratio'])}
-- Profit Margin: {_format_percentage(info['profit_margin'])}
-- Revenue Growth: {_format_percentage(info['revenue_growth'])}
-- Beta: {_format_number(info['beta'])}
-- Dividend Yield: {_format_percentage(info['dividend_yield'])}
-
-Financial Position:
-- Total Cash: {_format_large_number(info['total_cash'])}
-- Total Debt: {_format_large_number(info['total_debt'])}
-"""
-        
-        return {
-            'symbol': symbol,
-            'formatted_info': formatted_info.strip(),
-            'raw_data': info
-        }
-        
+        return get_snapshots([symbol])[symbol]
     except Exception as e:
-        return {
-            'symbol': symbol,
-            'formatted_info': f"Error fetching detailed information for {symbol}: {e}",
-            'error': str(e)
-        }
+        return StockSnapshot.failed(symbol, e)
 
-def _format_number(value, decimal_places=2):
-    """Format a number with proper decimal places or return N/A"""
-    if value is None or value == 'N/A':
-        return 'N/A'
-    try:
-        return f"{float(value):.{decimal_places}f}"
-    except:
-        return 'N/A'
-
-def _format_percentage(value, decimal_places=2):
-    """Format a percentage value or return N/A"""
-    if value is None or value == 'N/A':
-        return 'N/A'
-    try:
-        return f"{float(value) * 100:.{decimal_places}f}%"
-    except:
-        return 'N/A'
-
-def _format_large_number(value):
-    """Format large numbers (like market cap) in readable format"""
-    if value is None or value == 'N/A':
-        return 'N/A'
-    try:
-        num = float(value)
-        if num >= 1e12:
-            return f"${num/1e12:.2f}T"
-        elif num >= 1e9:
-            return f"${num/1e9:.2f}B"
-        elif num >= 1e6:
-            return f"${num/1e6:.2f}M"
-        elif num >= 1e3:
-            return f"${num/1e3:.2f}K"
-        else:
-            return f"${num:.2f}"
-    except:
-        return 'N/A'
+def get_detailed_stock_info(symbol: str, technicals: bool = False, currency: str = None) -> dict:
+    """
+    Get comprehensive stock information including fundamentals, price, and company details.
+    With technicals=True a "Technical Indicators" section (SMA, RSI, volatility,
+    drawdown from the local price history) is appended to formatted_info.
+    With currency (e.g. 'USD') the monetary fields are also given in that currency,
+    as 'converted' raw_data and a formatted_info section.
+    """
+    result = get_snapshot(symbol).as_result()
+    if technicals and 'error' not in result:
+        try:
+            import price_history  # pandas/numpy; only loaded when technicals are requested
+            table = price_history.indicators([symbol])
+            if symbol in table.index and table.loc[symbol, 'bars']:
+                result['formatted_info'] += "\n\n" + price_history.technicals_text(table.loc[symbol])
+                result['technicals'] = table.loc[symbol].to_dict()
+        except Exception as e:
+            print(f"Error computing technicals for {symbol}: {e}")
+    if currency and 'error' not in result and currency != result['raw_data']['currency']:
+        try:
+            import fx
+            converted = fx.convert_raw_data(result['raw_data'], currency)
+            sign = currency_symbol(currency)
+            result['converted'] = converted
+            result['formatted_info'] += f"\n\nIn {currency}:\n" + "\n".join([
+                f"- Current Price: {sign}{format_number(converted['current_price'])}",
+                f"- Market Cap: {format_large_number(converted['market_cap'], sign)}",
+                f"- Enterprise Value: {format_large_number(converted['enterprise_value'], sign)}",
+            ])
+        except Exception as e:
+            print(f"Error converting {symbol} to {currency}: {e}")
+    return result
+
+def get_detailed_stock_info_many(symbols: list) -> dict:
+    """
+    Batched get_detailed_stock_info for a list of symbols (e.g. the whole watchlist).
+    Returns {symbol: StockSnapshot}; nothing is rendered up front. Call .as_result()
+    for the get_detailed_stock_info dict (or .text() / .markdown()) only for the
+    symbols that are shown. Failed symbols have .error set.
+    """
+    return get_snapshots(symbols)
 
 # ----- screening -----
 def screen_and_add(company_name: str):
@@ -475,18 +478,17 @@ def screen_and_add(company_name: str):
             return symbol  # return error string
 
         # Get detailed stock information
-        detailed_info = get_detailed_stock_info(symbol)
-        if "error" in detailed_info:
-            return f"Error fetching detailed information: {detailed_info['error']}"
+        snapshot = get_snapshot(symbol)
+        if not snapshot.ok:
+            return f"Error fetching detailed information: {snapshot.error}"
 
         # Get thresholds for comparison
         thresholds = get_thresholds()
         roe_thr, peg_thr = thresholds.get("roe", 15), thresholds.get("peg", 2)
         
         # Extract ROE and PEG for threshold comparison
-        raw_data = detailed_info.get('raw_data', {})
-        roe = raw_data.get('roe')
-        peg = raw_data.get('peg')
+        roe = snapshot.roe
+        peg = snapshot.peg
         
         # Convert ROE to percentage for comparison
         roe_pct = (roe * 100) if roe is not None else 0
@@ -511,7 +513,7 @@ def screen_and_add(company_name: str):
             meets_criteria = meets_roe  # Only require ROE if PEG is not available
         
         # Build the analysis result
-        result = detailed_info['formatted_info']
+        result = snapshot.text()
         
         # Add threshold analysis
         result += f"\n\nThreshold Analysis:"
@@ -552,11 +554,11 @@ def analyze_stock(company_name: str):
             return symbol  # return error string
 
         # Get detailed stock information
-        detailed_info = get_detailed_stock_info(symbol)
-        if "error" in detailed_info:
-            return f"Error fetching detailed information: {detailed_info['error']}"
+        snapshot = get_snapshot(symbol)
+        if not snapshot.ok:
+            return f"Error fetching detailed information: {snapshot.error}"
 
-        result = detailed_info['formatted_info']
+        result = snapshot.text()
         result += f"\n\nNOTE: This is a comprehensive analysis without threshold screening."
         result += f"\nUse 'Screen and Add' if you want to check against thresholds and potentially add to watchlist."
         
@@ -564,3 +566,8 @@ def analyze_stock(company_name: str):
 
     except Exception as e:
         return f"Error analyzing {company_name}: {e}"
+
+# Serve Yahoo data from a recorded fixture instead of the network (see replay.py)
+if os.environ.get("YAHOO_REPLAY"):
+    import replay
+    replay.YahooReplay(replay.Fixture(os.environ["YAHOO_REPLAY"])).install()
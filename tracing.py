@@ -0,0 +1,245 @@
+"""
+Lightweight nested tracing for agent queries, Gemini calls and Yahoo requests.
+
+A query opens a root span with trace(); code underneath opens child spans with
+span(). Spans carry wall-clock timings plus free-form attributes (payload
+sizes, cache hits, ...). Outside of a trace, span() is a no-op, so background
+work such as the watchlist refresher costs nothing.
+
+Finished traces are kept in memory (latest first) for the Streamlit breakdown
+panel and, if TRACE_FILE is set, appended to that file as JSON lines.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# Append every finished trace to this JSON lines file (unset to disable)
+TRACE_FILE = os.environ.get("TRACE_FILE", "")
+MAX_TRACES = 50
+
+_current = contextvars.ContextVar("current_span", default=None)
+_traces = deque(maxlen=MAX_TRACES)
+_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "start", "end", "attrs", "children", "_clock")
+
+    def __init__(self, name, trace_id, attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.start = time.time()
+        self.end = None
+        self.attrs = dict(attrs)
+        self.children = []
+        self._clock = time.perf_counter()
+
+    def finish(self):
+        self.end = self.start + (time.perf_counter() - self._clock)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else self.start + (time.perf_counter() - self._clock)
+        return (end - self.start) * 1000
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'start': self.start,
+            'duration_ms': round(self.duration_ms, 3),
+            'attrs': self.attrs,
+            'children': [child.to_dict() for child in list(self.children)],
+        }
+
+
+class _NoSpan:
+    """Stand-in yielded by span() when no trace is active"""
+
+    def set(self, **attrs):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def active() -> bool:
+    return _current.get() is not None
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Open a root span (or a child span if a trace is already active)"""
+    parent = _current.get()
+    if parent is not None:
+        with span(name, **attrs) as child:
+            yield child
+        return
+
+    root = Span(name, uuid.uuid4().hex[:16], attrs)
+    token = _current.set(root)
+    try:
+        yield root
+    except Exception as e:
+        root.set(error=str(e))
+        raise
+    finally:
+        root.finish()
+        _current.reset(token)
+        _finish_trace(root)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Open a child span of the active trace; does nothing outside a trace"""
+    parent = _current.get()
+    if parent is None:
+        yield _NO_SPAN
+        return
+
+    child = Span(name, parent.trace_id, attrs)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.set(error=str(e))
+        raise
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+def start_span(name, **attrs):
+    """
+    Child span of the active trace that is not made current; call finish() on
+    it. For generators, whose spans must not leak into the caller's context
+    between yields.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NO_SPAN
+    child = Span(name, parent.trace_id, attrs)
+    parent.children.append(child)
+    return child
+
+
+def set_attributes(**attrs):
+    """Add attributes to the innermost active span"""
+    current = _current.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def traced(name=None, root=False):
+    """Decorator: run the function inside a span (or a trace when root=True)"""
+    def decorate(func):
+        label = name or func.__qualname__
+        opener = trace if root else span
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with opener(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def bind(func):
+    """Wrap func so it runs in the caller's trace context (for worker threads)"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def payload_size(value) -> int:
+    """Approximate serialized size in bytes; only worth computing inside a trace"""
+    try:
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, str):
+            return len(value.encode("utf-8"))
+        return len(json.dumps(value, default=str))
+    except Exception:
+        return 0
+
+
+# ----- finished traces -----
+def _finish_trace(root: Span):
+    record = root.to_dict()
+    with _lock:
+        _traces.appendleft(record)
+        if TRACE_FILE:
+            try:
+                with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+            except Exception as e:
+                print(f"Error writing trace to {TRACE_FILE}: {e}")
+
+
+def recent_traces() -> list:
+    with _lock:
+        return list(_traces)
+
+
+def last_trace(name=None):
+    """Most recent finished trace, optionally with the given root name"""
+    for record in recent_traces():
+        if name is None or record['name'] == name:
+            return record
+    return None
+
+
+def export_jsonl(path, traces=None) -> int:
+    """Write traces (default: all kept in memory) to a JSON lines file"""
+    traces = recent_traces() if traces is None else traces
+    with open(path, "w", encoding="utf-8") as f:
+        for record in traces:
+            f.write(json.dumps(record, default=str) + "\n")
+    return len(traces)
+
+
+def flatten(record: dict, depth: int = 0) -> list:
+    """Depth-first rows of a trace for tabular display"""
+    rows = [{
+        'span': "  " * depth + record['name'],
+        'ms': record['duration_ms'],
+        **{k: v for k, v in record['attrs'].items() if isinstance(v, (int, float, str, bool))},
+    }]
+    for child in record['children']:
+        rows.extend(flatten(child, depth + 1))
+    return rows
+
+
+def breakdown(record: dict) -> dict:
+    """
+    Self-time milliseconds (duration minus children) and call count per span
+    name, excluding the root. Nested spans are not counted twice, so the
+    totals add up to at most the traced time (more only for concurrent spans).
+    """
+    totals = {}
+
+    def visit(node):
+        for child in node['children']:
+            entry = totals.setdefault(child['name'], {'ms': 0.0, 'calls': 0})
+            nested = sum(grandchild['duration_ms'] for grandchild in child['children'])
+            entry['ms'] += max(child['duration_ms'] - nested, 0.0)
+            entry['calls'] += 1
+            visit(child)
+    visit(record)
+    return totals